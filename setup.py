@@ -48,7 +48,7 @@ HICOLOR_PNG_SIZES = [16, 24, 32, 48, 64, 128]
 SETUP = dict(
   name=NAME,
   version=VER,
-  packages=['keymon'],
+  packages=['keymon', 'keymon.benchmarks'],
   package_dir={
       'keymon': 'src/keymon'},
   package_data = {
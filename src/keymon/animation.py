@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Small animation engine driven by the GDK frame clock.
+
+Animations interpolate a value (usually an opacity) from a start to an end
+over a duration, calling a setter once per frame.  The tick callback is only
+installed on the widget while at least one animation is running, so an idle
+overlay does not wake up at the display refresh rate.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import logging
+
+
+def linear(progress):
+  """No easing."""
+  return progress
+
+
+def ease_in(progress):
+  """Start slow, end fast."""
+  return progress * progress
+
+
+def ease_out(progress):
+  """Start fast, end slow."""
+  return 1.0 - (1.0 - progress) * (1.0 - progress)
+
+
+def ease_in_out(progress):
+  """Slow at both ends."""
+  if progress < 0.5:
+    return 2.0 * progress * progress
+  return 1.0 - 2.0 * (1.0 - progress) * (1.0 - progress)
+
+
+class Animation():
+  """One running interpolation."""
+  def __init__(self, start, end, duration, setter, easing=linear, on_done=None):
+    """Create an animation.
+    Args:
+      start: value at the beginning.
+      end: value at the end.
+      duration: length in seconds, 0 jumps straight to end.
+      setter: function called with the interpolated value each frame.
+      easing: function mapping linear progress [0, 1] to eased progress.
+      on_done: optional function called once the end value has been set.
+    """
+    self.start = start
+    self.end = end
+    self.duration = duration
+    self.setter = setter
+    self.easing = easing
+    self.on_done = on_done
+    self.begin_time = None
+
+  def step(self, frame_time):
+    """Advance to frame_time (seconds).
+
+    Returns:
+      True if the animation has finished.
+    """
+    if self.begin_time is None:
+      self.begin_time = frame_time
+    if self.duration <= 0:
+      progress = 1.0
+    else:
+      progress = min(1.0, (frame_time - self.begin_time) / self.duration)
+    eased = self.easing(progress)
+    self.setter(self.start + (self.end - self.start) * eased)
+    return progress >= 1.0
+
+
+class Animator():
+  """Runs named animations on the frame clock of a widget."""
+  def __init__(self, widget):
+    self.widget = widget
+    self.animations = {}
+    self.tick_id = None
+
+  def animate(self, key, start, end, duration, setter, easing=linear,
+              on_done=None):
+    """Start (or restart) the animation called key.
+
+    See Animation for the meaning of the other arguments.
+    """
+    self.animations[key] = Animation(start, end, duration, setter,
+                                     easing=easing, on_done=on_done)
+    if self.tick_id is None:
+      self.tick_id = self.widget.add_tick_callback(self._on_tick)
+
+  def fade(self, key, widget, end, duration, easing=linear, on_done=None):
+    """Animate widget's opacity from its current value to end."""
+    self.animate(key, widget.get_opacity(), end, duration, widget.set_opacity,
+                 easing=easing, on_done=on_done)
+
+  def is_running(self, key):
+    """Is the animation called key still running."""
+    return key in self.animations
+
+  def cancel(self, key):
+    """Stop the animation called key where it is, on_done is not called."""
+    self.animations.pop(key, None)
+    if not self.animations:
+      self._stop_ticking()
+
+  def cancel_all(self):
+    """Stop every animation."""
+    self.animations = {}
+    self._stop_ticking()
+
+  def _stop_ticking(self):
+    if self.tick_id is not None:
+      self.widget.remove_tick_callback(self.tick_id)
+      self.tick_id = None
+
+  def _on_tick(self, unused_widget, frame_clock):
+    """Called by GDK once per frame while animations are running."""
+    frame_time = frame_clock.get_frame_time() / 1000000.0
+    for key, animation in list(self.animations.items()):
+      if not animation.step(frame_time):
+        continue
+      if self.animations.get(key) is animation:
+        del self.animations[key]
+      if animation.on_done:
+        logging.debug('Animation %s done', key)
+        animation.on_done()
+    if self.animations:
+      return True
+    # Returning False removes the tick callback.
+    self.tick_id = None
+    return False
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from . import animation
+
+class FakeFrameClock():
+  def __init__(self):
+    self.usecs = 0
+
+  def get_frame_time(self):
+    return self.usecs
+
+class FakeWidget():
+  """Records tick callbacks the way Gtk.Widget would hold them."""
+  def __init__(self):
+    self.callback = None
+    self.opacity = 1.0
+
+  def add_tick_callback(self, callback):
+    self.callback = callback
+    return 1
+
+  def remove_tick_callback(self, unused_tick_id):
+    self.callback = None
+
+  def get_opacity(self):
+    return self.opacity
+
+  def set_opacity(self, opacity):
+    self.opacity = opacity
+
+class TestAnimator(unittest.TestCase):
+  """Unit tests for the animation module"""
+  def setUp(self):
+    self.clock = FakeFrameClock()
+    self.widget = FakeWidget()
+    self.animator = animation.Animator(self.widget)
+
+  def tick(self, secs):
+    self.clock.usecs += int(secs * 1000000)
+    keep = self.widget.callback(self.widget, self.clock)
+    if not keep:
+      self.widget.callback = None
+
+  def test_fade(self):
+    done = []
+    self.animator.fade('fade', self.widget, 0.0, 1.0,
+                       on_done=lambda: done.append(True))
+    self.tick(0)
+    self.assertEqual(self.widget.opacity, 1.0)
+    self.tick(0.5)
+    self.assertAlmostEqual(self.widget.opacity, 0.5)
+    self.assertFalse(done)
+    self.tick(0.6)
+    self.assertEqual(self.widget.opacity, 0.0)
+    self.assertTrue(done)
+    self.assertFalse(self.animator.is_running('fade'))
+    self.assertIsNone(self.widget.callback)
+
+  def test_cancel_stops_ticking(self):
+    self.animator.fade('fade', self.widget, 0.0, 1.0)
+    self.assertIsNotNone(self.widget.callback)
+    self.animator.cancel('fade')
+    self.assertIsNone(self.widget.callback)
+    self.assertIsNone(self.animator.tick_id)
+
+  def test_easing(self):
+    self.assertEqual(animation.ease_in(0.5), 0.25)
+    self.assertEqual(animation.ease_out(0.5), 0.75)
+    self.assertEqual(animation.ease_in_out(0.25), 0.125)
+    for easing in (animation.linear, animation.ease_in, animation.ease_out,
+                   animation.ease_in_out):
+      self.assertEqual(easing(0.0), 0.0)
+      self.assertEqual(easing(1.0), 1.0)
+
+if __name__ == '__main__':
+  unittest.main()
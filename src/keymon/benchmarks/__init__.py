@@ -0,0 +1 @@
+"""Benchmarks, run them from the src directory with python3 -m."""
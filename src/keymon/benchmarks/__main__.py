@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run every benchmark, from the src directory:
+  python3 -m keymon.benchmarks [--xvfb] [--json out.json] [--save-baseline]
+
+Fails when a benchmark is slower than the baseline, or there is none yet,
+see harness.main().
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import sys
+
+from . import harness
+
+MODULES = [
+    'bench_kbd',
+    'bench_themes',
+    'bench_startup',
+    'bench_xlib',
+    'bench_dispatch',
+    'bench_cascade',
+    'bench_pixbufs',
+    'bench_svg_loading',
+    'bench_composite',
+]
+
+sys.exit(harness.main(MODULES))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A burst of keys cascading through many old key images.
+
+With old_keys set each new key pushes every shown key one image to the left,
+through the TwoStateImage defer_to chain or the history strip.
+
+Run from the src directory, with an X display:
+  python3 -m keymon.benchmarks.bench_cascade
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+from . import bench_dispatch
+from . import harness
+
+OLD_KEYS = (4, 16, 32)
+
+
+def cases():
+  ret = []
+  for history_strip in (False, True):
+    for old_keys in OLD_KEYS:
+      keymon = bench_dispatch.make_keymon(
+          old_keys=old_keys, history_strip=history_strip)
+      events = bench_dispatch.key_events(keymon)
+      for event in events:
+        keymon.handle_event(event)
+
+      def cascade(keymon=keymon, events=events):
+        for event in events:
+          keymon.handle_event(event)
+        bench_dispatch.flush()
+
+      kind = 'strip' if history_strip else 'images'
+      ret.append((f'cascade {kind} old_keys={old_keys}', cascade))
+  return ret
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
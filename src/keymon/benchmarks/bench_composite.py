@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare ways of stacking the four layers of the mouse image.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.bench_composite
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import os
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf
+
+from .. import compositor
+from .. import lazy_pixbuf_creator
+from . import harness
+
+LAYERS = ('mouse', 'left-mouse', 'middle-mouse', 'right-mouse')
+
+
+def stack(layers, func):
+  img = layers[0].copy()
+  for layer in layers[1:]:
+    img = func(img, layer)
+  return img
+
+
+def composite_hyper(img, img2):
+  """How layers used to be composited."""
+  img2.composite(img, 0, 0, img.props.width, img.props.height, 0, 0,
+                 1.0, 1.0, GdkPixbuf.InterpType.HYPER, 255)
+  return img
+
+
+def cases():
+  creator = lazy_pixbuf_creator.LazyPixbufCreator({}, 1.0)
+  layers = [creator._read_from_file(os.path.join(harness.THEMES_DIR, 'classic', f'{name}.svg'))
+            for name in LAYERS]
+  ret = [
+      ('mouse composite HYPER', lambda: stack(layers, composite_hyper)),
+      ('mouse composite NEAREST', lambda: stack(layers, compositor.composite_gdk)),
+  ]
+  if compositor.numpy is not None:
+    ret.append(('mouse composite numpy', lambda: stack(layers, compositor.composite_numpy)))
+  return ret
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""KeyMon.handle_event and handle_key with canned events.
+
+Run from the src directory, with an X display:
+  python3 -m keymon.benchmarks.bench_dispatch
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk
+
+from .. import cli
+from .. import config_files
+from .. import key_mon
+from .. import xlib
+from . import harness
+
+TYPED = ['KEY_T', 'KEY_H', 'KEY_E', 'KEY_SPACE', 'KEY_Q', 'KEY_U', 'KEY_I',
+         'KEY_C', 'KEY_K', 'KEY_LEFTSHIFT', 'KEY_1', 'KEY_KP5', 'KEY_ENTER']
+
+
+def make_keymon(**overrides):
+  """A KeyMon with the default options, except overrides."""
+  opts = cli.create_options()
+  opts.parse_args('', [])
+  opts.themes = config_files.get_themes()
+  # Measure rendering, not the disk cache.
+  opts.disk_cache = False
+  for name, value in overrides.items():
+    setattr(opts, name, value)
+  keymon = key_mon.KeyMon(opts)
+  flush()
+  return keymon
+
+
+def flush():
+  """Let Gtk do its pending work."""
+  while Gtk.events_pending():
+    Gtk.main_iteration_do(False)
+
+
+def key_events(keymon, names=TYPED):
+  """Down and up XEvents for the keys names."""
+  events = []
+  for name in names:
+    info = keymon.modmap.get_from_name(name)
+    if not info:
+      continue
+    events.append(xlib.XEvent('EV_KEY', info[0], name, 1))
+    events.append(xlib.XEvent('EV_KEY', info[0], name, 0))
+  return events
+
+
+def cases():
+  keymon = make_keymon()
+  keys = key_events(keymon)
+  mouse = [
+      xlib.XEvent('EV_MOV', 0, 0, (100, 200)),
+      xlib.XEvent('EV_KEY', 0, 'BTN_LEFT', 1, pos=(100, 200)),
+      xlib.XEvent('EV_KEY', 0, 'BTN_LEFT', 0, pos=(100, 200)),
+      xlib.XEvent('EV_REL', 0, 'REL_WHEEL', 1, pos=(100, 200)),
+  ]
+  # Render every image once, the benchmark is about the dispatch.
+  for event in keys + mouse:
+    keymon.handle_event(event)
+  flush()
+
+  def handle_events(events):
+    for event in events:
+      keymon.handle_event(event)
+
+  def handle_keys():
+    for event in keys:
+      keymon.handle_key(event.scancode, event.code, event.value)
+
+  return [
+      ('handle_event keys', lambda: handle_events(keys)),
+      ('handle_event mouse', lambda: handle_events(mouse)),
+      ('handle_key', handle_keys),
+  ]
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parse keymaps, kbd files and xmodmap output, or read them from KbdCache.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.bench_kbd
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import atexit
+import codecs
+import glob
+import os
+import shutil
+import tempfile
+
+from .. import mod_mapper
+from . import harness
+
+KEYMON_DIR = os.path.dirname(harness.THEMES_DIR)
+# Layout files in the directory read through the cache.
+LAYOUTS = 48
+
+
+def modmap_text(kbd):
+  """Canned 'xmodmap -pk' output with the keys of kbd."""
+  lines = [
+      'There are 7 KeySyms per KeyCode; KeyCodes range from 8 to 255.',
+      '',
+      '    KeyCode\tKeysym (Keysym)\t...',
+      '    Value  \tValue   (Name)  \t...',
+      '']
+  for code, vals in kbd.items():
+    name = vals[0][len('KEY_'):].lower()
+    lines.append(f'    {code + 8:3d}    \t0x{code + 0x60:04x} ({name})\t'
+                 f'0x{code + 0x40:04x} ({name.upper()})')
+  return '\n'.join(lines) + '\n'
+
+
+def layouts_dir():
+  """A temporary directory with LAYOUTS copies of the shipped kbd files."""
+  tmp_dir = tempfile.mkdtemp(prefix='keymon-bench-')
+  atexit.register(shutil.rmtree, tmp_dir, True)
+  shipped = sorted(glob.glob(os.path.join(KEYMON_DIR, '*.kbd')))
+  for num in range(LAYOUTS):
+    shutil.copy(shipped[num % len(shipped)],
+                os.path.join(tmp_dir, f'layout{num:02d}.kbd'))
+  return tmp_dir
+
+
+def read_all(kbd_files, cache=None):
+  """Read every kbd file, like settings changes going through them."""
+  for fname in kbd_files:
+    if cache:
+      cache.read_kbd(fname)
+    else:
+      mod_mapper.read_kbd(fname)
+
+
+def cases():
+  ret = []
+  texts = {}
+  for fname in ('us.kbd', 'de.kbd'):
+    with codecs.open(os.path.join(KEYMON_DIR, fname), 'r', 'utf-8') as fin:
+      texts[fname] = fin.read()
+    ret.append((f'parse_kbd {fname}',
+                lambda text=texts[fname]: mod_mapper.parse_kbd(text)))
+  us_kbd = mod_mapper.parse_kbd(texts['us.kbd'])
+  lookups = [(code, vals[0]) for code, vals in us_kbd.items()]
+  ret.append(('get_and_check us.kbd', lambda: [
+      us_kbd.get_and_check(code, name) for code, name in lookups]))
+  modmap = modmap_text(us_kbd)
+  ret.append(('parse_modmap', lambda: mod_mapper.parse_modmap(modmap)))
+
+  tmp_dir = layouts_dir()
+  kbd_files = sorted(glob.glob(os.path.join(tmp_dir, '*.kbd')))
+  cache_fname = os.path.join(tmp_dir, 'kbd.pickle')
+  read_all(kbd_files, mod_mapper.KbdCache(cache_fname))
+  ret.append((f'read_kbd {LAYOUTS} files', lambda: read_all(kbd_files)))
+  # A new KbdCache each time, as on startup.
+  ret.append((f'KbdCache {LAYOUTS} files', lambda: read_all(
+      kbd_files, mod_mapper.KbdCache(cache_fname))))
+  return ret
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""LazyPixbufCreator.create_pixbuf for each theme and scale.
+
+Run from the src directory, with an X display:
+  python3 -m keymon.benchmarks.bench_pixbufs
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+from .. import config_files
+from .. import lazy_pixbuf_creator
+from .. import svg_template
+from . import bench_dispatch
+from . import harness
+
+SCALES = (0.75, 1.0, 2.0)
+NAMES = ('MOUSE', 'BTN_LEFTMIDDLERIGHT', 'SHIFT', 'KEY_SPACE', 'KEY_EMPTY')
+
+
+def cases():
+  keymon = bench_dispatch.make_keymon()
+  ret = []
+  for theme in sorted(config_files.get_themes()):
+    for scale in SCALES:
+      keymon.options.theme = theme
+      keymon.options.scale = scale
+      creator = lazy_pixbuf_creator.LazyPixbufCreator(
+          keymon.create_names_to_fnames(), scale)
+
+      def create_all(creator=creator):
+        for name in NAMES:
+          creator.create_pixbuf(name)
+        # Every run reads the files again.
+        svg_template.TEMPLATES.forget()
+
+      ret.append((f'create_pixbuf {theme} x{scale}', create_all))
+  return ret
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
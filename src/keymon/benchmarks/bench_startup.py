@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Start key-mon for the commands that don't show the overlay.
+
+Each run is a new python, so the rates are of whole processes.  The
+cumulative python -X importtime of keymon.cli alone is tracked too, as
+imports per second, and the slowest imports are printed.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.bench_startup
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+from . import harness
+
+SRC_DIR = os.path.dirname(os.path.dirname(harness.THEMES_DIR))
+
+
+def python(*args):
+  """Closure running python with args in the src directory."""
+  def run():
+    subprocess.run([sys.executable] + list(args), cwd=SRC_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  return run
+
+
+def import_times(module):
+  """Return [(cumulative usecs, name)] of importing module, slowest first."""
+  proc = subprocess.run(
+      [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+      cwd=SRC_DIR, check=True, capture_output=True, text=True)
+  times = []
+  for line in proc.stderr.splitlines():
+    # import time: self [us] | cumulative | imported package
+    parts = line.split('|')
+    if len(parts) == 3 and parts[1].strip().isdigit():
+      times.append((int(parts[1]), parts[2].strip()))
+  return sorted(times, reverse=True)
+
+
+def import_rate(module):
+  """Closure measuring module's imports per second, from its best importtime."""
+  def rate(min_secs):
+    best = None
+    start = time.perf_counter()
+    while best is None or time.perf_counter() - start < min_secs:
+      usecs = dict((name, usecs) for usecs, name in import_times(module))[module]
+      best = usecs if best is None else min(best, usecs)
+    return 1e6 / max(1, best)
+  rate.own_rate = True
+  return rate
+
+
+def cases():
+  ret = [
+      ('import keymon.cli', python('-c', 'import keymon.cli')),
+      ('import keymon.cli importtime', import_rate('keymon.cli')),
+      ('key-mon --version', python('-m', 'keymon.cli', '--version')),
+      ('key-mon --list-themes', python('-m', 'keymon.cli', '--list-themes')),
+  ]
+  if importlib.util.find_spec('gi'):
+    # What the overlay costs on top.
+    ret.append(('import keymon.key_mon', python('-c', 'import keymon.key_mon')))
+  return ret
+
+
+def main():
+  harness.report(harness.run(cases()))
+  for module in ('keymon.cli', 'keymon.key_mon'):
+    print()
+    print(f'Slowest imports of {module}:')
+    try:
+      times = import_times(module)
+    except subprocess.CalledProcessError as e:
+      print(f' unable to import: {e}')
+      continue
+    for usecs, name in times[:10]:
+      print(f' {usecs / 1000:8.1f} ms {name}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare rendering an SVG through a temp file and from memory.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.bench_svg_loading
+Set TMPDIR to benchmark a particular /tmp.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import os
+import tempfile
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf
+
+from .. import lazy_pixbuf_creator
+from . import harness
+
+def read_via_tempfile(image_bytes):
+  """How _read_from_bytes used to work."""
+  fout, fname = tempfile.mkstemp(prefix='keymon-', suffix='.svg')
+  os.write(fout, str.encode(image_bytes))
+  os.close(fout)
+  img = GdkPixbuf.Pixbuf.new_from_file(fname)
+  os.unlink(fname)
+  return img
+
+
+def cases():
+  with open(os.path.join(harness.THEMES_DIR, 'classic', 'one-char-template.svg')) as fin:
+    svg = fin.read().replace('&amp;', 'A')
+  creator = lazy_pixbuf_creator.LazyPixbufCreator({}, 1.0)
+  return [
+      ('svg render via temp file', lambda: read_via_tempfile(svg)),
+      ('svg render in memory', lambda: creator._read_from_bytes(svg)),
+  ]
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
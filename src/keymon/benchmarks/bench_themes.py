@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Find the themes, reading every theme config or through the ThemeIndex.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.bench_themes
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from .. import theme_index
+from . import harness
+
+# Theme directories, copies of the shipped ones.
+THEMES = 40
+
+
+def themes_dir():
+  """A temporary directory with THEMES copies of the shipped themes."""
+  tmp_dir = tempfile.mkdtemp(prefix='keymon-bench-')
+  atexit.register(shutil.rmtree, tmp_dir, True)
+  shipped = sorted(
+      entry for entry in os.listdir(harness.THEMES_DIR)
+      if os.path.isdir(os.path.join(harness.THEMES_DIR, entry)))
+  for num in range(THEMES):
+    shutil.copytree(os.path.join(harness.THEMES_DIR, shipped[num % len(shipped)]),
+                    os.path.join(tmp_dir, 'themes', f'theme{num:02d}'))
+  return tmp_dir
+
+
+def cases():
+  tmp_dir = themes_dir()
+  theme_dirs = [os.path.join(tmp_dir, 'themes')]
+  cache_fname = os.path.join(tmp_dir, 'themes.pickle')
+  theme_index.ThemeIndex(cache_fname).themes(theme_dirs)
+  return [
+      (f'read {THEMES} themes',
+       lambda: theme_index.ThemeIndex().themes(theme_dirs)),
+      # A new ThemeIndex each time, as on startup.
+      (f'ThemeIndex {THEMES} themes',
+       lambda: theme_index.ThemeIndex(cache_fname).themes(theme_dirs)),
+  ]
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
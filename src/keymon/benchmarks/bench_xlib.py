@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""XEvents._handler on canned RECORD payloads.
+
+Run from the src directory, with an X display (or see the --xvfb option of
+python3 -m keymon.benchmarks):
+  python3 -m keymon.benchmarks.bench_xlib
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import types
+
+from Xlib import X
+from Xlib.ext import record
+from Xlib.protocol import event
+
+from .. import xlib
+from . import harness
+
+# Keycodes of 'the quick brown fox', a typical burst of typing.
+KEYCODES = (28, 43, 26, 65, 24, 30, 31, 54, 45, 65, 56, 27, 32, 25, 57, 65, 41, 32, 53)
+
+
+def payload(root, kinds, x=100, y=200, state=0):
+  """Binary RECORD data, one event per (type, detail) in kinds."""
+  data = b''
+  for kind, detail in kinds:
+    data += kind(
+        time=0, root=root, window=root, same_screen=1, child=X.NONE,
+        root_x=x, root_y=y, event_x=x, event_y=y, state=state,
+        detail=detail)._binary
+  return data
+
+
+def reply(data):
+  """Looks like what record_enable_context passes the handler."""
+  return types.SimpleNamespace(
+      category=record.FromServer, client_swapped=False, data=data)
+
+
+def cases():
+  events = xlib.XEvents()
+  root = events.record_display.screen().root
+  typing = reply(payload(root, [
+      (kind, code) for code in KEYCODES
+      for kind in (event.KeyPress, event.KeyRelease)]))
+  clicks = reply(payload(root, [
+      (event.ButtonPress, 1), (event.ButtonRelease, 1),
+      (event.ButtonPress, 4), (event.ButtonRelease, 4)]))
+  motion = reply(payload(root, [(event.MotionNotify, 0)] * 32))
+
+  def handle(one_reply):
+    events._handler(one_reply)
+    events.events.clear()
+
+  return [
+      ('xlib handler typing', lambda: handle(typing)),
+      ('xlib handler clicks', lambda: handle(clicks)),
+      ('xlib handler motion', lambda: handle(motion)),
+  ]
+
+
+def main():
+  harness.report(harness.run(cases()))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tiny benchmark harness.
+
+Each benchmark is a function called repeatedly for a minimum amount of time,
+the result is the number of calls per second.
+
+main() runs the benchmark modules given, can write the results as JSON and
+compare them with a baseline, failing if one got slower than a threshold.
+The rates depend on the machine, so the baseline is saved per user, in the
+cache directory, with --save-baseline.  Without one main() fails.
+With --xvfb it starts a private Xvfb first so it runs headless.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import importlib
+import json
+import optparse
+import os
+import platform
+import shutil
+import subprocess
+import time
+
+from .. import config_files
+
+THEMES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'themes')
+BASELINE = os.path.join(config_files.get_cache_dir(), 'benchmark-baseline.json')
+DEFAULT_THRESHOLD = 0.15
+
+def measure(func, min_secs=1.0):
+  """Call func until min_secs have passed.
+
+  A func with a true own_rate attribute measures itself, it's called once
+  with min_secs and returns the rate.
+  Returns:
+    calls per second.
+  """
+  if getattr(func, 'own_rate', False):
+    return func(min_secs)
+  func()  # Warm up.
+  calls = 0
+  start = time.perf_counter()
+  elapsed = 0.0
+  while elapsed < min_secs:
+    func()
+    calls += 1
+    elapsed = time.perf_counter() - start
+  return calls / elapsed
+
+
+def report(results):
+  """Print a list of (name, calls per second)."""
+  name_len = max(len(name) for name, _ in results)
+  for name, rate in results:
+    print(f'{name:<{name_len}} {rate:12.1f} /s')
+
+
+def run(cases, min_secs=1.0, pattern=''):
+  """Measure a list of (name, func).
+  Returns:
+    list of (name, calls per second).
+  """
+  return [(name, measure(func, min_secs)) for name, func in cases
+          if pattern in name]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+  """Find the benchmarks slower than the baseline.
+  Args:
+    results: list of (name, calls per second).
+    baseline: dict of name to calls per second.
+    threshold: allowed slowdown, 0.15 is 15% fewer calls per second.
+  Returns:
+    list of (name, baseline rate, rate).
+  """
+  regressions = []
+  for name, rate in results:
+    base = baseline.get(name)
+    if base and rate < base * (1.0 - threshold):
+      regressions.append((name, base, rate))
+  return regressions
+
+
+def save_json(fname, results):
+  """Write results, with a little about the machine, to fname."""
+  with open(fname, 'w') as fout:
+    json.dump({
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': dict(results),
+    }, fout, indent=2, sort_keys=True)
+    fout.write('\n')
+
+
+def load_json(fname):
+  """Read the results saved by save_json() as a dict."""
+  with open(fname) as fin:
+    return json.load(fin)['results']
+
+
+def start_xvfb():
+  """Start Xvfb on a free display unless there's already a DISPLAY.
+  Returns:
+    The Xvfb process or None.
+  """
+  if os.environ.get('DISPLAY'):
+    return None
+  if not shutil.which('Xvfb'):
+    raise SystemExit('Xvfb not found, install it or set DISPLAY')
+  # Xvfb picks a free display and writes its number once it's ready.
+  read_fd, write_fd = os.pipe()
+  proc = subprocess.Popen(
+      ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', '1280x1024x24',
+       '+extension', 'RECORD', '-nolisten', 'tcp'],
+      pass_fds=(write_fd,),
+      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  os.close(write_fd)
+  with os.fdopen(read_fd) as fin:
+    number = fin.readline().strip()
+  if not number:
+    proc.wait()
+    raise SystemExit('Xvfb didn\'t start')
+  os.environ['DISPLAY'] = f':{number}'
+  return proc
+
+
+def main(modules, argv=None):
+  """Run the cases() of each benchmark module, relative to this package."""
+  parser = optparse.OptionParser(usage='%prog [options]')
+  parser.add_option('--json', dest='json', default='',
+                    help='Write the results to this JSON file.')
+  parser.add_option('--baseline', dest='baseline', default=BASELINE,
+                    help='Compare with this JSON file.')
+  parser.add_option('--save-baseline', dest='save_baseline', action='store_true',
+                    default=False, help='Write the results as the baseline.')
+  parser.add_option('--threshold', dest='threshold', type='float',
+                    default=DEFAULT_THRESHOLD,
+                    help='Slowdown that fails, 0.15 is 15%.')
+  parser.add_option('--min-secs', dest='min_secs', type='float', default=1.0,
+                    help='Time spent on each benchmark.')
+  parser.add_option('-k', dest='pattern', default='',
+                    help='Only run benchmarks with this in their name.')
+  parser.add_option('--xvfb', dest='xvfb', action='store_true', default=False,
+                    help='Run in a private Xvfb, unless DISPLAY is set.')
+  opts, _ = parser.parse_args(argv)
+
+  xvfb = start_xvfb() if opts.xvfb else None
+  try:
+    results = []
+    for module_name in modules:
+      # Imported late, Gtk wants a DISPLAY.
+      module = importlib.import_module('.' + module_name, __package__)
+      results += run(module.cases(), opts.min_secs, opts.pattern)
+  finally:
+    if xvfb:
+      xvfb.terminate()
+  report(results)
+
+  if opts.json:
+    save_json(opts.json, results)
+  if opts.save_baseline:
+    os.makedirs(os.path.dirname(os.path.abspath(opts.baseline)), exist_ok=True)
+    save_json(opts.baseline, results)
+    print(f'Saved baseline {opts.baseline}')
+    return 0
+  if not os.path.exists(opts.baseline):
+    print(f'FAILED, no baseline {opts.baseline}, save one with --save-baseline')
+    return 2
+  regressions = compare(results, load_json(opts.baseline), opts.threshold)
+  for name, base, rate in regressions:
+    print(f'REGRESSION {name}: {rate:.1f} /s, baseline {base:.1f} /s')
+  return 1 if regressions else 0
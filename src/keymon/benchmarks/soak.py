@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Soak test, hours of synthetic traffic in accelerated time.
+
+Typing, mouse moves, clicks, scrolls and keyboard layout switches are
+replayed as RECORD payloads through XEvents and KeyMon, on a fake clock so
+the key timeouts expire without waiting.  Memory is measured with tracemalloc
+every few simulated minutes.  After a warm up the memory shouldn't grow; the test
+fails if it grew more than the threshold and prints the top allocating sites.
+
+Run from the src directory:
+  python3 -m keymon.benchmarks.soak [--hours 2] [--xvfb]
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import optparse
+import random
+import sys
+import tracemalloc
+
+TICKS_PER_SEC = 10
+KEYS_PER_SEC = 6
+MOVES_PER_SEC = 30
+# X keycodes: letters, space, enter, backspace, numpad, modifiers.
+KEYCODES = list(range(24, 34)) + list(range(38, 47)) + list(range(52, 59)) + [
+    65, 36, 22, 79, 80, 81, 87, 88, 89, 50, 37, 64, 133]
+# The keyboard layouts, one per XKB group.
+KEYMAPS = ('us.kbd', 'de.kbd')
+
+
+class FakeClock():
+  """Stands in for the time module, time only moves when told to."""
+  def __init__(self, now=1000000.0):
+    self.now = now
+
+  def time(self):
+    return self.now
+
+  def sleep(self, secs):
+    self.now += secs
+
+  def advance(self, secs):
+    self.now += secs
+
+
+def install_clock(clock):
+  """Make the modules reading the time use clock."""
+  from .. import history_strip
+  from .. import key_mon
+  from .. import two_state_image
+  for module in (history_strip, key_mon, two_state_image):
+    module.time = clock
+
+
+class Traffic():
+  """Generates one tick of synthetic events, as RECORD replies."""
+  def __init__(self, root, seed):
+    from Xlib.protocol import event
+    from . import bench_xlib
+    self.event = event
+    self.bench_xlib = bench_xlib
+    self.root = root
+    self.random = random.Random(seed)
+    self.pos = [640, 512]
+    self.group = 0  # XKB group of the events, the keyboard layout.
+
+  def _payload(self, kinds, x, y):
+    return self.bench_xlib.payload(self.root, kinds, x, y,
+                                   state=self.group << 13)
+
+  def tick(self):
+    """The replies for 1 / TICKS_PER_SEC seconds of use."""
+    rnd = self.random
+    event = self.event
+    kinds = []
+    for _ in range(KEYS_PER_SEC // TICKS_PER_SEC + (rnd.random() < 0.6)):
+      code = rnd.choice(KEYCODES)
+      kinds += [(event.KeyPress, code), (event.KeyRelease, code)]
+    replies = [self._payload(kinds, *self.pos)] if kinds else []
+    for _ in range(MOVES_PER_SEC // TICKS_PER_SEC):
+      self.pos[0] = min(1279, max(0, self.pos[0] + rnd.randint(-20, 20)))
+      self.pos[1] = min(1023, max(0, self.pos[1] + rnd.randint(-20, 20)))
+      replies.append(self._payload([(event.MotionNotify, 0)], *self.pos))
+    if rnd.random() < 0.05:
+      button = rnd.choice((1, 1, 1, 3, 4, 5))
+      replies.append(self._payload(
+          [(event.ButtonPress, button), (event.ButtonRelease, button)],
+          *self.pos))
+    return [self.bench_xlib.reply(data) for data in replies]
+
+
+def top_sites(snapshot, base, count):
+  """Lines describing the count sites which allocated most since base."""
+  stats = snapshot.compare_to(base, 'lineno')
+  return [str(stat) for stat in stats[:count]]
+
+
+def soak(hours, interval_mins, warmup_mins, threshold_kb, top, seed):
+  """Run the soak test, returns True if the memory stayed flat."""
+  from .. import mod_mapper
+  from . import bench_dispatch
+
+  clock = FakeClock()
+  install_clock(clock)
+  keymon = bench_dispatch.make_keymon(old_keys=8)
+  devices = keymon.devices
+  traffic = Traffic(devices.record_display.screen().root, seed)
+  # As if the X server had these layouts, the events' group picks one.
+  keymon.modmaps = [
+      mod_mapper.safely_read_mod_map(
+          kbd, keymon.options.kbd_files, cache=keymon.kbd_cache)
+      for kbd in KEYMAPS]
+  keymon.switch_group(0)
+
+  ticks = int(hours * 3600 * TICKS_PER_SEC)
+  interval = int(interval_mins * 60 * TICKS_PER_SEC)
+  warmup = int(warmup_mins * 60 * TICKS_PER_SEC)
+  tracemalloc.start(10)
+  base = None
+  for tick in range(1, ticks + 1):
+    for one_reply in traffic.tick():
+      devices._handler(one_reply)
+    keymon.on_idle()
+    clock.advance(1.0 / TICKS_PER_SEC)
+    # No events, lets the images time out.
+    keymon.on_idle()
+    bench_dispatch.flush()
+    if tick % (TICKS_PER_SEC * 60 * 15) == 0:
+      # Switch the layout every 15 minutes, KeyMon follows the next key.
+      traffic.group = (traffic.group + 1) % len(KEYMAPS)
+    if tick == warmup:
+      base = tracemalloc.take_snapshot()
+    if tick % interval == 0:
+      current, peak = tracemalloc.get_traced_memory()
+      print(f'{tick / TICKS_PER_SEC / 3600:6.2f}h traced {current / 1024:9.1f} KiB'
+            f' peak {peak / 1024:9.1f} KiB')
+  if base is None:
+    print('The run is shorter than the warm up, nothing to compare.')
+    return True
+  final = tracemalloc.take_snapshot()
+  growth = (sum(stat.size for stat in final.statistics('filename'))
+            - sum(stat.size for stat in base.statistics('filename')))
+  print(f'Growth after warm up: {growth / 1024:.1f} KiB '
+        f'(threshold {threshold_kb} KiB)')
+  print('Top allocating sites since the warm up:')
+  for line in top_sites(final, base, top):
+    print('  ' + line)
+  tracemalloc.stop()
+  return growth <= threshold_kb * 1024
+
+
+def main(argv=None):
+  parser = optparse.OptionParser(usage='%prog [options]')
+  parser.add_option('--hours', dest='hours', type='float', default=2.0,
+                    help='Simulated hours of use.')
+  parser.add_option('--interval', dest='interval_mins', type='float', default=10,
+                    help='Simulated minutes between memory reports.')
+  parser.add_option('--warmup', dest='warmup_mins', type='float', default=20,
+                    help='Simulated minutes before memory should be flat.')
+  parser.add_option('--threshold-kb', dest='threshold_kb', type='float',
+                    default=512, help='Allowed growth after the warm up.')
+  parser.add_option('--top', dest='top', type='int', default=10,
+                    help='Number of allocating sites to list.')
+  parser.add_option('--seed', dest='seed', type='int', default=1,
+                    help='Seed of the synthetic traffic.')
+  parser.add_option('--xvfb', dest='xvfb', action='store_true', default=False,
+                    help='Run in a private Xvfb, unless DISPLAY is set.')
+  opts, _ = parser.parse_args(argv)
+
+  from . import harness
+  xvfb = harness.start_xvfb() if opts.xvfb else None
+  try:
+    flat = soak(opts.hours, opts.interval_mins, opts.warmup_mins,
+                opts.threshold_kb, opts.top, opts.seed)
+  finally:
+    if xvfb:
+      xvfb.terminate()
+  if not flat:
+    print('FAILED, memory keeps growing')
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Command line of key-mon, the options and the commands that don't show
+the overlay, ex. --version and --list-themes.
+
+Importing GTK takes a good part of the startup time, so the overlay in
+key_mon is only imported once it's shown.
+"""
+
+__author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
+__version__ = '1.20'
+
+import gettext
+import logging
+import os
+import sys
+
+from . import config_files
+from . import options
+
+gettext.install('key-mon', 'locale')
+
+def show_version():
+  """Show the version number and author, used by help2man."""
+  print(_(f'Keymon version {__version__}.'))
+  print(_(f'Written by {__author__}'))
+
+def create_options():
+  """Create the options available"""
+  opts = options.Options()
+
+  opts.add_option(opt_short='-s', opt_long='--smaller', dest='smaller', default=False,
+                  type='bool',
+                  help=_('Make the dialog 25% smaller than normal.'))
+  opts.add_option(opt_short='-l', opt_long='--larger', dest='larger', default=False,
+                  type='bool',
+                  help=_('Make the dialog 25% larger than normal.'))
+  opts.add_option(opt_short='-m', opt_long='--meta', dest='meta', type='bool',
+                  ini_group='buttons', ini_name='meta', default=None,
+                  help=_('Show the meta (windows) key.'))
+  opts.add_option(opt_long='--mouse', dest='mouse', type='bool', default=True,
+                  ini_group='buttons', ini_name='mouse',
+                  help=_('Show the mouse.'))
+  opts.add_option(opt_long='--shift', dest='shift', type='bool', default=True,
+                  ini_group='buttons', ini_name='shift',
+                  help=_('Show shift key.'))
+  opts.add_option(opt_long='--ctrl', dest='ctrl', type='bool', default=True,
+                  ini_group='buttons', ini_name='ctrl',
+                  help=_('Show the ctrl key.'))
+  opts.add_option(opt_long='--alt', dest='alt', type='bool', default=True,
+                  ini_group='buttons', ini_name='alt',
+                  help=_('Show the alt key.'))
+  opts.add_option(opt_long='--scale', dest='scale', type='float', default=1.0,
+                  ini_group='ui', ini_name='scale',
+                  help=_('Scale the dialog. ex. 2.0 is 2 times larger, 0.5 is '
+                         'half the size. Defaults to %default'))
+  opts.add_option(opt_long='--key-timeout', dest='key_timeout',
+                  type='float', default=0.5,
+                  ini_group='ui', ini_name='key_timeout',
+                  help=_('Timeout before key returns to unpressed image. '
+                         'Defaults to %default'))
+  opts.add_option(opt_long='--mouse-timeout', dest='mouse_timeout',
+                  type='float', default=0.2,
+                  ini_group='ui', ini_name='mouse_timeout',
+                  help=_('Timeout before mouse returns to unpressed image. '
+                         'Defaults to %default'))
+  opts.add_option(opt_long='--visible-click-timeout', dest='visible_click_timeout',
+                  type='float', default=0.2,
+                  ini_group='ui', ini_name='visible_click_timeout',
+                  help=_('Timeout before highly visible click disappears. '
+                         'Defaults to %default'))
+  opts.add_option(opt_long='--decorated', dest='decorated', type='bool',
+                  ini_group='ui', ini_name='decorated',
+                  default=False,
+                  help=_('Show decoration'))
+  opts.add_option(opt_long='--backgroundless', dest='backgroundless', type='bool',
+                  ini_group='ui', ini_name='backgroundless',
+                  default=False,
+                  help=_('Show only buttons'))
+  opts.add_option(opt_long='--no-press-fadeout', dest='no_press_fadeout',
+                  type='float', default=0.0,
+                  ini_group='ui', ini_name='no_press_fadeout',
+                  help=_('Fadeout the window after a period with no key press. '
+                         'Defaults to %default seconds (Experimental)'))
+  opts.add_option(opt_long='--only_combo', dest='only_combo', type='bool',
+                  ini_group='ui', ini_name='only_combo',
+                  default=False,
+                  help=_('Show only key combos (ex. Control-A)'))
+  opts.add_option(opt_long='--sticky', dest='sticky_mode', type='bool',
+                  ini_group='ui', ini_name='sticky_mode',
+                  default=False,
+                  help=_('Sticky mode'))
+  opts.add_option(opt_long='--shifted-labels', dest='shifted_labels',
+                  type='bool', ini_group='ui', ini_name='shifted_labels',
+                  default=False,
+                  help=_('Show the symbol typed with Shift or AltGr, '
+                         'ex. ! for Shift+1'))
+  opts.add_option(opt_long='--visible_click', dest='visible_click', type='bool',
+                  ini_group='ui', ini_name='visible-click',
+                  default=False,
+                  help=_('Show where you clicked'))
+  opts.add_option(opt_long='--click_color', dest='click_color', type='str',
+                  ini_group='ui', ini_name='click-color',
+                  default='ff0000',
+                  help=_('The color of the click indicator'))
+  opts.add_option(opt_long='--click_opacity', dest='click_opacity', type='float',
+                  ini_group='ui', ini_name='click-opacity',
+                  default=0.5,
+                  help=_('The opacity of the click indicator'))
+  opts.add_option(opt_long='--follow_mouse', dest='follow_mouse', type='bool',
+                  ini_group='ui', ini_name='follow-mouse',
+                  default=False,
+                  help=_('Show the mouse more visibly'))
+  opts.add_option(opt_long='--kbdfile', dest='kbd_file',
+                  ini_group='devices', ini_name='map',
+                  default=None,
+                  help=_('Use this kbd filename.'))
+  opts.add_option(opt_long='--swap', dest='swap_buttons', type='bool',
+                  default=False,
+                  ini_group='devices', ini_name='swap_buttons',
+                  help=_('Swap the mouse buttons.'))
+  opts.add_option(opt_long='--emulate-middle', dest='emulate_middle', type='bool',
+                  default=False,
+                  ini_group='devices', ini_name='emulate_middle',
+                  help=_('When you press the left, and right mouse buttons at the same time, '
+                         'it displays as a middle mouse button click. '))
+  opts.add_option(opt_short='-v', opt_long='--version', dest='version', type='bool',
+                  help=_('Show version information and exit.'))
+  opts.add_option(opt_short='-t', opt_long='--theme', dest='theme', type='str',
+                  ini_group='ui', ini_name='theme', default='classic',
+                  help=_('The theme to use when drawing status images (ex. "-t apple").'))
+  opts.add_option(opt_long='--list-themes', dest='list_themes', type='bool',
+                  help=_('List available themes'))
+  opts.add_option(opt_long='--old-keys', dest='old_keys', type='int',
+                  ini_group='buttons', ini_name='old-keys',
+                  help=_('How many historical keypresses to show (defaults to %default)'),
+                  default=0)
+  opts.add_option(opt_long='--history-strip', dest='history_strip', type='bool',
+                  ini_group='ui', ini_name='history_strip',
+                  default=False,
+                  help=_('Draw the historical keypresses in a single strip, '
+                         'faster when --old-keys is large'))
+  opts.add_option(opt_long='--glyph-atlas', dest='glyph_atlas', type='bool',
+                  ini_group='ui', ini_name='glyph_atlas',
+                  default=False,
+                  help=_('Draw key labels with Pango on a cached key cap '
+                         'instead of rendering an SVG for every key'))
+  opts.add_option(opt_long='--disk-cache', dest='disk_cache', type='bool',
+                  ini_group='ui', ini_name='disk_cache',
+                  default=True,
+                  help=_('Keep rendered images, parsed keymaps and the list '
+                         'of themes in ~/.cache/key-mon between runs'))
+  opts.add_option(opt_long='--image-cache-mb', dest='image_cache_mb', type='int',
+                  ini_group='ui', ini_name='image_cache_mb',
+                  default=32,
+                  help=_('Memory used to keep rendered images, in MB '
+                         '(defaults to %default)'))
+  opts.add_option(opt_long='--reset', dest='reset', type='bool',
+                  help=_('Reset all options to their defaults.'),
+                  default=None)
+
+  opts.add_option(opt_short=None, opt_long='--opacity', type='float',
+                  dest='opacity', default=1.0, help='Opacity of window',
+                  ini_group='ui', ini_name='opacity')
+  opts.add_option(opt_short=None, opt_long=None, type='int',
+                  dest='x_pos', default=-1, help='Last X Position',
+                  ini_group='position', ini_name='x')
+  opts.add_option(opt_short=None, opt_long=None, type='int',
+                  dest='y_pos', default=-1, help='Last Y Position',
+                  ini_group='position', ini_name='y')
+
+  opts.add_option_group(_('Developer Options'), _('These options are for developers.'))
+  opts.add_option(opt_long='--loglevel', dest='loglevel', type='str', default='',
+                  help=_('Logging level'))
+  opts.add_option(opt_short='-d', opt_long='--debug', dest='debug', type='bool',
+                  default=False,
+                  help=_('Output debugging information. '
+                         'Shorthand for --loglevel=debug'))
+  opts.add_option(opt_long='--screenshot', dest='screenshot', type='str', default='',
+                  help=_('Create a "screenshot.png" and exit. '
+                         'Pass a comma separated list of keys to simulate'
+                         '(ex. "KEY_A,KEY_LEFTCTRL").'))
+  return opts
+
+
+def main():
+  """Run the program."""
+  # Check for --loglevel, --debug, we deal with them by ourselves because
+  # option parser also use logging.
+  loglevel = None
+  for idx, arg in enumerate(sys.argv):
+    if '--loglevel' in arg:
+      if '=' in arg:
+        loglevel = arg.split('=')[1]
+      else:
+        loglevel = sys.argv[idx + 1]
+      level = getattr(logging, loglevel.upper(), None)
+      if level is None:
+        raise ValueError(f'Invalid log level: {loglevel}')
+      loglevel = level
+    elif '--debug' in sys.argv or '-d' in sys.argv:
+      loglevel = logging.DEBUG
+  logging.basicConfig(
+      level=loglevel, style='{',
+      format='{filename} [{lineno}]: {levelname} {message}')
+  if loglevel is None:
+    # Disabling warning, info, debug messages
+    logging.disable(logging.WARNING)
+
+  opts = create_options()
+  opts.read_ini_file(os.path.join(config_files.get_config_dir(), 'config'))
+  desc = _('Usage: %prog [Options...]')
+  opts.parse_args(desc, sys.argv)
+
+  if opts.version:
+    show_version()
+    sys.exit(0)
+  if opts.smaller:
+    opts.scale = 0.75
+  elif opts.larger:
+    opts.scale = 1.25
+
+  opts.themes = config_files.get_themes(opts.disk_cache)
+  if opts.list_themes:
+    print(_('Available themes:'))
+    print()
+    theme_names = sorted(opts.themes)
+    name_len = max(len(name) for name in theme_names)
+    for theme in theme_names:
+      print(f' - {theme:<{name_len}}: {opts.themes[theme].description}')
+    raise SystemExit()
+
+  if opts.theme and opts.theme not in opts.themes:
+    print(_(f'Theme {opts.theme!r} does not exist'))
+    print()
+    print(_(f'Please make sure {opts.theme!r} can be found in '
+            'one of the following directories:'))
+    print()
+    for theme_dir in config_files.get_config_dirs('themes'):
+      print(f' - {theme_dir}')
+    sys.exit(-1)
+  if opts.reset:
+    print(_('Resetting to defaults.'))
+    opts.reset_to_defaults()
+    opts.save()
+  # Only now, --help, --version and --list-themes don't need GTK.
+  from . import key_mon
+  key_mon.run(opts)
+
+if __name__ == '__main__':
+  main()
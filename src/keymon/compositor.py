@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stack image layers, one on top of the other, and tint images.
+
+The layers are always the same size and never scaled or moved, ex. the
+mouse with its left, middle and right buttons.  With NumPy the pixels are
+blended as arrays, alpha over in premultiplied form, otherwise with
+GdkPixbuf.composite() without interpolation.
+
+tint() paints a color through the alpha of an image, so an image rendered
+once can be shown in any color without rendering the SVG again.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import logging
+import re
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_foreign("cairo")
+from gi.repository import GLib, GdkPixbuf
+import cairo
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+def composite(img, img2):
+  """Return img2 layered on top of img, img may be changed."""
+  if numpy is not None and _same_rgba(img, img2):
+    return composite_numpy(img, img2)
+  return composite_gdk(img, img2)
+
+
+def composite_gdk(img, img2):
+  """Layer img2 on top of img, in place."""
+  img2.composite(
+      img,
+      0, 0, img.props.width, img.props.height,  # x, y, w, h
+      0, 0,  # offset x, y
+      1.0, 1.0,  # scale x, y
+      GdkPixbuf.InterpType.NEAREST, 255)  # interpolation type, alpha
+  return img
+
+
+def composite_numpy(img, img2):
+  """Return a new pixbuf of img2 layered on top of img."""
+  dst = _to_array(img).astype(numpy.float32)
+  src = _to_array(img2).astype(numpy.float32)
+  src_alpha = src[..., 3:] / 255.0
+  dst_alpha = dst[..., 3:] / 255.0 * (1.0 - src_alpha)
+  out_alpha = src_alpha + dst_alpha
+  out = numpy.empty_like(dst)
+  out[..., :3] = src[..., :3] * src_alpha + dst[..., :3] * dst_alpha
+  numpy.divide(out[..., :3], out_alpha, out=out[..., :3],
+               where=out_alpha > 0.0)
+  out[..., 3:] = out_alpha * 255.0
+  return _from_array(numpy.rint(out).astype(numpy.uint8))
+
+
+def parse_color(color):
+  """Parse 'rrggbb' or '#rrggbb' into (r, g, b) floats, None if invalid."""
+  grps = re.match(r'#?([0-9A-Fa-f]{2})([0-9A-Fa-f]{2})([0-9A-Fa-f]{2})$',
+                  color or '')
+  if not grps:
+    return None
+  return tuple(int(grp, 16) / 255.0 for grp in grps.groups())
+
+
+def tint(mask, color):
+  """Return a new surface, color painted through the alpha of mask.
+  Args:
+    mask: cairo ImageSurface, only its alpha is used.
+    color: 'rrggbb', if invalid mask is returned unchanged.
+  """
+  rgb = parse_color(color)
+  if rgb is None:
+    logging.warning('Invalid color %r', color)
+    return mask
+  surface = cairo.ImageSurface(
+      cairo.FORMAT_ARGB32, mask.get_width(), mask.get_height())
+  surface.set_device_scale(*mask.get_device_scale())
+  ctx = cairo.Context(surface)
+  ctx.set_source_rgb(*rgb)
+  ctx.mask_surface(mask, 0, 0)
+  return surface
+
+
+def _same_rgba(img, img2):
+  return (img.get_n_channels() == 4 and img2.get_n_channels() == 4
+          and img.get_bits_per_sample() == 8
+          and img2.get_bits_per_sample() == 8
+          and img.get_width() == img2.get_width()
+          and img.get_height() == img2.get_height())
+
+
+def _to_array(img):
+  """The pixels of img as a height x width x 4 array."""
+  width, height = img.get_width(), img.get_height()
+  rowstride = img.get_rowstride()
+  data = img.read_pixel_bytes().get_data()
+  # The last row isn't padded to the rowstride.
+  data = data + bytes(rowstride * height - len(data))
+  rows = numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, rowstride)
+  return rows[:, :width * 4].reshape(height, width, 4)
+
+
+def _from_array(pixels):
+  height, width, _ = pixels.shape
+  return GdkPixbuf.Pixbuf.new_from_bytes(
+      GLib.Bytes.new(pixels.tobytes()), GdkPixbuf.Colorspace.RGB, True, 8,
+      width, height, width * 4)
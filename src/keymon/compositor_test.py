@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_foreign("cairo")
+from gi.repository import GdkPixbuf
+import cairo
+
+from . import compositor
+
+def _pixbufs(width, height):
+  """Pairs of solid RGBA pixbufs, opaque, translucent and clear."""
+  colors = (0xff000000, 0x336699ff, 0xc0ffee80, 0x12345601, 0x80808040)
+  pairs = []
+  for bottom in colors:
+    for top in colors:
+      img = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+      img.fill(bottom)
+      img2 = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+      img2.fill(top)
+      pairs.append((img, img2))
+  return pairs
+
+
+def _reference(img, img2):
+  """How images used to be composited."""
+  img = img.copy()
+  img2.composite(img, 0, 0, img.props.width, img.props.height, 0, 0,
+                 1.0, 1.0, GdkPixbuf.InterpType.HYPER, 255)
+  return img
+
+
+class TestCompositor(unittest.TestCase):
+  """Unit tests for the compositor module"""
+
+  def assertClose(self, got, want):
+    self.assertEqual((got.get_width(), got.get_height()),
+                     (want.get_width(), want.get_height()))
+    got_rows, want_rows = got.get_pixels(), want.get_pixels()
+    for y in range(want.get_height()):
+      for x in range(want.get_width()):
+        got_px = got_rows[y * got.get_rowstride() + x * 4:][:4]
+        want_px = want_rows[y * want.get_rowstride() + x * 4:][:4]
+        if want_px[3] <= 8:
+          # Nearly clear pixels have meaningless colors.
+          continue
+        for got_val, want_val in zip(got_px, want_px):
+          self.assertLessEqual(abs(got_val - want_val), 2, (x, y))
+
+  def test_gdk(self):
+    for img, img2 in _pixbufs(13, 7):
+      want = _reference(img, img2)
+      self.assertClose(compositor.composite_gdk(img.copy(), img2), want)
+
+  @unittest.skipUnless(compositor.numpy, 'needs NumPy')
+  def test_numpy(self):
+    for img, img2 in _pixbufs(13, 7):
+      self.assertClose(compositor.composite_numpy(img, img2), _reference(img, img2))
+
+  def test_parse_color(self):
+    self.assertEqual(compositor.parse_color('#ff0000'), (1.0, 0.0, 0.0))
+    self.assertEqual(compositor.parse_color('00ff00'), (0.0, 1.0, 0.0))
+    self.assertIsNone(compositor.parse_color('red'))
+
+  def test_tint(self):
+    mask = cairo.ImageSurface(cairo.FORMAT_ARGB32, 4, 2)
+    ctx = cairo.Context(mask)
+    ctx.set_source_rgba(0.2, 0.4, 0.6, 1.0)
+    ctx.rectangle(0, 0, 2, 2)
+    ctx.fill()
+    tinted = compositor.tint(mask, '0000ff')
+    data = bytes(tinted.get_data())
+    stride = tinted.get_stride()
+    # Native endian ARGB32, opaque blue on the left, clear on the right.
+    self.assertEqual(int.from_bytes(data[0:4], 'little'), 0xff0000ff)
+    self.assertEqual(int.from_bytes(data[stride + 12:stride + 16], 'little'), 0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Watch files and directories for changes with a GIO file monitor.
+
+On Linux GIO uses inotify.  Saving a file in an editor is often several
+events, a write, a rename and a change of attributes, so the changed paths
+are collected and reported together once nothing happened for a moment.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import logging
+import os
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gio, GLib
+
+DEFAULT_DELAY_MS = 250
+
+class FileWatcher():
+  """Calls callback(paths) with the set of paths changed under the watches."""
+  def __init__(self, callback, delay_ms=DEFAULT_DELAY_MS):
+    self.callback = callback
+    self.delay_ms = delay_ms
+    self.monitors = {}  # path -> Gio.FileMonitor
+    self.changed = set()
+    self.timer = None
+
+  def watch(self, path):
+    """Watch the file path, or the files in the directory path."""
+    if path in self.monitors:
+      return
+    gfile = Gio.File.new_for_path(path)
+    try:
+      if os.path.isdir(path):
+        monitor = gfile.monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+      else:
+        monitor = gfile.monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+    except GLib.Error as e:
+      logging.warning('Unable to watch %s: %s', path, e.message)
+      return
+    monitor.connect('changed', self._on_changed)
+    self.monitors[path] = monitor
+    logging.debug('Watching %s', path)
+
+  def close(self):
+    """Stop watching everything."""
+    for monitor in self.monitors.values():
+      monitor.cancel()
+    self.monitors = {}
+    if self.timer:
+      GLib.source_remove(self.timer)
+      self.timer = None
+    self.changed = set()
+
+  def _on_changed(self, unused_monitor, gfile, other_file, unused_event_type):
+    for one in (gfile, other_file):
+      if one is not None and one.get_path():
+        self.changed.add(one.get_path())
+    if self.timer:
+      GLib.source_remove(self.timer)
+    self.timer = GLib.timeout_add(self.delay_ms, self._flush)
+
+  def _flush(self):
+    self.timer = None
+    changed, self.changed = self.changed, set()
+    logging.debug('Files changed: %s', sorted(changed))
+    self.callback(changed)
+    return False
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Draw key labels with Pango on a pre-rendered blank key cap.
+
+The SVG key templates contain a single <text> element whose content is
+'&amp;'.  Instead of substituting the label and rasterizing the whole SVG for
+every new key, the template is rasterized once without a label (the cap) and
+the label's font, color and position are read from the <text> element.
+
+Labels are drawn once with Pango into a glyph atlas, a few large cairo
+surfaces packed in shelves.  A key image is then the cap with the label's
+atlas rectangle painted on top.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import logging
+import re
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_version("Pango", "1.0")
+gi.require_version("PangoCairo", "1.0")
+gi.require_foreign("cairo")
+from gi.repository import Gdk, Pango, PangoCairo
+import cairo
+
+from . import svg_template
+
+ATLAS_SIZE = 1024
+
+WEIGHTS = {
+    'normal': Pango.Weight.NORMAL,
+    'bold': Pango.Weight.BOLD,
+    'bolder': Pango.Weight.ULTRABOLD,
+    'lighter': Pango.Weight.LIGHT,
+}
+
+STYLES = {
+    'normal': Pango.Style.NORMAL,
+    'italic': Pango.Style.ITALIC,
+    'oblique': Pango.Style.OBLIQUE,
+}
+
+STRETCHES = {
+    'normal': Pango.Stretch.NORMAL,
+    'condensed': Pango.Stretch.CONDENSED,
+    'semi-condensed': Pango.Stretch.SEMI_CONDENSED,
+    'semi-expanded': Pango.Stretch.SEMI_EXPANDED,
+    'expanded': Pango.Stretch.EXPANDED,
+}
+
+class LabelStyle():
+  """Font, color and anchor of the label in a key template."""
+  def __init__(self, x, y, family='Sans', size=16.0, weight='normal',
+               style='normal', stretch='normal', anchor='middle',
+               color=(0.0, 0.0, 0.0), opacity=1.0):
+    self.x = x
+    self.y = y
+    self.family = family
+    self.size = size
+    self.weight = weight
+    self.style = style
+    self.stretch = stretch
+    self.anchor = anchor
+    self.color = color
+    self.opacity = opacity
+
+  def font_description(self, scale):
+    """Pango font description at scale."""
+    desc = Pango.FontDescription()
+    desc.set_family(self.family)
+    desc.set_absolute_size(self.size * scale * Pango.SCALE)
+    desc.set_weight(WEIGHTS.get(self.weight, Pango.Weight.NORMAL))
+    desc.set_style(STYLES.get(self.style, Pango.Style.NORMAL))
+    desc.set_stretch(STRETCHES.get(self.stretch, Pango.Stretch.NORMAL))
+    return desc
+
+
+def _parse_style(style, props):
+  """Update dict props with the css properties in style."""
+  for item in style.split(';'):
+    if ':' in item:
+      name, value = item.split(':', 1)
+      props[name.strip()] = value.strip()
+
+
+def _parse_color(value):
+  """Parse #rrggbb into floats, black if unknown."""
+  grps = re.match(r'#([0-9A-Fa-f]{2})([0-9A-Fa-f]{2})([0-9A-Fa-f]{2})$', value)
+  if not grps:
+    return (0.0, 0.0, 0.0)
+  return tuple(int(grp, 16) / 255.0 for grp in grps.groups())
+
+
+def _parse_size(value, default):
+  grps = re.match(r'([\d.]+)', value or '')
+  if not grps:
+    return default
+  return float(grps.group(1))
+
+
+def parse_label_style(svg_text):
+  """Find the label's style in a key template.
+  Args:
+    svg_text: template containing a <text> with a '&amp;' label.
+  Returns:
+    LabelStyle or None if there's no label.
+  """
+  pos = svg_text.find('&amp;')
+  if pos < 0:
+    return None
+  start = svg_text.rfind('<text', 0, pos)
+  if start < 0:
+    return None
+  props = {}
+  x = y = None
+  # Attributes of <text>, then of any <tspan>, inner ones override.
+  for tag in re.finditer(r'<(?:text|tspan)\b([^>]*)>', svg_text[start:pos]):
+    attrs = dict(re.findall(r'([\w:-]+)="([^"]*)"', tag.group(1)))
+    x = _parse_size(attrs.get('x'), x)
+    y = _parse_size(attrs.get('y'), y)
+    _parse_style(attrs.get('style', ''), props)
+  if x is None or y is None:
+    return None
+  family = props.get('font-family', 'Sans').strip('\'"')
+  return LabelStyle(
+      x, y,
+      family=family,
+      size=_parse_size(props.get('font-size'), 16.0),
+      weight=props.get('font-weight', 'normal'),
+      style=props.get('font-style', 'normal'),
+      stretch=props.get('font-stretch', 'normal'),
+      anchor=props.get('text-anchor', 'start'),
+      color=_parse_color(props.get('fill', '#000000')),
+      opacity=_parse_size(props.get('fill-opacity'), 1.0))
+
+
+class AtlasPage():
+  """One surface, labels are packed left to right in shelves."""
+  def __init__(self, size=ATLAS_SIZE):
+    self.size = size
+    self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+    self.shelf_y = 0
+    self.shelf_height = 0
+    self.cursor_x = 0
+
+  def allocate(self, width, height):
+    """Find room for a width x height rectangle.
+    Returns:
+      (x, y) or None if the page is full.
+    """
+    if width > self.size or height > self.size:
+      return None
+    if self.cursor_x + width > self.size:
+      # Start a new shelf.
+      self.shelf_y += self.shelf_height
+      self.shelf_height = 0
+      self.cursor_x = 0
+    if self.shelf_y + height > self.size:
+      return None
+    pos = (self.cursor_x, self.shelf_y)
+    self.cursor_x += width
+    self.shelf_height = max(self.shelf_height, height)
+    return pos
+
+
+class GlyphAtlas():
+  """Creates key images from a blank cap and a cached label."""
+  def __init__(self, pixbufs):
+    """Initialize with empty caches.
+    Args:
+      pixbufs: LazyPixbufCreator, used to rasterize the caps at its scale.
+    """
+    self.pixbufs = pixbufs
+    self.reset()
+
+  def reset(self):
+    """Forget every cap and label, ex. after a theme or scale change."""
+    self.caps = {}  # template fname -> (cap surface, LabelStyle)
+    self.pages = []
+    self.labels = {}  # (template fname, label) -> (page, x, y, w, h, dx, dy)
+
+  def closure(self, fname, label):
+    """Return a function creating the key image for label on template fname."""
+
+    def create_key():
+      """Create the image, a GdkPixbuf."""
+      return self.create_key(fname, label)
+
+    # Lets the disk cache know what the image is made of.
+    create_key.cache_key = (fname, ('atlas', label))
+    # The atlas isn't thread safe.
+    create_key.main_thread = True
+    return create_key
+
+  def create_key(self, fname, label):
+    """Composite the cap of fname and label into a new GdkPixbuf."""
+    cap, style = self._cap(fname)
+    width, height = cap.get_width(), cap.get_height()
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    ctx.set_source_surface(cap, 0, 0)
+    ctx.paint()
+    if style and label:
+      page, x, y, w, h, dx, dy = self._label(fname, style, label)
+      ctx.rectangle(dx, dy, w, h)
+      ctx.clip()
+      ctx.set_source_surface(page.surface, dx - x, dy - y)
+      ctx.paint()
+    return Gdk.pixbuf_get_from_surface(surface, 0, 0, width, height)
+
+  def _cap(self, fname):
+    """The template rendered without a label, and the label's style."""
+    if fname not in self.caps:
+      logging.debug('Rasterize key cap %s', fname)
+      style = parse_label_style(svg_template.TEMPLATES.read(fname))
+      pixbuf = self.pixbufs.render_template(
+          svg_template.TEMPLATES.get(fname, ('&amp;',)), {'&amp;': ''})
+      cap = Gdk.cairo_surface_create_from_pixbuf(pixbuf, 1, None)
+      if self.pixbufs.used_fallback():
+        # Tried again next time, and the key isn't cached on disk.
+        return cap, style
+      self.caps[fname] = (cap, style)
+    return self.caps[fname]
+
+  def _label(self, fname, style, label):
+    """Atlas rectangle of label, drawing it if needed."""
+    key = (fname, label)
+    if key in self.labels:
+      return self.labels[key]
+    scale = self.pixbufs.pixel_scale
+    # Measure with a scratch context, layouts need one.
+    scratch = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+    layout = PangoCairo.create_layout(scratch)
+    layout.set_font_description(style.font_description(scale))
+    layout.set_text(label, -1)
+    ink, logical = layout.get_pixel_extents()
+    baseline = layout.get_baseline() / Pango.SCALE
+    width, height = max(1, ink.width), max(1, ink.height)
+
+    page, pos = None, None
+    for page in self.pages:
+      pos = page.allocate(width, height)
+      if pos:
+        break
+    if not pos:
+      page = AtlasPage(max(ATLAS_SIZE, width, height))
+      self.pages.append(page)
+      pos = page.allocate(width, height)
+    x, y = pos
+
+    ctx = cairo.Context(page.surface)
+    ctx.set_source_rgba(*style.color, style.opacity)
+    ctx.move_to(x - ink.x, y - ink.y)
+    PangoCairo.show_layout(ctx, layout)
+
+    # Where the ink goes on the cap, the svg (x, y) is the baseline anchor.
+    left = style.x * scale
+    if style.anchor == 'middle':
+      left -= logical.width / 2
+    elif style.anchor == 'end':
+      left -= logical.width
+    top = style.y * scale - baseline
+    entry = (page, x, y, width, height,
+             round(left + ink.x), round(top + ink.y))
+    self.labels[key] = entry
+    return entry
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from . import glyph_atlas
+
+class TestGlyphAtlas(unittest.TestCase):
+  """Unit tests for the glyph_atlas module"""
+
+  def test_parse_label_style(self):
+    sample = '''<g><rect style="fill:#ffffff;stroke:#000000" />
+    <text
+       y="29.8"
+       x="23.8"
+       style="font-size:10px;font-weight:bold;text-anchor:middle;fill:#000000;font-family:Verdana"
+       xml:space="preserve"><tspan
+         y="30.5"
+         x="24"
+         style="font-size:16px;fill:#eeeeee;fill-opacity:0.5">&amp;</tspan></text></g>'''
+    style = glyph_atlas.parse_label_style(sample)
+    self.assertEqual(style.x, 24.0)
+    self.assertEqual(style.y, 30.5)
+    self.assertEqual(style.size, 16.0)
+    self.assertEqual(style.weight, 'bold')
+    self.assertEqual(style.family, 'Verdana')
+    self.assertEqual(style.anchor, 'middle')
+    self.assertEqual(style.color, (0xee / 255.0, 0xee / 255.0, 0xee / 255.0))
+    self.assertEqual(style.opacity, 0.5)
+
+  def test_parse_no_label(self):
+    self.assertIsNone(glyph_atlas.parse_label_style('<svg><g /></svg>'))
+
+  def test_atlas_page_shelves(self):
+    page = glyph_atlas.AtlasPage(size=100)
+    self.assertEqual(page.allocate(60, 10), (0, 0))
+    self.assertEqual(page.allocate(30, 20), (60, 0))
+    # Doesn't fit on the first shelf.
+    self.assertEqual(page.allocate(20, 5), (0, 20))
+    self.assertIsNone(page.allocate(101, 5))
+    self.assertIsNone(page.allocate(10, 90))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Strip showing the last few keys pressed in a single widget.
+
+This replaces a chain of TwoStateImage widgets (one per old key) with one
+drawing area.  The keys are kept in a ring buffer and drawn into a backing
+surface, so adding a key is a single scroll plus one paint no matter how many
+keys of history are shown, and a key timing out only repaints its own slot.
+
+It understands enough of the TwoStateImage interface (switch_to,
+switch_to_default, count_down, empty_event, ...) to be the defer_to target of
+the main key image.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import time
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_foreign("cairo")
+from gi.repository import Gtk
+import cairo
+
+from . import two_state_image
+
+class HistoryStrip(Gtk.DrawingArea):
+  """Draws the last `slots` keys, newest on the right."""
+  def __init__(self, pixbufs, slots, normal='KEY_EMPTY'):
+    Gtk.DrawingArea.__init__(self)
+    self.pixbufs = pixbufs
+    self.slots = max(1, slots)
+    self.normal = normal
+    self.showit = True
+    self.defer_to = None
+    self.really_pressed = False
+    self.timeout_secs = two_state_image.DEFAULT_TIMEOUT_SECS
+    self.timeout_dest = None
+    # Ring buffer, each entry is [name, count_down] or None.
+    self.entries = [None] * self.slots
+    self.head = self.slots - 1
+    self.next_expiry = None
+    self.surfaces = {}
+    self.slot_width = 0
+    self.slot_height = 0
+    self.backing = None
+    self.spare = None
+    self.connect('draw', self._on_draw)
+    self.reset_image()
+
+  # The timeout follows an option like the TwoStateImage it replaces.
+  follow_timeout = two_state_image.TwoStateImage.follow_timeout
+  _timeout_changed = two_state_image.TwoStateImage._timeout_changed
+
+  def reset_image(self, showit=True):
+    """Images from pixbufs have changed, redraw everything."""
+    self.showit = showit
+    self.surfaces = {}
+    empty = self.pixbufs.get(self.normal)
+    scale = self.pixbufs.device_scale
+    self.slot_width = empty.get_width() // scale
+    self.slot_height = empty.get_height() // scale
+    self.set_size_request(self.slot_width * self.slots, self.slot_height)
+    self.backing = self._new_surface()
+    self.spare = self._new_surface()
+    for slot in range(self.slots):
+      self._paint_slot(self.backing, slot)
+    self.queue_draw()
+    if self.showit:
+      self.show()
+
+  def _new_surface(self):
+    """Surface for the whole strip, in device pixels."""
+    scale = self.pixbufs.device_scale
+    surface = cairo.ImageSurface(
+        cairo.FORMAT_ARGB32, self.slot_width * self.slots * scale,
+        self.slot_height * scale)
+    surface.set_device_scale(scale, scale)
+    return surface
+
+  def is_pressed(self):
+    """The strip is never in the pressed state itself."""
+    return False
+
+  def reset_time_if_pressed(self):
+    """Nothing to do, see is_pressed()."""
+
+  def switch_to(self, name):
+    """Push the key name on the right, every other key moves left."""
+    self.head = (self.head + 1) % self.slots
+    self.entries[self.head] = [name, None]
+
+    # Scroll the backing surface one slot to the left into the spare surface,
+    # swap them and paint the new key.
+    ctx = cairo.Context(self.spare)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    ctx.set_source_surface(self.backing, -self.slot_width, 0)
+    ctx.paint()
+    self.backing, self.spare = self.spare, self.backing
+    self._paint_slot(self.backing, 0)
+    self.queue_draw()
+
+  def switch_to_default(self):
+    """Start the countdown of the newest key."""
+    self.count_down = time.time()
+
+  def get_count_down(self):
+    """Time the countdown of the newest key started, or None."""
+    entry = self.entries[self.head]
+    if entry is None:
+      return None
+    return entry[1]
+
+  def set_count_down(self, value):
+    """Set the countdown of the newest key."""
+    entry = self.entries[self.head]
+    if entry is None:
+      return
+    entry[1] = value
+    if value is not None and (
+        self.next_expiry is None or value + self.timeout_secs < self.next_expiry):
+      self.next_expiry = value + self.timeout_secs
+
+  count_down = property(get_count_down, set_count_down, None,
+                        "Countdown start of the newest key")
+
+  def empty_event(self):
+    """Sort of a idle event, clears the keys that timed out.
+
+    Returns False, like TwoStateImage.empty_event().
+    """
+    if self.next_expiry is None:
+      return False
+    now = time.time()
+    if now <= self.next_expiry:
+      return False
+    self.next_expiry = None
+    for index, entry in enumerate(self.entries):
+      if entry is None or entry[1] is None:
+        continue
+      expiry = entry[1] + self.timeout_secs
+      if now > expiry:
+        self.entries[index] = None
+        slot = (self.head - index) % self.slots
+        self._paint_slot(self.backing, slot)
+        self.queue_draw_area(self._slot_x(slot), 0,
+                             self.slot_width, self.slot_height)
+      elif self.next_expiry is None or expiry < self.next_expiry:
+        self.next_expiry = expiry
+    return False
+
+  def _slot_x(self, slot):
+    """Left edge of slot, slot 0 is the rightmost (newest)."""
+    return (self.slots - 1 - slot) * self.slot_width
+
+  def _surface(self, name):
+    """Cached cairo surface for the image called name."""
+    if name not in self.surfaces:
+      if len(self.surfaces) > 2 * self.slots:
+        # Only keep what's on screen.
+        shown = set(entry[0] for entry in self.entries if entry)
+        shown.add(self.normal)
+        self.surfaces = {key: surface for key, surface in self.surfaces.items()
+                         if key in shown}
+      self.surfaces[name] = self.pixbufs.surface(name)
+    return self.surfaces[name]
+
+  def _paint_slot(self, target, slot):
+    """Paint the entry shown in slot on target."""
+    entry = self.entries[(self.head - slot) % self.slots]
+    name = entry[0] if entry else self.normal
+    surface = self._surface(name)
+    x = self._slot_x(slot)
+    ctx = cairo.Context(target)
+    ctx.rectangle(x, 0, self.slot_width, self.slot_height)
+    ctx.clip()
+    ctx.set_operator(cairo.OPERATOR_CLEAR)
+    ctx.paint()
+    ctx.set_operator(cairo.OPERATOR_OVER)
+    scale = self.pixbufs.device_scale
+    width, height = surface.get_width() / scale, surface.get_height() / scale
+    # Wide keys (like space) are shrunk to fit in a slot.
+    scale = min(1.0, self.slot_width / width, self.slot_height / height)
+    ctx.translate(x + (self.slot_width - width * scale) / 2,
+                  (self.slot_height - height * scale) / 2)
+    ctx.scale(scale, scale)
+    ctx.set_source_surface(surface, 0, 0)
+    ctx.paint()
+
+  def _on_draw(self, unused_widget, ctx):
+    """Copy the backing surface, cairo clips to the damaged region."""
+    ctx.set_source_surface(self.backing, 0, 0)
+    ctx.paint()
+    return False
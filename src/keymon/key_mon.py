@@ -20,8 +20,8 @@ Shows their status graphically.
 """
 
 __author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
-__version__ = '1.20'
 
+import configparser
 import gettext
 import locale
 import logging
@@ -35,11 +35,20 @@ except ImportError:
   print('Error: Missing xlib, run sudo apt-get install python3-xlib')
   sys.exit(-1)
 
+from . import animation
+from . import cli
+from . import config_files
+from . import file_watcher
+from . import glyph_atlas
+from . import history_strip
 from . import options
 from . import lazy_pixbuf_creator
 from . import mod_mapper
+from . import pixbuf_cache
 from . import settings
 from . import shaped_window
+from . import svg_template
+from . import theme_pack
 from . import two_state_image
 
 import cairo
@@ -52,26 +61,33 @@ from configparser import ConfigParser
 
 gettext.install('key-mon', 'locale')
 
+# How long it takes the window to fade away once no_press_fadeout expires.
+FADEOUT_SECS = 1.0
+# Changed options are written at most this often.
+SAVE_DELAY_MS = 2000
+# Key name prefixes shown on the modifier images instead of the key image.
+MODIFIER_KEYS = (('KEY_SHIFT', 'SHIFT'), ('KEY_CONTROL', 'CTRL'),
+                 ('KEY_ALT', 'ALT'), ('KEY_ISO_LEVEL3_SHIFT', 'ALT'),
+                 ('KEY_SUPER', 'META'))
+MODIFIER_PREFIXES = tuple(keysym for keysym, _ in MODIFIER_KEYS)
+
 def fix_svg_key_closure(fname, from_tos):
   """Create a closure to modify the key.
   Args:
     from_tos: list of from, to pairs for search replace.
   Returns:
-    A bound function which returns the file fname with modifications.
+    A bound function which returns the file fname with modifications, as an
+    svg_template.Variant.
   """
+  subs = dict(from_tos)
 
   def fix_svg_key():
-    """Given an SVG file return the SVG text fixed."""
-    logging.debug('Read file %s', fname)
-    fin = open(fname)
-    fbytes = fin.read()
-    fin.close()
-    for fin, txt in from_tos:
-      # Quick XML escape fix
-      txt = txt.replace('<', '&lt;')
-      fbytes = fbytes.replace(fin, txt)
-    return fbytes
+    """Given an SVG file return the SVG fixed."""
+    template = svg_template.TEMPLATES.get(fname, tuple(subs))
+    return svg_template.Variant(template, subs)
 
+  # Lets the disk cache know what the image is made of.
+  fix_svg_key.cache_key = (fname, tuple(from_tos))
   return fix_svg_key
 
 
@@ -112,9 +128,11 @@ class KeyMon:
     self.event_box = None
     self.mouse_indicator_win = None
     self.key_image = None
+    self.old_key_images = []
     self.buttons = None
 
     self.no_press_timer = None
+    self.save_timer = None
 
     self.move_dragged = False
 
@@ -124,17 +142,36 @@ class KeyMon:
     self.enabled = {img: self.get_option(cstrf(img.lower)) for img in self.images_constants}
 
 
-    self.options.kbd_files = settings.get_kbd_files()
-    self.modmap = mod_mapper.safely_read_mod_map(self.options.kbd_file, self.options.kbd_files)
+    self.options.kbd_files = config_files.get_kbd_files()
+    self.kbd_cache = None
+    if self.options.disk_cache:
+      self.kbd_cache = mod_mapper.KbdCache(
+          os.path.join(config_files.get_cache_dir(), 'kbd.pickle'))
+    self.devices = xlib.XEvents()
+    self.read_modmap()
+    # Drop the notifications read with the keymap, it's already current.
+    self.devices.refresh_mapping()
+    # The X server tells every client when the keymap changes.
+    GLib.io_add_watch(self.devices.local_display.fileno(), GLib.PRIORITY_DEFAULT,
+                      GLib.IOCondition.IN, self.x_events_pending)
 
     self.name_fnames = self.create_names_to_fnames()
-    self.devices = xlib.XEvents()
     self.devices.start()
 
-    self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator(self.name_fnames,
-                                                         self.options.scale)
+    self.disk_cache = None
+    if self.options.disk_cache:
+      self.disk_cache = pixbuf_cache.DiskCache(
+          os.path.join(config_files.get_cache_dir(), 'pixbufs'))
+    self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator(
+        self.name_fnames, self.options.scale, disk_cache=self.disk_cache,
+        max_bytes=self.options.image_cache_mb * 1024 * 1024)
+    self.glyph_atlas = glyph_atlas.GlyphAtlas(self.pixbufs)
+    self.label_names = set()
     self.create_window()
     self.reset_no_press_timer()
+    self.watcher = file_watcher.FileWatcher(self.files_changed)
+    self.watch_files()
+    self.subscribe_options()
 
   def get_option(self, attr):
     """Shorthand for getattr(self.options, attr)"""
@@ -283,6 +320,10 @@ class KeyMon:
     """Create the main window."""
     self.window = Gtk.Window()
     self.window.set_name("key-mon")
+    # Render for the monitor's scale factor, ex. 2 on HiDPI screens.
+    self.pixbufs.reset_all(self.name_fnames, self.options.scale,
+                           self.window.get_scale_factor())
+    self.window.connect('notify::scale-factor', self.scale_factor_changed)
 
     rgba = self.window.get_screen().get_rgba_visual()
     if rgba is not None:
@@ -303,6 +344,8 @@ class KeyMon:
 
     self.window.set_resizable(False)
 
+    self.animator = animation.Animator(self.window)
+
     self.window.set_title('Keyboard Status Monitor')
     width, height = 30 * self.options.scale, 48 * self.options.scale
     self.window.set_default_size(int(width), int(height))
@@ -312,10 +355,14 @@ class KeyMon:
         self.svg_name('mouse-indicator'),
         self.options.click_opacity,
         color=self.options.click_color,
-        timeout=self.options.visible_click_timeout)
+        timeout=self.options.visible_click_timeout,
+        disk_cache=self.disk_cache)
+    self.mouse_indicator_win.follow_options(
+        self.options, opacity='click_opacity', color='click_color',
+        timeout='visible_click_timeout')
 
     self.mouse_follower_win = shaped_window.ShapedWindow(
-        self.svg_name('mouse-follower'), 0.5)
+        self.svg_name('mouse-follower'), 0.5, disk_cache=self.disk_cache)
     if self.options.follow_mouse:
       self.mouse_follower_win.show()
 
@@ -373,16 +420,22 @@ class KeyMon:
   def create_buttons(self):
     """Create the buttons"""
     self.buttons = list(self.images[img] for img in self.images_constants)
-    for _ in range(self.options.old_keys):
-      key_image = two_state_image.TwoStateImage(self.pixbufs, 'KEY_EMPTY')
-      self.buttons.append(key_image)
+    if self.options.history_strip and self.options.old_keys:
+      # One widget drawing all the old keys.
+      self.old_key_images = [
+          history_strip.HistoryStrip(self.pixbufs, self.options.old_keys)]
+    else:
+      self.old_key_images = [
+          two_state_image.TwoStateImage(self.pixbufs, 'KEY_EMPTY')
+          for _ in range(self.options.old_keys)]
+    self.buttons.extend(self.old_key_images)
     self.key_image = two_state_image.TwoStateImage(self.pixbufs, 'KEY_EMPTY')
     self.buttons.append(self.key_image)
     for but in self.buttons:
       if but.normal == 'MOUSE':
-        but.timeout_secs = self.options.mouse_timeout
+        but.follow_timeout(self.options, 'mouse_timeout')
       else:
-        but.timeout_secs = self.options.key_timeout
+        but.follow_timeout(self.options, 'key_timeout')
       but.connect('size_allocate', self.update_shape_mask)
 
   def layout_boxes(self):
@@ -395,7 +448,7 @@ class KeyMon:
       self.hbox.pack_start(self.images[img], False, False, 0)
 
     prev_key_image = None
-    for key_image in self.buttons[-(self.options.old_keys + 1):-1]:
+    for key_image in self.old_key_images:
 #      key_image.hide()
       #key_image.timeout_secs = 0.5
       key_image.defer_to = prev_key_image
@@ -410,12 +463,12 @@ class KeyMon:
 
   def svg_name(self, fname):
     """Return an svg filename given the theme, system."""
-    themepath = self.options.themes[self.options.theme][1]
-    fullname = os.path.join(themepath, f'{fname}{self.svg_size}.svg')
-    if self.svg_size and not os.path.exists(fullname):
+    theme = self.options.themes[self.options.theme]
+    basename = f'{fname}{self.svg_size}.svg'
+    if self.svg_size and basename not in theme.assets:
       # Small not found, defaulting to large size
-      fullname = os.path.join(themepath, f'{fname}.svg')
-    return fullname
+      basename = f'{fname}.svg'
+    return os.path.join(theme.path, basename)
 
   def add_events(self):
     """Add events for the window to listen to."""
@@ -450,6 +503,7 @@ class KeyMon:
     self.set_accept_focus(True)
     if evt.button == 1:
       self.move_dragged = widget.get_pointer()
+      self.animator.cancel('fadeout')
       self.window.set_opacity(self.options.opacity)
       # remove no_press_timer
       if self.no_press_timer:
@@ -482,6 +536,23 @@ class KeyMon:
     logging.info('Moved window to %d, %d', x, y)
     self.options.x_pos = x
     self.options.y_pos = y
+    self.save_options_later()
+
+  def save_options_later(self):
+    """Save the options within SAVE_DELAY_MS, with every change until then."""
+    if not self.save_timer:
+      self.save_timer = GLib.timeout_add(SAVE_DELAY_MS, self.save_options)
+
+  def save_options(self):
+    """Save the options now, if they changed."""
+    if self.save_timer:
+      GLib.source_remove(self.save_timer)
+      self.save_timer = None
+    try:
+      self.options.save()
+    except OSError as e:
+      logging.warning('Unable to save the config: %s', e)
+    return False
 
   def on_idle(self):
     """Check for events on idle."""
@@ -527,10 +598,12 @@ class KeyMon:
     elif event.type == 'EV_KEY' and event.value in (0, 1):
       if type(event.code) == str:
         if event.code.startswith('KEY'):
+          if event.group != self.group:
+            self.switch_group(event.group)
           code_num = event.scancode
-          self.handle_key(code_num, event.code, event.value)
+          self.handle_key(code_num, event.code, event.value, event.state)
         elif event.code.startswith('BTN'):
-          self.handle_mouse_button(event.code, event.value)
+          self.handle_mouse_button(event.code, event.value, event.pos)
       if not self.move_dragged:
         self.reset_no_press_timer()
     elif event.type.startswith('EV_REL') and event.code == 'REL_WHEEL':
@@ -540,42 +613,29 @@ class KeyMon:
 
   def reset_no_press_timer(self):
     """Initialize no_press_timer"""
-    if not self.options.no_press_fadeout:
+    config = self.options.snapshot
+    if not config.no_press_fadeout:
       return
     logging.debug('Resetting no_press_timer')
     if not self.window.get_property('visible'):
-      self.window.move(self.options.x_pos, self.options.y_pos)
+      self.window.move(config.x_pos, config.y_pos)
       self.window.show()
-    self.window.set_opacity(self.options.opacity)
+    self.animator.cancel('fadeout')
+    self.window.set_opacity(config.opacity)
     if self.no_press_timer:
       GLib.source_remove(self.no_press_timer)
       self.no_press_timer = None
     self.no_press_timer = GLib.timeout_add(
-        int(self.options.no_press_fadeout * 1000), self.no_press_fadeout)
-
-  def no_press_fadeout(self, begin=True):
-    """Fadeout the window in a second
-    Args:
-      begin: indicate if this timeout is requested by handle_event.
-    """
-    opacity = self.window.get_opacity() - self.options.opacity / 10.0
-    if opacity < 0.0:
-      opacity = 0.0
-    logging.debug('Set opacity = %f', opacity)
-    self.window.set_opacity(opacity)
-    if opacity == 0.0:
-      self.window.hide()
-      # No need to fade out more
-      self.no_press_timer = None
-      return False
+        int(config.no_press_fadeout * 1000), self.no_press_fadeout)
 
-    if begin:
-      # Recreate a new timer with 0.1 seccond interval
-      self.no_press_timer = GLib.timeout_add(100, self.no_press_fadeout)
-      # The current self.options.no_press_fadeout interval will not be timed
-      # out again.
-      return False
-    return True
+  def no_press_fadeout(self):
+    """Fadeout the window in a second."""
+    logging.debug('Fading out window')
+    self.no_press_timer = None
+    self.animator.fade('fadeout', self.window, 0.0, FADEOUT_SECS,
+                       easing=animation.ease_out, on_done=self.window.hide)
+    # The no_press_fadeout interval will not be timed out again.
+    return False
 
   def _show_down_key(self, name):
     """Show the down key.
@@ -585,7 +645,7 @@ class KeyMon:
     Returns:
       True if the key should be shown
     """
-    if not self.options.only_combo:
+    if not self.options.snapshot.only_combo:
       return True
     if self.is_shift_code(name):
       return True
@@ -605,7 +665,7 @@ class KeyMon:
     # on key up
     if self.is_shift_code(name):
       # shift up is always shown
-      if not self.options.sticky_mode:
+      if not self.options.snapshot.sticky_mode:
         image.switch_to_default()
       return
 
@@ -619,22 +679,31 @@ class KeyMon:
       return True
     return False
 
-  def handle_key(self, scan_code, xlib_name, value):
+  def handle_key(self, scan_code, xlib_name, value, state=0):
     """Handle a keyboard event."""
     code, medium_name, short_name = self.modmap.get_and_check(scan_code,
                                                               xlib_name)
     if not code:
       logging.info('No mapping for scan_code %d', scan_code)
       return
-    if self.options.scale < 1.0 and short_name:
+    if self.level_labels and state & mod_mapper.LEVEL_MASK:
+      label = self.level_labels.get(scan_code, state)
+      if (label and label != medium_name and code.startswith('KEY_')
+          and not code.startswith(MODIFIER_PREFIXES)):
+        # Shared by all the keys with this label.
+        name = 'LABEL_' + label
+        if name not in self.name_fnames:
+          self.add_label(name, label)
+        self._handle_event(self.key_image, name, value)
+        return
+    if self.options.snapshot.scale < 1.0 and short_name:
       medium_name = short_name
     logging.debug('Scan code %d, Key %d pressed = %s', scan_code, code, medium_name)
-    if code in self.name_fnames:
-      self._handle_event(self.key_image, code, value)
+    name = self.label_name(code)
+    if name in self.name_fnames:
+      self._handle_event(self.key_image, name, value)
       return
-    for keysym, img in (('KEY_SHIFT', 'SHIFT'), ('KEY_CONTROL', 'CTRL'),
-                        ('KEY_ALT', 'ALT'), ('KEY_ISO_LEVEL3_SHIFT', 'ALT'),
-                        ('KEY_SUPER', 'META')):
+    for keysym, img in MODIFIER_KEYS:
       if code.startswith(keysym):
         if self.enabled[img]:
           if keysym == 'KEY_ISO_LEVEL3_SHIFT':
@@ -642,32 +711,63 @@ class KeyMon:
           else:
             self._handle_event(self.images[img], img, value)
         return
-    if code.startswith('KEY_KP'):
-      letter = medium_name
-      if code not in self.name_fnames:
-        template = 'one-char-numpad-template'
-        self.name_fnames[code] = [
-            fix_svg_key_closure(self.svg_name(template), [('&amp;', letter)])]
-      self._handle_event(self.key_image, code, value)
-      return
-
     if code.startswith('KEY_'):
-      letter = medium_name
-      if code not in self.name_fnames:
-        logging.debug('code not in %s', code)
-        if len(letter) == 1:
-          template = 'one-char-template'
-        else:
-          template = 'multi-char-template'
-        self.name_fnames[code] = [
-            fix_svg_key_closure(self.svg_name(template), [('&amp;', letter)])]
-      else:
-        logging.debug('code in %s', code)
-      self._handle_event(self.key_image, code, value)
-      return
+      logging.debug('code not in %s', code)
+      self.add_label(name, medium_name)
+      self._handle_event(self.key_image, name, value)
+
+  def label_name(self, code):
+    """Name of the image of key code in the current keyboard layout.
+
+    The layouts give some codes different labels, ex. KEY_Y is Z in German,
+    so the labels of the other layouts than the first are named like
+    'KEY_Y:1'.  Keys with an image of the theme, ex. KEY_SPACE, keep it.
+    """
+    if (not self.group or self.group >= len(self.modmaps)
+        or (code in self.name_fnames and code not in self.label_names)):
+      return code
+    return f'{code}:{self.group}'
 
-  def handle_mouse_button(self, code, value):
-    """Handle the mouse button event."""
+  def add_label(self, code, letter):
+    """Add the image of key code, showing letter, to name_fnames."""
+    if code.startswith('KEY_KP'):
+      template = 'one-char-numpad-template'
+    elif len(letter) == 1:
+      template = 'one-char-template'
+    else:
+      template = 'multi-char-template'
+    self.name_fnames[code] = [self.label_closure(template, letter)]
+    self.label_names.add(code)
+
+  def prerender_labels(self):
+    """Render the key images of the current keymap in the background."""
+    names = []
+    small = self.options.snapshot.scale < 1.0
+    for _, (code, medium_name, short_name) in self.modmap.items():
+      name = self.label_name(code)
+      if (name in self.name_fnames or not code.startswith('KEY_')
+          or code.startswith(MODIFIER_PREFIXES)):
+        continue
+      if small and short_name:
+        medium_name = short_name
+      self.add_label(name, medium_name)
+      names.append(name)
+    self.pixbufs.prerender(names)
+
+  def label_closure(self, template, letter):
+    """Closure creating the image of a key showing letter on template."""
+    if self.options.snapshot.glyph_atlas:
+      return self.glyph_atlas.closure(self.svg_name(template), letter)
+    return fix_svg_key_closure(self.svg_name(template), [('&amp;', letter)])
+
+  def handle_mouse_button(self, code, value, pos=None):
+    """Handle the mouse button event.
+    Args:
+      code: button name, ex. 'BTN_LEFT'.
+      value: 1 for down, 0 for up.
+      pos: (root_x, root_y) of the click, if known.
+    """
+    config = self.options.snapshot
     if self.enabled['MOUSE']:
       if code in self.btns:
         n_image = 0
@@ -677,7 +777,7 @@ class KeyMon:
             n_code = i
           if btn == self.images['MOUSE'].current:
             n_image = i
-        if self.options.emulate_middle and (
+        if config.emulate_middle and (
             (self.images['MOUSE'].current == 'BTN_LEFT' and code == 'BTN_RIGHT') or
             (self.images['MOUSE'].current == 'BTN_RIGHT' and code == 'BTN_LEFT')):
           code = 'BTN_MIDDLE'
@@ -693,9 +793,12 @@ class KeyMon:
                 [('>&#8203;', '>' + btn_num)])]
       self._handle_event(self.images['MOUSE'], code, value)
 
-    if self.options.visible_click:
+    if config.visible_click:
       if value == 1:
-        self.mouse_indicator_win.center_on_cursor()
+        if pos:
+          self.mouse_indicator_win.center_on_cursor(*pos)
+        else:
+          self.mouse_indicator_win.center_on_cursor()
         self.mouse_indicator_win.maybe_show()
       else:
         self.mouse_indicator_win.fade_away()
@@ -724,7 +827,11 @@ class KeyMon:
   def destroy(self, unused_widget, unused_data=None):
     """Also quit the program."""
     self.devices.stop_listening()
-    self.options.save()
+    self.watcher.close()
+    self.animator.cancel_all()
+    self.mouse_indicator_win.destroy()
+    self.mouse_follower_win.destroy()
+    self.save_options()
     Gtk.main_quit()
 
   def right_click_handler(self, unused_widget, event):
@@ -769,35 +876,184 @@ class KeyMon:
     """Toggle whether the window has chrome or not."""
     self.window.set_decorated(not current)
     self.options.decorated = not self.options.decorated
+    self.save_options_later()
 
   def show_settings_dlg(self, *unused_args):
     """Show the settings dialog."""
+    # The options it changes are applied by the subscribers of
+    # subscribe_options().
     dlg = settings.SettingsDialog(self.window, self.options)
-    dlg.connect('settings-changed', self.settings_changed)
     dlg.show_all()
     dlg.run()
     dlg.destroy()
 
-  def settings_changed(self, unused_dlg):
-    """Event received from the settings dialog."""
+  def subscribe_options(self):
+    """Apply the options when they change, ex. in the settings dialog.
+
+    The timeouts and the click indicator follow their options themselves.
+    """
+    self.options.subscribe(
+        [img.lower() for img in self.images_constants] +
+        ['old_keys', 'history_strip'], self.buttons_changed)
+    self.options.subscribe(['scale', 'theme', 'swap_buttons', 'glyph_atlas'],
+                           self.render_images)
+    self.options.subscribe(['kbd_file', 'shifted_labels'], self.keymap_changed)
+    self.options.subscribe(['decorated'], self.decorated_changed)
+    self.options.subscribe(['visible_click'], self.visible_click_changed)
+
+  def buttons_changed(self, config, unused_changed):
+    """Show or hide the modifiers, or change the number of old keys."""
     for img in self.images_constants:
-      self._toggle_a_key(self.images[img], img, self.get_option(cstrf(img.lower)))
+      self._toggle_a_key(self.images[img], img, getattr(config, img.lower()))
     self.create_buttons()
     self.layout_boxes()
-    self.mouse_indicator_win.hide()
-    self.mouse_indicator_win.timeout = self.options.visible_click_timeout
-    self.window.set_decorated(self.options.decorated)
-    self.name_fnames = self.create_names_to_fnames()
-    self.pixbufs.reset_all(self.name_fnames, self.options.scale)
+    self.reset_buttons()
+
+  def render_images(self, *unused_args):
+    """Render every image again, ex. for another theme or scale."""
+    # The old images stay until the new ones are rendered.
+    self.pixbufs.render_all(
+        self.create_names_to_fnames(), self.options.snapshot.scale,
+        on_done=self.images_rendered)
+
+  def visible_click_changed(self, config, unused_changed):
+    """Hide the click indicator at once when it's turned off."""
+    if not config.visible_click:
+      self.mouse_indicator_win.hide()
+
+  def decorated_changed(self, config, unused_changed):
+    """Show or hide the window chrome."""
+    self.window.set_decorated(config.decorated)
+
+  def read_modmap(self):
+    """Read the kbd file, or the keymaps of the X server's layouts."""
+    with self.devices.local_lock:
+      self.modmaps = mod_mapper.read_mod_maps(
+          self.options.kbd_file, self.options.kbd_files,
+          disp=self.devices.local_display, cache=self.kbd_cache)
+    self.group = 0
+    self.modmap = self.modmaps[0]
+    self.level_labels = None
+    if self.options.shifted_labels:
+      with self.devices.local_lock:
+        self.level_labels = mod_mapper.read_level_labels(
+            self.devices.local_display)
+
+  def watch_files(self):
+    """Watch the config, theme and kbd files to apply their changes live."""
+    if self.options.ini_filename:
+      self.watcher.watch(self.options.ini_filename)
+    for theme_dir in config_files.get_config_dirs('themes'):
+      self.watcher.watch(theme_dir)
+      for entry in sorted(os.listdir(theme_dir)):
+        if os.path.isdir(os.path.join(theme_dir, entry)):
+          self.watcher.watch(os.path.join(theme_dir, entry))
+    # The kbd files.
+    for config_dir in config_files.get_config_dirs(''):
+      self.watcher.watch(config_dir)
+
+  def files_changed(self, paths):
+    """Files watched by watch_files() changed."""
+    # The kbd directories include the package, where ex. .pyc files change.
+    theme_dirs = set(config_files.get_config_dirs('themes'))
+    paths = {path for path in paths
+             if path == self.options.ini_filename or path.endswith('.kbd')
+             or os.path.dirname(path) in theme_dirs
+             or os.path.dirname(os.path.dirname(path)) in theme_dirs}
+    if not paths:
+      return
+    if self.options.ini_filename in paths:
+      try:
+        changed = self.options.reload_ini_file()
+      except (configparser.Error, options.OptionException) as e:
+        logging.warning('Unable to read the config: %s', e)
+        changed = []
+      if changed:
+        # Applied by the subscribers of subscribe_options().
+        logging.info('Config changed: %s', ', '.join(changed))
+    if any(path.endswith('.kbd') for path in paths):
+      self.kbd_files_changed()
+    self.theme_files_changed(paths)
+
+  def kbd_files_changed(self):
+    """A kbd file was added, removed or edited."""
+    self.options.kbd_files = config_files.get_kbd_files()
+    self.keymap_changed()
+
+  def keymap_changed(self, *unused_args):
+    """Read the keymap again, the labels are made again when next used."""
+    self.read_modmap()
+    for name in self.label_names:
+      self.name_fnames.pop(name, None)
+    self.pixbufs.forget(self.label_names)
+    self.label_names = set()
+
+  def theme_files_changed(self, paths):
+    """Render again the images made from the files paths."""
+    themes = config_files.get_themes(self.options.disk_cache)
+    if themes != self.options.themes:
+      old_theme = self.options.themes.get(self.options.theme)
+      self.options.themes = themes
+      self.watch_files()
+      if themes.get(self.options.theme) != old_theme:
+        logging.info('Theme %s moved or changed files, reloading',
+                     self.options.theme)
+        self.render_images()
+        return
+    for path in paths:
+      if path.endswith(theme_pack.SUFFIX):
+        theme_pack.forget(path)
+    names = set()
+    for asset, asset_names in self.pixbufs.asset_index().items():
+      # A file in a packed theme changes with the pack.
+      if asset in paths or os.path.dirname(asset) in paths:
+        names.update(asset_names)
+    if not names:
+      return
+    logging.info('Reloading %d images', len(names))
+    self.glyph_atlas.reset()
+    self.pixbufs.rerender(names, on_done=self.images_rendered)
+
+  def switch_group(self, group):
+    """The keyboard layout, XKB group, changed to group."""
+    self.group = group
+    modmap = self.modmaps[group] if group < len(self.modmaps) else None
+    if modmap is None or modmap is self.modmap:
+      return
+    logging.info('Switching to the keymap of XKB group %d', group)
+    self.modmap = modmap
+    self.prerender_labels()
+
+  def x_events_pending(self, unused_fd, unused_condition):
+    """Reload the keymap if it was changed, ex. by setxkbmap."""
+    # Reading the keymap can buffer the next MappingNotify, which wouldn't
+    # wake up this watch, so read until there's none.
+    while self.devices.refresh_mapping():
+      logging.info('Keyboard mapping changed, reloading keymap')
+      self.keymap_changed()
+    return True
+
+  def scale_factor_changed(self, window, unused_pspec):
+    """The window moved to a monitor with another scale factor."""
+    self.pixbufs.render_all(
+        self.name_fnames, self.options.scale, on_done=self.images_rendered,
+        device_scale=window.get_scale_factor())
+
+  def images_rendered(self):
+    """The images of the new theme or scale are ready, show them."""
+    if self.name_fnames is not self.pixbufs.name_fnames:
+      self.name_fnames = self.pixbufs.name_fnames
+      self.label_names = set()
+    self.glyph_atlas.reset()
+    self.reset_buttons()
+
+  def reset_buttons(self):
+    """Show the buttons with their current images, and resize the window."""
     for but in self.buttons:
       if but.normal != 'KEY_EMPTY':
         but.reset_image(self.enabled[but.normal.replace('_EMPTY', '')])
       else:
         but.reset_image()
-      if but.normal == 'MOUSE':
-        but.timeout_secs = self.options.mouse_timeout
-      else:
-        but.timeout_secs = self.options.key_timeout
 
     # all this to get it to resize smaller
     x, y = self.window.get_position()
@@ -810,10 +1066,6 @@ class KeyMon:
     self.window.move(x, y)
     self.update_shape_mask(force=True)
 
-    # reload keymap
-    self.modmap = mod_mapper.safely_read_mod_map(
-        self.options.kbd_file, self.options.kbd_files)
-
   def _toggle_a_key(self, image, name, show):
     """Toggle show/hide a key."""
     if self.enabled[name] == show:
@@ -847,7 +1099,7 @@ class KeyMon:
     dlg.set_name('Keyboard Status Monitor')
     dlg.set_program_name('key-mon')
     dlg.set_website('https://github.com/scottkirkwood/key-mon')
-    dlg.set_version(__version__)
+    dlg.set_version(cli.__version__)
     dlg.set_authors([
         __author__,
         'Yu-Jie Lin',
@@ -868,204 +1120,8 @@ limitations under the License.''')
     dlg.run()
     dlg.destroy()
 
-def show_version():
-  """Show the version number and author, used by help2man."""
-  print(_(f'Keymon version {__version__}.'))
-  print(_(f'Written by {__author__}'))
-
-def create_options():
-  """Create the options available"""
-  opts = options.Options()
-
-  opts.add_option(opt_short='-s', opt_long='--smaller', dest='smaller', default=False,
-                  type='bool',
-                  help=_('Make the dialog 25% smaller than normal.'))
-  opts.add_option(opt_short='-l', opt_long='--larger', dest='larger', default=False,
-                  type='bool',
-                  help=_('Make the dialog 25% larger than normal.'))
-  opts.add_option(opt_short='-m', opt_long='--meta', dest='meta', type='bool',
-                  ini_group='buttons', ini_name='meta', default=None,
-                  help=_('Show the meta (windows) key.'))
-  opts.add_option(opt_long='--mouse', dest='mouse', type='bool', default=True,
-                  ini_group='buttons', ini_name='mouse',
-                  help=_('Show the mouse.'))
-  opts.add_option(opt_long='--shift', dest='shift', type='bool', default=True,
-                  ini_group='buttons', ini_name='shift',
-                  help=_('Show shift key.'))
-  opts.add_option(opt_long='--ctrl', dest='ctrl', type='bool', default=True,
-                  ini_group='buttons', ini_name='ctrl',
-                  help=_('Show the ctrl key.'))
-  opts.add_option(opt_long='--alt', dest='alt', type='bool', default=True,
-                  ini_group='buttons', ini_name='alt',
-                  help=_('Show the alt key.'))
-  opts.add_option(opt_long='--scale', dest='scale', type='float', default=1.0,
-                  ini_group='ui', ini_name='scale',
-                  help=_('Scale the dialog. ex. 2.0 is 2 times larger, 0.5 is '
-                         'half the size. Defaults to %default'))
-  opts.add_option(opt_long='--key-timeout', dest='key_timeout',
-                  type='float', default=0.5,
-                  ini_group='ui', ini_name='key_timeout',
-                  help=_('Timeout before key returns to unpressed image. '
-                         'Defaults to %default'))
-  opts.add_option(opt_long='--mouse-timeout', dest='mouse_timeout',
-                  type='float', default=0.2,
-                  ini_group='ui', ini_name='mouse_timeout',
-                  help=_('Timeout before mouse returns to unpressed image. '
-                         'Defaults to %default'))
-  opts.add_option(opt_long='--visible-click-timeout', dest='visible_click_timeout',
-                  type='float', default=0.2,
-                  ini_group='ui', ini_name='visible_click_timeout',
-                  help=_('Timeout before highly visible click disappears. '
-                         'Defaults to %default'))
-  opts.add_option(opt_long='--decorated', dest='decorated', type='bool',
-                  ini_group='ui', ini_name='decorated',
-                  default=False,
-                  help=_('Show decoration'))
-  opts.add_option(opt_long='--backgroundless', dest='backgroundless', type='bool',
-                  ini_group='ui', ini_name='backgroundless',
-                  default=False,
-                  help=_('Show only buttons'))
-  opts.add_option(opt_long='--no-press-fadeout', dest='no_press_fadeout',
-                  type='float', default=0.0,
-                  ini_group='ui', ini_name='no_press_fadeout',
-                  help=_('Fadeout the window after a period with no key press. '
-                         'Defaults to %default seconds (Experimental)'))
-  opts.add_option(opt_long='--only_combo', dest='only_combo', type='bool',
-                  ini_group='ui', ini_name='only_combo',
-                  default=False,
-                  help=_('Show only key combos (ex. Control-A)'))
-  opts.add_option(opt_long='--sticky', dest='sticky_mode', type='bool',
-                  ini_group='ui', ini_name='sticky_mode',
-                  default=False,
-                  help=_('Sticky mode'))
-  opts.add_option(opt_long='--visible_click', dest='visible_click', type='bool',
-                  ini_group='ui', ini_name='visible-click',
-                  default=False,
-                  help=_('Show where you clicked'))
-  opts.add_option(opt_long='--click_color', dest='click_color', type='str',
-                  ini_group='ui', ini_name='click-color',
-                  default='ff0000',
-                  help=_('The color of the click indicator'))
-  opts.add_option(opt_long='--click_opacity', dest='click_opacity', type='float',
-                  ini_group='ui', ini_name='click-opacity',
-                  default=0.5,
-                  help=_('The opacity of the click indicator'))
-  opts.add_option(opt_long='--follow_mouse', dest='follow_mouse', type='bool',
-                  ini_group='ui', ini_name='follow-mouse',
-                  default=False,
-                  help=_('Show the mouse more visibly'))
-  opts.add_option(opt_long='--kbdfile', dest='kbd_file',
-                  ini_group='devices', ini_name='map',
-                  default=None,
-                  help=_('Use this kbd filename.'))
-  opts.add_option(opt_long='--swap', dest='swap_buttons', type='bool',
-                  default=False,
-                  ini_group='devices', ini_name='swap_buttons',
-                  help=_('Swap the mouse buttons.'))
-  opts.add_option(opt_long='--emulate-middle', dest='emulate_middle', type='bool',
-                  default=False,
-                  ini_group='devices', ini_name='emulate_middle',
-                  help=_('When you press the left, and right mouse buttons at the same time, '
-                         'it displays as a middle mouse button click. '))
-  opts.add_option(opt_short='-v', opt_long='--version', dest='version', type='bool',
-                  help=_('Show version information and exit.'))
-  opts.add_option(opt_short='-t', opt_long='--theme', dest='theme', type='str',
-                  ini_group='ui', ini_name='theme', default='classic',
-                  help=_('The theme to use when drawing status images (ex. "-t apple").'))
-  opts.add_option(opt_long='--list-themes', dest='list_themes', type='bool',
-                  help=_('List available themes'))
-  opts.add_option(opt_long='--old-keys', dest='old_keys', type='int',
-                  ini_group='buttons', ini_name='old-keys',
-                  help=_('How many historical keypresses to show (defaults to %default)'),
-                  default=0)
-  opts.add_option(opt_long='--reset', dest='reset', type='bool',
-                  help=_('Reset all options to their defaults.'),
-                  default=None)
-
-  opts.add_option(opt_short=None, opt_long='--opacity', type='float',
-                  dest='opacity', default=1.0, help='Opacity of window',
-                  ini_group='ui', ini_name='opacity')
-  opts.add_option(opt_short=None, opt_long=None, type='int',
-                  dest='x_pos', default=-1, help='Last X Position',
-                  ini_group='position', ini_name='x')
-  opts.add_option(opt_short=None, opt_long=None, type='int',
-                  dest='y_pos', default=-1, help='Last Y Position',
-                  ini_group='position', ini_name='y')
-
-  opts.add_option_group(_('Developer Options'), _('These options are for developers.'))
-  opts.add_option(opt_long='--loglevel', dest='loglevel', type='str', default='',
-                  help=_('Logging level'))
-  opts.add_option(opt_short='-d', opt_long='--debug', dest='debug', type='bool',
-                  default=False,
-                  help=_('Output debugging information. '
-                         'Shorthand for --loglevel=debug'))
-  opts.add_option(opt_long='--screenshot', dest='screenshot', type='str', default='',
-                  help=_('Create a "screenshot.png" and exit. '
-                         'Pass a comma separated list of keys to simulate'
-                         '(ex. "KEY_A,KEY_LEFTCTRL").'))
-  return opts
-
-
-def main():
-  """Run the program."""
-  # Check for --loglevel, --debug, we deal with them by ourselves because
-  # option parser also use logging.
-  loglevel = None
-  for idx, arg in enumerate(sys.argv):
-    if '--loglevel' in arg:
-      if '=' in arg:
-        loglevel = arg.split('=')[1]
-      else:
-        loglevel = sys.argv[idx + 1]
-      level = getattr(logging, loglevel.upper(), None)
-      if level is None:
-        raise ValueError(f'Invalid log level: {loglevel}')
-      loglevel = level
-    elif '--debug' in sys.argv or '-d' in sys.argv:
-      loglevel = logging.DEBUG
-  logging.basicConfig(
-      level=loglevel, style='{',
-      format='{filename} [{lineno}]: {levelname} {message}')
-  if loglevel is None:
-    # Disabling warning, info, debug messages
-    logging.disable(logging.WARNING)
-
-  opts = create_options()
-  opts.read_ini_file(os.path.join(settings.get_config_dir(), 'config'))
-  desc = _('Usage: %prog [Options...]')
-  opts.parse_args(desc, sys.argv)
-
-  if opts.version:
-    show_version()
-    sys.exit(0)
-  if opts.smaller:
-    opts.scale = 0.75
-  elif opts.larger:
-    opts.scale = 1.25
-
-  opts.themes = settings.get_themes()
-  if opts.list_themes:
-    print(_('Available themes:'))
-    print()
-    theme_names = sorted(opts.themes)
-    name_len = max(len(name) for name in theme_names)
-    for theme in theme_names:
-      print(f' - {theme:<{name_len}}: {opts.themes[theme][0]}')
-    raise SystemExit()
-
-  if opts.theme and opts.theme not in opts.themes:
-    print(_(f'Theme {opts.theme!r} does not exist'))
-    print()
-    print(_(f'Please make sure {opts.theme!r} can be found in '
-            'one of the following directories:'))
-    print()
-    for theme_dir in settings.get_config_dirs('themes'):
-      print(f' - {theme_dir}')
-    sys.exit(-1)
-  if opts.reset:
-    print(_('Resetting to defaults.'))
-    opts.reset_to_defaults()
-    opts.save()
+def run(opts):
+  """Show the overlay until the program quits."""
   keymon = KeyMon(opts)
   try:
     Gtk.main()
@@ -1074,5 +1130,5 @@ def main():
 
 if __name__ == '__main__':
   #import cProfile
-  #cProfile.run('main()', 'keymonprof')
-  main()
+  #cProfile.run('cli.main()', 'keymonprof')
+  cli.main()
@@ -18,54 +18,301 @@
 
 This creates a gtk pixbuf in one of 2 manners:
 1) Simple filename (probably supports most image formats)
-2) A function which returns bytes to a file which can be read by
-   pixbuf_new_from_file().
+2) A function which returns an svg_template.Variant, the text of an SVG file,
+   or a GdkPixbuf directly.
 
 The name_fnames contains a list for key.  Each element of the list will be
 composted with the previous element (overlayed on top of).
 
 Alpha transparencies from the new, overlayed, image are respected.
+
+SVGs are rasterized by the loader directly at resize times the device scale
+of the monitor, so a 2x display gets images with twice the pixels.  surface()
+returns them as cairo surfaces of the size they should be shown at.
+
+The created pixbufs, and their surfaces once asked for, are kept in a least
+recently used cache limited in bytes.
+Images which are on screen can be pinned so they are never evicted.
+
+After a theme or scale change render_all() renders the images in use again on
+a pool of threads, librsvg doesn't hold the GIL, and swaps them in all at once
+on the GTK thread.  Until then the old images stay.
 """
 
 __author__ = 'scott@forusers.com (Scott Kirkwood))'
 
+import collections
+import concurrent.futures
 import logging
 import os
-import re
-import sys
-import tempfile
+import threading
 import types
 
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GLib, GdkPixbuf
+from gi.repository import Gdk, Gtk, GLib, GdkPixbuf
+
+from . import compositor
+from . import svg_template
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Size of the transparent image shown when an image can't be read.
+FALLBACK_SIZE = 48
+RENDER_THREADS = min(4, os.cpu_count() or 1)
 
 class LazyPixbufCreator():
   """Class to create SVG images on the fly."""
-  def __init__(self, name_fnames, resize, color=None):
+  def __init__(self, name_fnames, resize, color=None, disk_cache=None,
+               max_bytes=DEFAULT_MAX_BYTES, device_scale=1):
     """Initialize with empty.
 
     Args:
       name_fnames: List of names to filename list.
+      resize: size of the images, 1.0 is the size of the SVG.
       color: Color to force on the SVG.
+      disk_cache: optional pixbuf_cache.DiskCache shared between runs.
+      max_bytes: memory budget of the created pixbufs.
+      device_scale: integer scale factor of the monitor, see
+        Gtk.Widget.get_scale_factor().
     """
-    self.pixbufs = {}
+    self.pixbufs = collections.OrderedDict()  # Least recently used first.
+    self.surfaces = {}  # name -> cairo surface of pixbufs[name]
+    self.sizes = {}  # name -> bytes of the pixbuf and its surface
+    self.resident_bytes = 0
+    self.max_bytes = max_bytes
+    self.pins = collections.Counter()
     self.resize = resize
+    self.device_scale = device_scale
     self.color = color
     self.name_fnames = name_fnames
+    self.disk_cache = disk_cache
+    self.generation = 0  # Bumped to drop an unfinished render_all().
+    # Per thread, if the image being rendered used _fallback_image().
+    self.local = threading.local()
 
-  def reset_all(self, names_fnames, resize):
+  def reset_all(self, names_fnames, resize, device_scale=None):
     """Resets the name to filenames and size."""
-    self.pixbufs = {}
+    self.generation += 1
+    self.pixbufs = collections.OrderedDict()
+    self.surfaces = {}
+    self.sizes = {}
+    self.resident_bytes = 0
     self.name_fnames = names_fnames
     self.resize = resize
+    if device_scale:
+      self.device_scale = device_scale
+
+  @property
+  def pixel_scale(self):
+    """Scale of the images in device pixels."""
+    return self.resize * self.device_scale
 
   def get(self, name):
     """Get the pixbuf with this name."""
+    if name in self.pixbufs:
+      self.pixbufs.move_to_end(name)
+      return self.pixbufs[name]
+    name = self.create_pixbuf(name)
     if name not in self.pixbufs:
-      name = self.create_pixbuf(name)
+      # The KEY_EMPTY fallback.
+      self.create_pixbuf(name)
     return self.pixbufs[name]
 
+  def surface(self, name):
+    """Get the image with this name as a cairo surface at the device scale."""
+    pixbuf = self.get(name)
+    name = self.shown_name(name)
+    if name not in self.surfaces:
+      self.surfaces[name] = Gdk.cairo_surface_create_from_pixbuf(
+          pixbuf, self.device_scale, None)
+      # ARGB32, 4 bytes per pixel.
+      size = 4 * pixbuf.get_width() * pixbuf.get_height()
+      self.sizes[name] += size
+      self.resident_bytes += size
+      if self.resident_bytes > self.max_bytes:
+        self._evict(keep=name)
+    return self.surfaces[name]
+
+  def shown_name(self, name):
+    """The name of the image get(name) returned, KEY_EMPTY if it failed."""
+    return name if name in self.pixbufs else 'KEY_EMPTY'
+
+  def pin(self, name):
+    """Keep the pixbuf name in memory, it's being shown."""
+    self.pins[name] += 1
+
+  def unpin(self, name):
+    """Undo one pin()."""
+    if self.pins[name] <= 1:
+      del self.pins[name]
+    else:
+      self.pins[name] -= 1
+
+  def resident_size(self):
+    """Returns (number of pixbufs, bytes used by them)."""
+    return len(self.pixbufs), self.resident_bytes
+
+  def _add(self, name, img):
+    """Add img to the cache and evict what doesn't fit in the budget."""
+    self._drop(name)
+    size = img.get_byte_length()
+    self.pixbufs[name] = img
+    self.pixbufs.move_to_end(name)
+    self.sizes[name] = size
+    self.resident_bytes += size
+    if self.resident_bytes > self.max_bytes:
+      self._evict(keep=name)
+
+  def _evict(self, keep):
+    """Drop least recently used pixbufs which aren't pinned."""
+    for old_name in list(self.pixbufs):
+      if self.resident_bytes <= self.max_bytes:
+        break
+      if old_name == keep or old_name in self.pins:
+        continue
+      self._drop(old_name)
+      logging.debug('Evicted pixbuf %s', old_name)
+
+  def _drop(self, name):
+    """Remove name, and its surface, from the cache if there."""
+    if name in self.pixbufs:
+      del self.pixbufs[name]
+      self.surfaces.pop(name, None)
+      self.resident_bytes -= self.sizes.pop(name)
+
+  def render_all(self, names_fnames, resize, on_done=None,
+                 workers=RENDER_THREADS, device_scale=None):
+    """Like reset_all() but renders the images in use first, in threads.
+
+    The images currently in the cache, if they still exist, are rendered with
+    the new names_fnames, resize and device_scale: the pinned ones first, then
+    the most recently used, until max_bytes is used.  When all are done they
+    replace the cache at once, from the GTK main loop, and on_done() is
+    called.  Until then get() returns the old images.
+    Images made by closures marked with a true main_thread attribute are
+    left to be created on first use.
+    """
+    self.generation += 1
+    generation = self.generation
+    device_scale = device_scale or self.device_scale
+    staging = LazyPixbufCreator(
+        names_fnames, resize, color=self.color, disk_cache=self.disk_cache,
+        device_scale=device_scale)
+    # Most needed first: what's on screen, the fallback, the recently used.
+    names = [name for name in (list(self.pins) + ['KEY_EMPTY']
+                               + list(reversed(self.pixbufs)))
+             if name in names_fnames and not any(
+                 getattr(op, 'main_thread', False) for op in names_fnames[name])]
+    names = list(dict.fromkeys(names))
+    max_bytes = self.max_bytes
+
+    def render():
+      # Stop once the budget is used, the others are made when needed.
+      results = {}
+      staged_bytes = 0
+      batch_size = max(1, workers)
+      with concurrent.futures.ThreadPoolExecutor(batch_size) as pool:
+        for start in range(0, len(names), batch_size):
+          batch = names[start:start + batch_size]
+          for name, img in zip(batch, pool.map(staging.try_render, batch)):
+            results[name] = img
+            if img:
+              staged_bytes += img.get_byte_length()
+          if staged_bytes >= max_bytes:
+            break
+      GLib.idle_add(self._publish, generation, names_fnames, resize,
+                    device_scale, results, on_done)
+
+    logging.debug('Rendering %d images in %d threads', len(names), workers)
+    threading.Thread(target=render, name='render_all', daemon=True).start()
+
+  def prerender(self, names, on_done=None, workers=RENDER_THREADS):
+    """Render the images names in threads, so they're ready when needed.
+
+    Images already in the cache or made on the main thread are skipped,
+    the others are added to the cache from the GTK main loop, then
+    on_done() is called.
+    """
+    names = [name for name in names
+             if name in self.name_fnames and name not in self.pixbufs
+             and not self._main_thread(name)]
+    self._render_in_background(names, on_done, workers, replace=False)
+
+  def rerender(self, names, on_done=None, workers=RENDER_THREADS):
+    """Render the cached images names again, ex. their files changed.
+
+    The old images are used until the new ones replace them, from the GTK
+    main loop, then on_done() is called.  Images made on the main thread
+    are dropped and made again when next used.
+    """
+    cached = [name for name in names if name in self.pixbufs]
+    self.forget([name for name in cached if self._main_thread(name)])
+    self._render_in_background(
+        [name for name in cached if name in self.pixbufs], on_done, workers,
+        replace=True)
+
+  def forget(self, names):
+    """Drop the images names from the cache."""
+    for name in names:
+      self._drop(name)
+
+  def asset_index(self):
+    """Return a dict of each file used by the images to the image names."""
+    index = collections.defaultdict(list)
+    for name, ops in self.name_fnames.items():
+      for operation in ops:
+        if isinstance(operation, str):
+          fname = operation
+        else:
+          fname = (getattr(operation, 'cache_key', None) or (None,))[0]
+        if fname:
+          index[fname].append(name)
+    return index
+
+  def _main_thread(self, name):
+    return any(getattr(op, 'main_thread', False)
+               for op in self.name_fnames[name])
+
+  def _render_in_background(self, names, on_done, workers, replace):
+    if not names:
+      if on_done:
+        on_done()
+      return
+    generation = self.generation
+
+    def render():
+      with concurrent.futures.ThreadPoolExecutor(max(1, workers)) as pool:
+        results = dict(zip(names, pool.map(self.try_render, names)))
+      GLib.idle_add(self._add_rendered, generation, results, on_done, replace)
+
+    logging.debug('Rendering %d images in the background', len(names))
+    threading.Thread(target=render, name='prerender', daemon=True).start()
+
+  def _add_rendered(self, generation, results, on_done, replace):
+    """Add the images made in the background, unless the theme changed."""
+    if generation == self.generation:
+      for name, img in results.items():
+        if img and (replace or name not in self.pixbufs):
+          self._add(name, img)
+    if on_done:
+      on_done()
+    return False
+
+  def _publish(self, generation, names_fnames, resize, device_scale, results,
+               on_done):
+    """Swap in the images made by render_all()."""
+    if generation != self.generation:
+      logging.debug('Dropping stale rendered images')
+      return False
+    self.reset_all(names_fnames, resize, device_scale)
+    # The most needed last, so the budget evicts the others.
+    for name, img in reversed(list(results.items())):
+      if img:
+        self._add(name, img)
+    if on_done:
+      on_done()
+    return False
+
   def create_pixbuf(self, name):
     """Creates the image.
     Args:
@@ -73,20 +320,67 @@ class LazyPixbufCreator():
     Returns:
       The name given or EMPTY if error.
     """
+    img = self.render(name)
+    if not img:
+      return 'KEY_EMPTY'
+    self._add(name, img)
+    return name
+
+  def render(self, name):
+    """Return the image name, without caching it in memory.
+
+    It doesn't touch the memory cache, so it can be called from any thread
+    as long as the closures can.
+    """
     if name not in self.name_fnames:
       logging.error('Don\'t understand the name %s', name)
-      return 'KEY_EMPTY'
+      return None
     ops = self.name_fnames[name]
+    cache_key = None
+    if self.disk_cache:
+      cache_key = self.disk_cache.key_for(ops, self.pixel_scale, self.color)
+      if cache_key:
+        img = self.disk_cache.load(cache_key)
+        if img:
+          return img
     img = None
+    self.local.fallback = False
     for operation in ops:
       if isinstance(operation, str):
         img = self._composite(img, self._read_from_file(operation))
       else:
-        image_bytes = operation()
-        image_bytes = self._resize(image_bytes)
-        img = self._composite(img, self._read_from_bytes(image_bytes))
-    self.pixbufs[name] = img
-    return name
+        result = operation()
+        if isinstance(result, GdkPixbuf.Pixbuf):
+          img = self._composite(img, result)
+        elif isinstance(result, svg_template.Variant):
+          img = self._composite(img, self._read_from_bytes(
+              result.render(color=self.color)))
+        else:
+          img = self._composite(img, self.render_svg(result))
+    if cache_key and not self.used_fallback():
+      # A failure may not be the file's fault, ex. a missing loader.
+      self.disk_cache.store(cache_key, img)
+    return img
+
+  def used_fallback(self):
+    """True if the last image rendered in this thread couldn't be made."""
+    return getattr(self.local, 'fallback', False)
+
+  def try_render(self, name):
+    """Like render() but errors are logged and None is returned."""
+    try:
+      return self.render(name)
+    except Exception:
+      logging.exception('Unable to render %s', name)
+      return None
+
+  def render_svg(self, image_bytes):
+    """Rasterize the svg text at our size."""
+    return self._read_from_bytes(image_bytes)
+
+  def render_template(self, template, subs=None):
+    """Rasterize the svg_template.SvgTemplate at our size."""
+    return self._read_from_bytes(template.render(color=self.color, subs=subs))
 
   def _composite(self, img, img2):
     """Combine/layer img2 on top of img.
@@ -97,74 +391,65 @@ class LazyPixbufCreator():
       updated image.
     """
     if img:
-      img2.composite(
-          img,
-          0, 0, img.props.width, img.props.height,  # x, y, w, h
-          0, 0,  # offset x, y
-          1.0, 1.0,  # scale x, y
-          GdkPixbuf.InterpType.HYPER, 255)  # interpolation type, alpha
-      return img
+      return compositor.composite(img, img2)
     return img2
 
   def _read_from_file(self, fname):
     """Read in the file in from fname."""
-    logging.debug('Read file %s', fname)
-    if self.resize == 1.0:
-      return GdkPixbuf.Pixbuf.new_from_file(fname)
-    fin = open(fname)
-    image_bytes = fin.read()
-    if self.resize != 1.0:
-      image_bytes = self._resize(image_bytes)
-    fin.close()
-    if self.color:
-      image_bytes = re.sub(
-          r'([";]stroke:#)([0-9A-Fa-f]{6})([";])', r'\g<1>%s\g<3>' % self.color, image_bytes)
-    return self._read_from_bytes(image_bytes)
+    if not fname.endswith('.svg'):
+      logging.debug('Read file %s', fname)
+      try:
+        img = GdkPixbuf.Pixbuf.new_from_file(fname)
+      except GLib.Error as e:
+        logging.error('Unable to read %s: %s', fname, e)
+        return self._fallback_image()
+      if self.pixel_scale == 1.0:
+        return img
+      return img.scale_simple(
+          *self._scaled_size(img.get_width(), img.get_height()),
+          GdkPixbuf.InterpType.BILINEAR)
+    try:
+      template = svg_template.TEMPLATES.get(fname)
+    except (OSError, UnicodeDecodeError) as e:
+      logging.error('Unable to read %s: %s', fname, e)
+      return self._fallback_image()
+    return self.render_template(template)
 
   def _read_from_bytes(self, image_bytes):
-    """Writes the bytes to a file and then reads the file."""
-    fout, fname = tempfile.mkstemp(prefix='keymon-', suffix='.svg')
-    os.write(fout, str.encode(image_bytes))
-    os.close(fout)
+    """Rasterize the svg text in memory, at our size."""
+    loader = None
     try:
-      img = GdkPixbuf.Pixbuf.new_from_file(fname)
+      loader = GdkPixbuf.PixbufLoader.new_with_type('svg')
+      if self.pixel_scale != 1.0:
+        loader.connect('size-prepared', self._on_size_prepared)
+      loader.write(image_bytes.encode('utf-8'))
+      loader.close()
+      return loader.get_pixbuf()
     except GLib.Error as e:
-      logging.error('Unable to read %s: %s', fname, e)
-      sys.exit(-1)
+      logging.error('Unable to render svg: %s', e)
+      if loader:
+        try:
+          loader.close()
+        except GLib.Error:
+          pass
+      return self._fallback_image()
 
-    try:
-      os.unlink(fname)
-    except OSError:
-      pass
-    return img
+  def _on_size_prepared(self, loader, width, height):
+    """Ask the loader to rasterize the vector image at our size."""
+    loader.set_size(*self._scaled_size(width, height))
 
-  def _resize(self, image_bytes):
-    """Resize the image by manipulating the svg."""
-    if self.resize == 1.0:
-      return image_bytes
-    template = r'(<svg[^<]+)({}=")(\d+\.?\d*)'
-    image_bytes = self._resize_text(image_bytes, template.format('width'))
-    image_bytes = self._resize_text(image_bytes, template.format('height'))
-    if re.search(r'<g[^>]+?transform="', image_bytes):
-        # If there's already a transform, add to it
-        # Note: not checking if scale() is already there
-        image_bytes = re.sub(
-            r'<g([^>]+?)transform="([^"]+?)"',
-            f'<g\\1transform="\\2 scale({self.resize}, {self.resize})"',
-            image_bytes, count=1)
-    else:
-        # Otherwise add a transform
-        image_bytes = image_bytes.replace(
-            '<g', f'<g transform="scale({self.resize}, {self.resize})"', 1)
-    return image_bytes
-
-  def _resize_text(self, image_bytes, regular_exp):
-    """Change the numeric value of some sizing text via regular expression."""
-    re_x = re.compile(regular_exp)
-    grps = re_x.search(image_bytes)
-    if grps:
-      num = float(grps.group(3))
-      num = num * self.resize
-      replace = grps.group(1) + grps.group(2) + str(num)
-      image_bytes = re_x.sub(replace, image_bytes, 1)
-    return image_bytes
+  def _scaled_size(self, width, height):
+    return (max(1, round(width * self.pixel_scale)),
+            max(1, round(height * self.pixel_scale)))
+
+  def _fallback_image(self):
+    """A transparent image, shown instead of one we couldn't create.
+
+    The image being rendered isn't stored in the disk cache, see
+    used_fallback().
+    """
+    self.local.fallback = True
+    size, _ = self._scaled_size(FALLBACK_SIZE, FALLBACK_SIZE)
+    img = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, size, size)
+    img.fill(0)
+    return img
@@ -1,39 +1,180 @@
 #!/usr/bin/env python3
 
 import unittest
+import unittest.mock
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf, GLib
 
 from . import lazy_pixbuf_creator
 
+def _solid(width, height):
+  """Closure returning a new width x height RGBA pixbuf."""
+  def create():
+    return GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+  return create
+
+class FakeDiskCache():
+  """Records what's stored."""
+  def __init__(self):
+    self.stored = []
+
+  def key_for(self, ops, unused_resize, unused_color=None):
+    return repr(ops)
+
+  def load(self, unused_key):
+    return None
+
+  def store(self, key, unused_pixbuf):
+    self.stored.append(key)
+
 class TestOptionItem(unittest.TestCase):
   """Unit tests for the lazy_pixbuf_creator module"""
 
-  def test_resize(self):
-    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(name_fnames=[], resize=1.5)
-    sample = '''prefix <g
-         inkscape:label="Layer 1"> suffix'''
-    got = lazy_pixbuf._resize(sample)
-    self.assertEqual(got, '''prefix <g transform="scale(1.5, 1.5)"
-         inkscape:label="Layer 1"> suffix''')
-
-    sample = '''prefix <g
-         inkscape:label="Layer 2"
-         transform="translate(2, 2)"> suffix'''
-    got = lazy_pixbuf._resize(sample)
-    self.assertEqual(got, '''prefix <g
-         inkscape:label="Layer 2"
-         transform="translate(2, 2) scale(1.5, 1.5)"> suffix''')
-
-  def test_resize_svg(self):
-    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(name_fnames=[], resize=1.5)
-
-    sample = '''prefix <svg
-       id="svg1770"
-       height="66"
-       width="22.2"
-       version="1.1"> suffix'''
-    got = lazy_pixbuf._resize(sample)
-    self.assertEqual(got, '''prefix <svg
-       id="svg1770"
-       height="99.0"
-       width="33.3"
-       version="1.1"> suffix''')
+  def test_scaled_size(self):
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames={}, resize=1.5, device_scale=2)
+    self.assertEqual(lazy_pixbuf.pixel_scale, 3.0)
+    self.assertEqual(lazy_pixbuf._scaled_size(22, 0.2), (66, 1))
+
+  def test_render_at_size(self):
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="20" height="10">'
+           '<rect width="20" height="10" style="fill:#ff0000;stroke:#000000"/></svg>')
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames={}, resize=1.5, device_scale=2)
+    img = lazy_pixbuf.render_svg(svg)
+    self.assertEqual((img.get_width(), img.get_height()), (60, 30))
+
+  def test_fallback_not_stored(self):
+    good = '<svg xmlns="http://www.w3.org/2000/svg" width="4" height="4"/>'
+    disk_cache = FakeDiskCache()
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames={'BAD': [lambda: 'not an svg'], 'GOOD': [lambda: good]},
+        resize=1.0, disk_cache=disk_cache)
+    self.assertEqual(lazy_pixbuf.render('BAD').get_width(),
+                     lazy_pixbuf_creator.FALLBACK_SIZE)
+    self.assertTrue(lazy_pixbuf.used_fallback())
+    self.assertEqual(disk_cache.stored, [])
+    lazy_pixbuf.render('GOOD')
+    self.assertFalse(lazy_pixbuf.used_fallback())
+    self.assertEqual(len(disk_cache.stored), 1)
+
+  def test_no_svg_loader(self):
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames={}, resize=1.0)
+    no_loader = GLib.Error.new_literal(
+        GdkPixbuf.pixbuf_error_quark(), 'Unknown image type',
+        GdkPixbuf.PixbufError.UNKNOWN_TYPE)
+    with unittest.mock.patch.object(
+        GdkPixbuf.PixbufLoader, 'new_with_type', side_effect=no_loader):
+      img = lazy_pixbuf.render_svg('<svg/>')
+    self.assertEqual(img.get_width(), lazy_pixbuf_creator.FALLBACK_SIZE)
+    self.assertTrue(lazy_pixbuf.used_fallback())
+
+  def test_lru_budget(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'C', 'KEY_EMPTY')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0, max_bytes=1000)
+    lazy_pixbuf.get('A')
+    lazy_pixbuf.get('B')
+    self.assertEqual(lazy_pixbuf.resident_size(), (2, 800))
+    # C doesn't fit, A is the least recently used.
+    lazy_pixbuf.get('C')
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['B', 'C'])
+    self.assertEqual(lazy_pixbuf.resident_size(), (2, 800))
+
+  def test_lru_pinned(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'C', 'KEY_EMPTY')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0, max_bytes=1000)
+    lazy_pixbuf.pin('A')
+    lazy_pixbuf.get('A')
+    lazy_pixbuf.get('B')
+    lazy_pixbuf.get('C')
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['A', 'C'])
+    lazy_pixbuf.unpin('A')
+    lazy_pixbuf.get('B')
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['C', 'B'])
+
+  def test_surface_cached(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'KEY_EMPTY')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0, max_bytes=1000)
+    surface = lazy_pixbuf.surface('A')
+    self.assertIs(lazy_pixbuf.surface('A'), surface)
+    # The pixbuf and its surface.
+    self.assertEqual(lazy_pixbuf.resident_size(), (1, 800))
+    # B pushes A out, surface included.
+    lazy_pixbuf.get('B')
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['B'])
+    self.assertEqual(lazy_pixbuf.surfaces, {})
+    self.assertIsNot(lazy_pixbuf.surface('A'), surface)
+    lazy_pixbuf.forget(['A'])
+    self.assertEqual(lazy_pixbuf.surfaces, {})
+    self.assertEqual(lazy_pixbuf.resident_size(), (0, 0))
+
+  def test_render_all(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'KEY_EMPTY')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0)
+    old = lazy_pixbuf.get('A')
+    new_fnames = {name: [_solid(20, 20)] for name in ('A', 'B', 'KEY_EMPTY')}
+    loop = GLib.MainLoop()
+    lazy_pixbuf.render_all(new_fnames, 2.0, on_done=loop.quit)
+    # Still the old image until the swap.
+    self.assertIs(lazy_pixbuf.get('A'), old)
+    loop.run()
+    self.assertEqual(lazy_pixbuf.resize, 2.0)
+    self.assertEqual(sorted(lazy_pixbuf.pixbufs), ['A', 'KEY_EMPTY'])
+    self.assertEqual(lazy_pixbuf.get('A').get_width(), 20)
+
+  def test_render_all_budget(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'KEY_EMPTY')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0, max_bytes=1000)
+    lazy_pixbuf.get('A')
+    lazy_pixbuf.get('B')
+    lazy_pixbuf.pin('A')
+    new_fnames = {name: [_solid(20, 20)] for name in ('A', 'B', 'KEY_EMPTY')}
+    loop = GLib.MainLoop()
+    lazy_pixbuf.render_all(new_fnames, 2.0, on_done=loop.quit, workers=1)
+    loop.run()
+    # The pinned image fills the budget, the others are made when needed.
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['A'])
+    self.assertEqual(lazy_pixbuf.get('A').get_width(), 20)
+
+  def test_prerender(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B', 'C')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0)
+    old = lazy_pixbuf.get('A')
+    loop = GLib.MainLoop()
+    lazy_pixbuf.prerender(['A', 'B', 'MISSING'], on_done=loop.quit)
+    loop.run()
+    self.assertIs(lazy_pixbuf.get('A'), old)
+    self.assertEqual(sorted(lazy_pixbuf.pixbufs), ['A', 'B'])
+
+  def test_rerender(self):
+    name_fnames = {name: [_solid(10, 10)] for name in ('A', 'B')}
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames=name_fnames, resize=1.0)
+    old = lazy_pixbuf.get('A')
+    name_fnames['A'] = name_fnames['B'] = [_solid(20, 20)]
+    loop = GLib.MainLoop()
+    lazy_pixbuf.rerender(['A', 'B'], on_done=loop.quit)
+    loop.run()
+    # Only the cached image is made again.
+    self.assertEqual(list(lazy_pixbuf.pixbufs), ['A'])
+    self.assertIsNot(lazy_pixbuf.get('A'), old)
+    self.assertEqual(lazy_pixbuf.get('A').get_width(), 20)
+
+  def test_asset_index(self):
+    def closure():
+      return None
+    closure.cache_key = ('/theme/key.svg', ())
+    lazy_pixbuf = lazy_pixbuf_creator.LazyPixbufCreator(
+        name_fnames={'A': ['/theme/a.svg', closure], 'B': [closure]},
+        resize=1.0)
+    self.assertEqual(dict(lazy_pixbuf.asset_index()),
+                     {'/theme/a.svg': ['A'], '/theme/key.svg': ['A', 'B']})
@@ -14,15 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Run mod map and convert to something I can use."""
+"""Read the X keymap or a kbd file and convert to something I can use."""
 
 __author__ = 'scott@forusers.com (scottkirkwood)'
 
 import codecs
+import importlib
 import logging
 import os
+import pickle
 import re
-import subprocess
+import tempfile
 
 MEDIUM_NAME = {
     'ESCAPE': 'Esc',
@@ -89,6 +91,8 @@ MEDIUM_NAME = {
     'END': 'End',
     'DOWN': '\N{Downwards arrow}',
     'NEXT': 'PgDn',
+    'PAGE_UP': 'PgUp',
+    'PAGE_DOWN': 'PgDn',
     'INSERT': 'Ins',
     'DELETE': 'Del',
     'XF86AUDIOMUTE': 'Mute',
@@ -173,6 +177,11 @@ MEDIUM_NAME = {
     'XF86WLAN': 'Lan',
 }
 
+# Keysym groups of Xlib.keysymdef to name the keys with.
+KEYSYM_GROUPS = ('miscellany', 'latin1', 'latin2', 'latin3', 'latin4',
+                 'greek', 'cyrillic', 'technical', 'publishing', 'special',
+                 'xkb', 'xf86')
+
 SHORT_NAME = {
     'BACKSPACE': '\N{Leftwards open-headed arrow}',
     'RETURN': '\N{Return symbol}',
@@ -191,6 +200,8 @@ SHORT_NAME = {
     'XF86POWEROFF': 'Off',
     'PRIOR': 'PgU',
     'NEXT': 'PgD',
+    'PAGE_UP': 'PgU',
+    'PAGE_DOWN': 'PgD',
     'PAUSE': 'Ps',
     'SUPER_L': 'Spr',
     'MULTI_KEY': 'Mul',
@@ -203,37 +214,82 @@ SHORT_NAME = {
     'XF86MENUKB': 'MenuKb',
 }
 
+# Scancodes are X keycodes - 8, they fit in a byte.
+NUM_SCANCODES = 256
+NOT_FOUND = (None, None, None)
+# Bits of an X event state choosing the shift level, Shift and Mod5.  Mod5
+# is ISO_Level3_Shift (AltGr) on most layouts.
+SHIFT_MASK = 1 << 0
+MOD5_MASK = 1 << 7
+LEVEL_MASK = SHIFT_MASK | MOD5_MASK
+# The core keymap holds the first two groups, with four levels each.
+NUM_GROUPS = 2
+NUM_LEVELS = 4
+
 class ModMapper():
-  """Converts Mod Map codes into names and strings."""
+  """Converts Mod Map codes into names and strings.
+
+  A list indexed by scancode holds the labels, (name, medium name, short
+  name), each distinct label is stored once.  NOT_FOUND when not mapped.
+  """
   def __init__(self):
-    self.map = {}
+    self.labels = {}
+    self.by_code = [NOT_FOUND] * NUM_SCANCODES
+    self.count = 0
     self.alt_map = {}
     self.name_to_code = {}
+    self.misses = {}
 
   def done(self):
     """done setup, now create alt_map and name_to_code."""
-    for key in self.map:
-      vals = self.map[key]
+    self.alt_map = {}
+    self.name_to_code = {}
+    self.misses = {}
+    for key, vals in self.items():
       code_name = vals[0]
       self.alt_map[code_name] = vals
       self.name_to_code[code_name] = key
 
   def set_map(self, code, vals):
     """Set one code."""
-    self.map[code] = vals
+    vals = self.labels.setdefault(tuple(vals), tuple(vals))
+    if code >= len(self.by_code):
+      self.by_code.extend([NOT_FOUND] * (code + 1 - len(self.by_code)))
+    if self.by_code[code] is NOT_FOUND:
+      self.count += 1
+    self.by_code[code] = vals
+
+  def copy(self):
+    """Return a ModMapper which can be changed without changing this one."""
+    ret = ModMapper()
+    ret.labels = dict(self.labels)
+    ret.by_code = list(self.by_code)
+    ret.count = self.count
+    ret.alt_map = dict(self.alt_map)
+    ret.name_to_code = dict(self.name_to_code)
+    return ret
 
   def get_and_check(self, scancode, name):
     """Get the scan code, or get from name."""
-    if scancode in self.map:
-      vals = self.map[scancode]
+    try:
+      vals = self.by_code[scancode]
       if vals[0] == name:
         return vals
-      logging.debug('code %s != %s', vals[1], name)
+    except IndexError:
+      pass
+    try:
+      return self.misses[scancode, name]
+    except KeyError:
+      pass
+    # Only looked up and logged the first time.
     if name in self.alt_map:
       logging.info('Found key via alt lookup %s', name)
-      return self.alt_map[name]
-    logging.info('scancode: %s name:%s not found', scancode, name)
-    return None, None, None
+      vals = self.alt_map[name]
+    else:
+      logging.info('scancode: %s name:%s not found', scancode, name)
+      vals = NOT_FOUND
+    self.misses[scancode, name] = vals
+    return vals
 
   def get_from_name(self, name):
     """Get the scancode from a name."""
@@ -242,17 +298,93 @@ class ModMapper():
     logging.info('Key %s not found', name)
     return None
 
+  def items(self):
+    """(scancode, (name, medium name, short name)) of each mapped code."""
+    return [(code, vals) for code, vals in enumerate(self.by_code)
+            if vals is not NOT_FOUND]
+
   def __getitem__(self, key):
-    try:
-      return self.map[key]
-    except:
-      raise IndexError
+    if key in self:
+      return self.by_code[key]
+    raise KeyError(key)
+
+  def __setitem__(self, key, vals):
+    self.set_map(key, vals)
+    self.alt_map[vals[0]] = self.by_code[key]
+    self.name_to_code[vals[0]] = key
+    self.misses = {}
 
   def __contains__(self, key):
-    return key in self.map
+    return 0 <= key < len(self.by_code) and self.by_code[key] is not NOT_FOUND
+
+  def __iter__(self):
+    return (code for code, vals in enumerate(self.by_code)
+            if vals is not NOT_FOUND)
 
   def __len__(self):
-    return len(self.map)
+    return self.count
+
+class LevelLabels():
+  """Labels of the keys at each group and shift level, ex. ! for Shift+1.
+
+  Made from the X keymap when it changes, a list indexed by scancode,
+  group and level holds the label or None.
+  """
+  def __init__(self, keysyms=()):
+    """Initialize.
+    Args:
+      keysyms: keysym columns of each keycode, from min_keycode on.
+    """
+    slots = NUM_GROUPS * NUM_LEVELS
+    self.table = [None] * (NUM_SCANCODES * slots)
+    for code, syms in enumerate(keysyms[:NUM_SCANCODES]):
+      for group in range(NUM_GROUPS):
+        for level in range(NUM_LEVELS):
+          column = _keymap_column(group, level)
+          if column < len(syms):
+            self.table[code * slots + group * NUM_LEVELS + level] = (
+                keysym_label(syms[column]))
+
+  def get(self, scancode, state):
+    """The label of scancode with the modifiers of the X event state."""
+    group = (state >> 13) & 3
+    if group >= NUM_GROUPS:
+      group = 0
+    level = (state & SHIFT_MASK) | ((state & MOD5_MASK) >> 6)
+    try:
+      return self.table[(scancode * NUM_GROUPS + group) * NUM_LEVELS + level]
+    except IndexError:
+      return None
+
+
+def _keymap_column(group, level):
+  """Column of the core keymap holding the keysym of group and level.
+
+  The first two levels of groups 1 and 2 come first, then the other levels.
+  """
+  if level < 2:
+    return group * 2 + level
+  return 4 + group * 2 + level - 2
+
+
+def keysym_label(keysym):
+  """The label to show for keysym, None if there's none."""
+  if not keysym:
+    return None
+  name = keysym_name(keysym)
+  if name in MEDIUM_NAME:
+    return MEDIUM_NAME[name]
+  if 0x20 < keysym < 0x7f or 0xa0 < keysym <= 0xff:
+    char = chr(keysym)
+  elif keysym & 0xff000000 == 0x01000000:
+    char = chr(keysym & 0xffffff)
+  else:
+    return None
+  # Keys show the upper case letter.
+  if len(char.upper()) == 1:
+    return char.upper()
+  return char
+
 
 def parse_modmap(lines):
   """Parse a modmap file."""
@@ -306,13 +438,75 @@ def parse_kbd(text):
   return ret
 
 
+class KbdCache():
+  """Parsed kbd files, pickled in one file between runs.
+
+  An entry is used while the kbd file keeps its mtime and size.
+  """
+  # Bump when ModMapper changes.
+  FORMAT_VERSION = 2
+
+  def __init__(self, fname):
+    """Initialize.
+    Args:
+      fname: file to keep the cache in, its directory is created if needed.
+    """
+    self.fname = fname
+    self.entries = None  # path: (mtime_ns, size, ModMapper)
+
+  def _load(self):
+    self.entries = {}
+    try:
+      with open(self.fname, 'rb') as fin:
+        version, entries = pickle.load(fin)
+      if version == self.FORMAT_VERSION:
+        self.entries = entries
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError,
+            AttributeError, ImportError) as e:
+      logging.debug('Ignoring the kbd cache %s: %s', self.fname, e)
+
+  def read_kbd(self, fname):
+    """Read the kbd file, from the cache if it didn't change.
+
+    Returns:
+      a new ModMapper, the caller may change it.
+    """
+    if self.entries is None:
+      self._load()
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), fname)
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return read_kbd(fname)
+    entry = self.entries.get(path)
+    if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+      return entry[2].copy()
+    ret = read_kbd(path)
+    self.entries[path] = (stat.st_mtime_ns, stat.st_size, ret)
+    self.save()
+    return ret.copy()
+
+  def save(self):
+    """Write the cache, errors are only logged."""
+    dirname = os.path.dirname(self.fname)
+    try:
+      os.makedirs(dirname, exist_ok=True)
+      fd, tmp_name = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as fout:
+        pickle.dump((self.FORMAT_VERSION, self.entries), fout,
+                    pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp_name, self.fname)
+    except OSError as e:
+      logging.warning('Unable to write the kbd cache: %s', e)
+
+
 def create_my_kbd(fname, codes):
   """Create a kbd file from scancodes."""
   fout = codecs.open(fname, 'w', 'utf-8')
   fout.write('# This is a space separated file with UTF-8 encoding\n')
   fout.write('# Short name is optional, will default to the medium-name\n')
   fout.write('# Scancode Map-Name Medium-Name Short-Name\n')
-  for code, (key, medium_name, short_name) in list(codes.map.items()):
+  for code, (key, medium_name, short_name) in codes.items():
     if short_name:
       fout.write(f'{code} {key} {medium_name} {short_name}\n')
     else:
@@ -320,24 +514,54 @@ def create_my_kbd(fname, codes):
   print(f'Output {fname!r} with {len(codes)} entries')
   fout.close()
 
-def mod_map_args():
-  """Return the arguments to pass to xmodmap."""
-  return ['xmodmap', '-display', ':0', '-pk']
-
-
-def run_cmd(args):
-  """Run the command and collect the output."""
-  return subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0].decode()
-
-
-def read_mod_map():
-  """Read a mod_map by runing xmodmap."""
-  logging.debug('Loading keymap from xmodmap...')
-  xmodmap = parse_modmap(run_cmd(mod_map_args()))
+_keysym_names = {}
+
+def keysym_name(keysym):
+  """The upper case X name of keysym, ex. 'XF86AUDIOMUTE', 'U263A'."""
+  if not _keysym_names:
+    for group in KEYSYM_GROUPS:
+      module = importlib.import_module('Xlib.keysymdef.' + group)
+      # Sorted so the same alias wins as in xlib.XEvents, ex. PRIOR.
+      for name in sorted(dir(module)):
+        if name.startswith('XK_'):
+          _keysym_names[getattr(module, name)] = (
+              name[3:].replace('XF86_', 'XF86').upper())
+  if keysym in _keysym_names:
+    return _keysym_names[keysym]
+  if keysym == 0:
+    return 'NOSYMBOL'
+  if keysym & 0xff000000 == 0x01000000:
+    return f'U{keysym & 0xffffff:04X}'
+  return f'0X{keysym:X}'
+
+
+def open_display():
+  """Open the default X display, raises Xlib.error.DisplayError."""
+  from Xlib import display
+  return display.Display()
+
+
+def read_mod_map(disp=None, group=0):
+  """Read the mod_map from the X server.
+  Args:
+    disp: Xlib Display to ask, the default display if None.
+    group: XKB group, the core keymap only has the first two.
+  """
+  logging.debug('Loading keymap from the X server...')
+  if disp is None:
+    disp = open_display()
+  info = disp.display.info
+  keysyms = disp.get_keyboard_mapping(
+      info.min_keycode, info.max_keycode - info.min_keycode + 1)
   ret = ModMapper()
-  for code in xmodmap.map:
-    key = xmodmap[code][0]
-    key_name = xmodmap[code][1]
+  column = 2 * group if group < 2 else 0
+  for code, syms in enumerate(keysyms):
+    if not any(syms):
+      continue
+    # We'll pick the first one of the group, or of the first group
+    keysym = syms[column] if column < len(syms) else 0
+    key_name = keysym_name(keysym or syms[0])
+    key = 'KEY_' + key_name.replace('XF86', '')
     if key_name in MEDIUM_NAME:
       medium_name = MEDIUM_NAME[key_name]
     else:
@@ -351,61 +575,110 @@ def read_mod_map():
   return ret
 
 
-def safely_read_mod_map(fname, kbd_files):
+def read_level_labels(disp):
+  """Read the LevelLabels of the keymap of the X server."""
+  info = disp.display.info
+  return LevelLabels(disp.get_keyboard_mapping(
+      info.min_keycode, info.max_keycode - info.min_keycode + 1))
+
+
+def read_xkb_layouts(disp):
+  """Read the 'layout' or 'layout_variant' names of the XKB groups.
+
+  Taken from the _XKB_RULES_NAMES property of the root window, the same
+  as `setxkbmap -query`, empty if unknown.
+  """
+  from Xlib import X
+  prop = disp.screen().root.get_full_property(
+      disp.intern_atom('_XKB_RULES_NAMES'), X.AnyPropertyType)
+  if not prop or not prop.value:
+    return []
+  value = prop.value
+  if isinstance(value, bytes):
+    value = value.decode('utf-8', 'replace')
+  # rules, model, layout, variant, options with the groups comma separated.
+  names = value.split('\0') + [''] * 5
+  layouts = names[2].split(',')
+  variants = names[3].split(',') + [''] * len(layouts)
+  ret = []
+  for layout, variant in zip(layouts, variants):
+    if not layout:
+      break
+    if variant:
+      ret.append(f'{layout}_{variant}')
+    else:
+      ret.append(layout)
+  return ret
+
+
+def safely_read_mod_map(fname, kbd_files, disp=None, cache=None):
   """Read the specified mod_map file or get the US version by default.
   Args:
     fname: name of kbd file to read
     kbd_files: list of full path of kbd files
+    disp: Xlib Display to read the keymap and layout from, the default
+      display is opened if None and needed.
+    cache: KbdCache to read the kbd files with, if any.
+  """
+  return read_mod_maps(fname, kbd_files, disp, cache)[0]
+
+
+def read_mod_maps(fname, kbd_files, disp=None, cache=None):
+  """Read the mod_map of every keyboard layout, see safely_read_mod_map.
+  Returns:
+    list of ModMapper indexed by XKB group, only one when fname is found.
   """
-  # Assigning a default kbdfile name using result of setxkbmap
-  default_kbd = None
+  load_kbd = cache.read_kbd if cache is not None else read_kbd
+  for kbd in kbd_files:
+    if fname and kbd.endswith(fname):
+      return [load_kbd(kbd)]
+  if fname and fname != 'xmodmap':
+    logging.warning('Can not find kbd file: %s', fname)
+
+  from Xlib import error
+  opened = None
+  layouts = []
   try:
-    # TODO(scott) is `-print` the new `-query`?
-    for line in  run_cmd(('setxkbmap', '-print')).split('\n'):
-      if 'layout:' in line:
-        default_kbd = line.split(':')[1].strip()
-      if 'variant:' in line:
-        default_kbd += '_' + line.split(':')[1].strip()
-    if default_kbd:
-      logging.info('setxkbmap returns a keyboard layout_variant: %s', default_kbd)
-      default_kbd += '.kbd'
-  except OSError:
-    pass
-  if not default_kbd:
-    default_kbd = 'us.kbd'
-  logging.info('Set default kbdfile to: %s', default_kbd)
-
-  kbd_file = None
+    if disp is None:
+      disp = opened = open_display()
+    layouts = read_xkb_layouts(disp)
+  except (OSError, error.DisplayError) as err:
+    logging.error('Unable to read the keyboard layout: %s', err)
+  logging.info('XKB keyboard layouts: %s', layouts)
+  try:
+    return [_read_layout_mod_map(fname, kbd_files, disp, load_kbd, group, layout)
+            for group, layout in enumerate(layouts or ['us'])]
+  finally:
+    if opened is not None:
+      opened.close()
+
+
+def _read_layout_mod_map(fname, kbd_files, disp, load_kbd, group, layout):
+  """Read the mod_map of one XKB group, its layout[_variant] is layout."""
+  default_kbd = layout + '.kbd'
   kbd_default = None
   for kbd in kbd_files:
-    if not kbd_file and fname and kbd.endswith(fname):
-      kbd_file = kbd
-    if not kbd_default and kbd.endswith(default_kbd):
+    if kbd.endswith(default_kbd):
       kbd_default = kbd
-  if fname and not kbd_file:
-    logging.warning('Can not find kbd file: %s', fname)
-  if kbd_file:
-    return read_kbd(kbd_file)
+      break
+  logging.info('Set default kbdfile of group %d to: %s', group, kbd_default)
 
   ret = None
-  if fname == 'xmodmap' or not kbd_default:
-    try:
-      ret = read_mod_map()
-    except OSError:
-      logging.error('unable execute xmodmap')
+  if disp is not None and (fname == 'xmodmap' or not kbd_default):
+    ret = read_mod_map(disp, group)
 
   if kbd_default:
     # Merge the defaults with modmap
-    if fname == 'xmodmap':
+    if fname == 'xmodmap' and ret is not None:
       logging.debug('Merging with default kbd file: %s', kbd_default)
-      defaults = read_kbd(kbd_default)
+      defaults = load_kbd(kbd_default)
       for keycode in defaults:
         if keycode not in ret:
           ret[keycode] = defaults[keycode]
     else:
       logging.debug('Using default kbd file: %s', kbd_default)
-      ret = read_kbd(kbd_default)
-  else:
+      ret = load_kbd(kbd_default)
+  elif ret is None:
     logging.error('Can not find default kbd file')
   return ret
 
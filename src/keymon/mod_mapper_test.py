@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from . import mod_mapper
+
+KBD = '''# Scancode Map-Name Medium-Name Short-Name
+1 KEY_ESCAPE Esc
+14 KEY_BACKSPACE Back \N{Leftwards open-headed arrow}
+'''
+
+class TestModMapper(unittest.TestCase):
+  """Unit tests for the ModMapper"""
+  def setUp(self):
+    self.modmap = mod_mapper.parse_kbd(KBD)
+
+  def test_mapping(self):
+    self.assertEqual(len(self.modmap), 2)
+    self.assertEqual(list(self.modmap), [1, 14])
+    self.assertIn(14, self.modmap)
+    self.assertNotIn(2, self.modmap)
+    self.assertNotIn(1000, self.modmap)
+    self.assertEqual(self.modmap[1], ('KEY_ESCAPE', 'Esc', ''))
+    self.assertRaises(KeyError, lambda: self.modmap[2])
+
+  def test_get_and_check(self):
+    self.assertEqual(self.modmap.get_and_check(1, 'KEY_ESCAPE')[1], 'Esc')
+    # Wrong scancode, found by name.
+    self.assertEqual(self.modmap.get_and_check(2, 'KEY_ESCAPE')[1], 'Esc')
+    self.assertEqual(self.modmap.get_and_check(1, 'KEY_A'), (None, None, None))
+    self.assertEqual(self.modmap.get_from_name('KEY_BACKSPACE')[0], 14)
+
+  def test_setitem(self):
+    self.modmap[30] = ('KEY_A', 'A', '')
+    self.assertEqual(len(self.modmap), 3)
+    self.assertEqual(self.modmap.get_and_check(30, 'KEY_A'), ('KEY_A', 'A', ''))
+    self.assertEqual(self.modmap.get_from_name('KEY_A')[0], 30)
+    self.modmap[300] = ('KEY_B', 'B', '')
+    self.assertEqual(self.modmap[300][1], 'B')
+
+  def test_labels_shared(self):
+    self.modmap[50] = ('KEY_ESCAPE', 'Esc', '')
+    self.assertIs(self.modmap[50], self.modmap[1])
+
+
+class TestLevelLabels(unittest.TestCase):
+  """Unit tests for the LevelLabels"""
+  def setUp(self):
+    # Keycode 10 of a us,de keymap: 1 ! 1 ! onesuperior exclamdown ...
+    keysyms = [()] * 2 + [(0x31, 0x21, 0x31, 0x21, 0xb9, 0xa1, 0xb9, 0xa1)]
+    # Keycode 29: y Y z Z
+    keysyms += [()] * 16 + [(0x79, 0x59, 0x7a, 0x5a)]
+    self.labels = mod_mapper.LevelLabels(keysyms)
+
+  def test_levels(self):
+    self.assertEqual(self.labels.get(2, 0), '1')
+    self.assertEqual(self.labels.get(2, mod_mapper.SHIFT_MASK), '!')
+    self.assertEqual(self.labels.get(2, mod_mapper.MOD5_MASK), '\N{Superscript one}')
+    self.assertEqual(self.labels.get(2, mod_mapper.LEVEL_MASK), '\N{Inverted exclamation mark}')
+    self.assertIsNone(self.labels.get(3, mod_mapper.SHIFT_MASK))
+    self.assertIsNone(self.labels.get(1000, 0))
+
+  def test_groups(self):
+    group2 = 1 << 13
+    self.assertEqual(self.labels.get(19, mod_mapper.SHIFT_MASK), 'Y')
+    self.assertEqual(self.labels.get(19, group2), 'Z')
+    self.assertIsNone(self.labels.get(19, group2 | mod_mapper.MOD5_MASK))
+
+  def test_keysym_label(self):
+    self.assertEqual(mod_mapper.keysym_label(0x61), 'A')
+    self.assertEqual(mod_mapper.keysym_label(0xdf), '\N{Latin small letter sharp s}')
+    self.assertEqual(mod_mapper.keysym_label(0x10020ac), '\N{Euro sign}')
+    self.assertEqual(mod_mapper.keysym_label(0xff0d), 'Return')
+    self.assertIsNone(mod_mapper.keysym_label(0))
+
+
+class FakeDisplay():
+  """Just enough of an Xlib Display for read_xkb_layouts."""
+  def __init__(self, rules_names):
+    self.rules_names = rules_names
+
+  def intern_atom(self, unused_name):
+    return 1
+
+  def screen(self):
+    return self
+
+  @property
+  def root(self):
+    return self
+
+  def get_full_property(self, unused_atom, unused_type):
+    return unittest.mock.Mock(value=self.rules_names)
+
+
+class TestXkbLayouts(unittest.TestCase):
+  """Unit tests for read_xkb_layouts"""
+
+  def test_layouts(self):
+    disp = FakeDisplay(b'evdev\0pc105\0us,de,tr\0,nodeadkeys,f\0grp:alt_shift_toggle\0')
+    self.assertEqual(mod_mapper.read_xkb_layouts(disp),
+                     ['us', 'de_nodeadkeys', 'tr_f'])
+
+  def test_one_layout(self):
+    disp = FakeDisplay(b'evdev\0pc105\0gb\0\0\0')
+    self.assertEqual(mod_mapper.read_xkb_layouts(disp), ['gb'])
+
+  def test_unknown(self):
+    self.assertEqual(mod_mapper.read_xkb_layouts(FakeDisplay(b'')), [])
+
+
+class TestKbdCache(unittest.TestCase):
+  """Unit tests for the KbdCache"""
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.kbd = os.path.join(self.tmp_dir, 'test.kbd')
+    with open(self.kbd, 'w', encoding='utf-8') as fout:
+      fout.write(KBD)
+    self.cache_fname = os.path.join(self.tmp_dir, 'cache', 'kbd.pickle')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_persisted(self):
+    got = mod_mapper.KbdCache(self.cache_fname).read_kbd(self.kbd)
+    self.assertEqual(got[1], ('KEY_ESCAPE', 'Esc', ''))
+    self.assertTrue(os.path.exists(self.cache_fname))
+    cache = mod_mapper.KbdCache(self.cache_fname)
+    cache._load()
+    self.assertIn(self.kbd, cache.entries)
+    self.assertEqual(cache.read_kbd(self.kbd)[14][0], 'KEY_BACKSPACE')
+
+  def test_mtime_invalidates(self):
+    mod_mapper.KbdCache(self.cache_fname).read_kbd(self.kbd)
+    with open(self.kbd, 'w', encoding='utf-8') as fout:
+      fout.write('1 KEY_ESCAPE Escape\n')
+    stat = os.stat(self.kbd)
+    os.utime(self.kbd, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    got = mod_mapper.KbdCache(self.cache_fname).read_kbd(self.kbd)
+    self.assertEqual(got[1], ('KEY_ESCAPE', 'Escape', ''))
+    self.assertNotIn(14, got)
+
+  def test_corrupt(self):
+    os.makedirs(os.path.dirname(self.cache_fname))
+    with open(self.cache_fname, 'wb') as fout:
+      fout.write(b'not a pickle')
+    got = mod_mapper.KbdCache(self.cache_fname).read_kbd(self.kbd)
+    self.assertEqual(len(got), 2)
+
+  def test_copy_returned(self):
+    cache = mod_mapper.KbdCache(self.cache_fname)
+    got = cache.read_kbd(self.kbd)
+    got[1] = ('KEY_ONE', 'One', '')
+    self.assertEqual(got.get_from_name('KEY_ONE'), (1, ('KEY_ONE', 'One', '')))
+    again = cache.read_kbd(self.kbd)
+    self.assertEqual(again[1], ('KEY_ESCAPE', 'Esc', ''))
+    self.assertIsNone(again.get_from_name('KEY_ONE'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -23,15 +23,23 @@ It behaves a little like optparse in that you can get or set the attributes by
 name.
 
 It uses ConfigParser to save the variables to disk in ini format.
+
+Code reading options often uses the snapshot, a namedtuple of every value,
+and code reacting to changes subscribes to the options it cares about.
 """
 __author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
 
+import collections
 import configparser
 import gettext
+import io
 import logging
 import optparse
 import os
+import shutil
 import sys
+import tempfile
+import weakref
 
 LOG = logging.getLogger('options')
 
@@ -185,6 +193,10 @@ class OptionItem(object):
     self._set_attr_value('_value', val)
     self._set_attr_value('_temp_value', None)
 
+  def set_ini_value(self, val):
+    """Set the value from the ini file, a command line value still wins."""
+    self._set_attr_value('_value', val)
+
   def _set_temp_value(self, val):
     self._set_attr_value('_temp_value', val)
 
@@ -254,9 +266,13 @@ class Options(object):
   def __init__(self):
     self._options = {}
     self._ini_filename = None
+    self._saved_ini = None  # Text of the ini file as last read or written.
     self._opt_group = None
     self._opt_group_desc = {}
     self._options_order = []
+    self._snapshot_class = None
+    self._snapshot = None
+    self._subscribers = []  # (set of dests or None, callback or WeakMethod)
 
   def __getattr__(self, name):
     if name not in self.__dict__['_options']:
@@ -269,6 +285,71 @@ class Options(object):
     else:
       LOG.info(f'Setting {name!r} = {value!r}')
       self.__dict__['_options'][name].value = value
+      self._update()
+
+  @property
+  def snapshot(self):
+    """The values of all the options, a namedtuple made again when one changes.
+
+    Reading snapshot.scale is a lot cheaper than options.scale, use it where
+    it's read often.
+    """
+    if self._snapshot is None:
+      self._update()
+    return self._snapshot
+
+  def subscribe(self, dests, callback):
+    """Call callback(snapshot, changed) when options change.
+    Args:
+      dests: the dests of the options of interest, None for all of them.
+      callback: called with the new snapshot and the frozenset of the dests
+        which changed. Bound methods are only weakly referenced, ex. the
+        callbacks of a widget that's thrown away stop with it.  Errors it
+        raises are logged, they don't stop the change or other callbacks.
+    """
+    if self._snapshot is None:
+      # The values to compare with.
+      self._update()
+    if hasattr(callback, '__self__'):
+      callback = weakref.WeakMethod(callback)
+    self._subscribers.append((None if dests is None else set(dests), callback))
+
+  def unsubscribe(self, callback):
+    """Stop calling callback."""
+    self._subscribers = [
+        (dests, ref) for dests, ref in self._subscribers
+        if self._callback(ref) not in (callback, None)]
+
+  @staticmethod
+  def _callback(ref):
+    return ref() if isinstance(ref, weakref.WeakMethod) else ref
+
+  def _update(self):
+    """Make the snapshot again and tell the subscribers what changed."""
+    if self._snapshot_class is None:
+      self._snapshot_class = collections.namedtuple(
+          'OptionsSnapshot', self._options_order)
+    new = self._snapshot_class._make(
+        self._options[dest].value for dest in self._options_order)
+    old = self._snapshot
+    if new == old:
+      return
+    self._snapshot = new
+    if old is None:
+      return
+    changed = {dest for dest, old_val, new_val in zip(new._fields, old, new)
+               if old_val != new_val}
+    for dests, ref in list(self._subscribers):
+      callback = self._callback(ref)
+      if callback is None:
+        self._subscribers.remove((dests, ref))
+        continue
+      mine = changed if dests is None else changed & dests
+      if mine:
+        try:
+          callback(new, frozenset(mine))
+        except Exception:
+          LOG.exception('Applying the options %s failed', sorted(mine))
 
   def add_option_group(self, group, desc):
     self._opt_group = group
@@ -298,6 +379,8 @@ class Options(object):
         name, help,
         opt_group=self._opt_group, opt_short=opt_short, opt_long=opt_long,
         ini_group=ini_group, ini_name=ini_name)
+    self._snapshot_class = None
+    self._snapshot = None
 
   def parse_args(self, desc, args=None):
     """Add the options to the optparse instance and parse command line
@@ -313,6 +396,7 @@ class Options(object):
     self._opt_ret, self._other_args = parser.parse_args(args)
     for opt in list(self._options.values()):
       opt.set_from_optparse(self._opt_ret, args)
+    self._update()
 
   def parse_ini(self, fp):
     """Parser an ini file from fp, which is file-like class."""
@@ -325,7 +409,7 @@ class Options(object):
         checker[opt.ini_group + '-' + opt.ini_name] = True
         if (config.has_section(opt.ini_group) and
             config.has_option(opt.ini_group, opt.ini_name)):
-          opt.value = config.get(opt.ini_group, opt.ini_name)
+          opt.set_ini_value(config.get(opt.ini_group, opt.ini_name))
           LOG.info(f'From ini getting {opt.ini_group}.{opt.ini_name} = {opt.value}')
     for section in config.sections():
       for name, value in config.items(section):
@@ -333,6 +417,7 @@ class Options(object):
         if not combined_name in checker:
           LOG.info(f'Unknown option {name!r} in section [{section}]')
           # we no longer throw an error to be backward compatible
+    self._update()
 
   def write_ini(self, fp):
     """Parser an ini file from fp, which is file-like class."""
@@ -348,6 +433,12 @@ class Options(object):
         config.set(opt.ini_group, opt.ini_name, opt.ini_value)
     config.write(fp)
 
+  def ini_text(self):
+    """The options as the text of an ini file."""
+    fo = io.StringIO()
+    self.write_ini(fo)
+    return fo.getvalue()
+
   def read_ini_file(self, fname):
     self._ini_filename = os.path.expanduser(fname)
     LOG.info(f'Reading from {self._ini_filename!r}')
@@ -355,11 +446,36 @@ class Options(object):
       fi = open(self._ini_filename)
       self.parse_ini(fi)
       fi.close()
+      self._saved_ini = self.ini_text()
     else:
       LOG.info(f'{self._ini_filename!r} does not exist')
 
+  def reload_ini_file(self):
+    """Read the ini file again, ex. after it was edited.
+    Returns:
+      list of the dests of the options whose value changed.
+    """
+    before = {dest: opt.value for dest, opt in self._options.items()}
+    self.read_ini_file(self._ini_filename)
+    return [dest for dest, opt in self._options.items()
+            if opt.value != before[dest]]
+
+  @property
+  def ini_filename(self):
+    """Full path of the ini file, None if none was read."""
+    return self._ini_filename
+
   def save(self):
-    self._write_ini_file(self._ini_filename)
+    """Write the ini file, unless nothing changed since it was read or written.
+    Returns:
+      True if the file was written.
+    """
+    text = self.ini_text()
+    if text == self._saved_ini:
+      return False
+    self._write_ini_file(self._ini_filename, text)
+    self._saved_ini = text
+    return True
 
   def _make_dirs(self, fname):
     if not os.path.exists(fname):
@@ -368,12 +484,23 @@ class Options(object):
         LOG.info(f'Creating directory {dirname!r}')
         os.makedirs(dirname)
 
-  def _write_ini_file(self, fname):
+  def _write_ini_file(self, fname, text):
+    """Replace fname with text at once, a crash leaves the old or new file."""
     self._make_dirs(fname)
     LOG.info(f'Writing config file {fname!r}')
-    fo = open(fname, 'w')
-    self.write_ini(fo)
-    fo.close()
+    fd, tmp_name = tempfile.mkstemp(
+        dir=os.path.dirname(fname), prefix='.config-', suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'w') as fo:
+        fo.write(text)
+        fo.flush()
+        os.fsync(fo.fileno())
+      if os.path.exists(fname):
+        shutil.copymode(fname, tmp_name)
+      os.replace(tmp_name, fname)
+    except BaseException:
+      os.unlink(tmp_name)
+      raise
 
   def reset_to_defaults(self):
     """Reset ini file to defaults."""
@@ -381,6 +508,7 @@ class Options(object):
       if not opt.ini_group:
         continue
       opt.reset_to_default()
+    self._update()
 
 if __name__ == '__main__':
   o = Options()
@@ -15,6 +15,9 @@
 # limitations under the License.
 
 import io
+import os
+import shutil
+import tempfile
 import unittest
 
 from . import options
@@ -166,6 +169,92 @@ class TestOptions(unittest.TestCase):
     self.assertEqual(opts.num, 456)
     self.assertEqual(opts.num99, 99)
 
+  def test_reload_ini(self):
+    tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    fname = os.path.join(tmp_dir, 'config')
+    with open(fname, 'w') as fout:
+      fout.write('[ints]\nnum = 345\nnum99 = 1\n')
+    self.options.read_ini_file(fname)
+    self.options.parse_args("Usage", ['--num99', '99'])
+    with open(fname, 'w') as fout:
+      fout.write('[ints]\nnum = 346\nnum99 = 2\n')
+    self.assertEqual(self.options.reload_ini_file(), ['num'])
+    self.assertEqual(self.options.num, 346)
+    # The command line still wins.
+    self.assertEqual(self.options.num99, 99)
+    self.assertEqual(self.options.reload_ini_file(), [])
+
+  def test_save(self):
+    tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    fname = os.path.join(tmp_dir, 'sub', 'config')
+    self.options.read_ini_file(fname)
+    self.assertTrue(self.options.save())
+    self.assertFalse(self.options.save())
+    self.options.num = 7
+    self.assertTrue(self.options.save())
+    with open(fname) as fin:
+      self.assertIn('num = 7', fin.read())
+    self.assertEqual(os.listdir(os.path.dirname(fname)), ['config'])
+    # Reading the file back doesn't make it dirty.
+    self.options.read_ini_file(fname)
+    self.assertFalse(self.options.save())
+
+  def test_snapshot(self):
+    self.options.parse_args("Usage", ['--num', '5'])
+    snapshot = self.options.snapshot
+    self.assertEqual((snapshot.num, snapshot.num99, snapshot.tr), (5, 99, True))
+    with self.assertRaises(AttributeError):
+      snapshot.num = 6
+    self.options.num = 5
+    self.assertIs(self.options.snapshot, snapshot)
+    self.options.num = 6
+    self.assertEqual(self.options.snapshot.num, 6)
+    self.assertEqual(snapshot.num, 5)
+
+  def test_subscribe(self):
+    self.options.parse_args("Usage", [])
+    calls = []
+    def changed(snapshot, dests):
+      calls.append((snapshot.num, dests))
+    self.options.subscribe(['num', 'fa'], changed)
+    self.options.num99 = 1
+    self.options.num = 7
+    self.options.parse_ini(io.StringIO('[ints]\nnum = 8\n[options]\nfalse = 1\n'))
+    self.assertEqual(calls, [(7, frozenset(['num'])),
+                             (8, frozenset(['num', 'fa']))])
+    self.options.unsubscribe(changed)
+    self.options.num = 9
+    self.assertEqual(len(calls), 2)
+
+  def test_subscribe_error(self):
+    self.options.parse_args("Usage", [])
+    calls = []
+    def broken(unused_snapshot, unused_dests):
+      raise ValueError('broken')
+    self.options.subscribe(['num'], broken)
+    self.options.subscribe(['num'], lambda snapshot, _: calls.append(snapshot.num))
+    with self.assertLogs('options', level='ERROR'):
+      self.options.num = 3
+    self.assertEqual(self.options.num, 3)
+    self.assertEqual(calls, [3])
+
+  def test_subscribe_weak(self):
+    class Widget():
+      def __init__(self):
+        self.nums = []
+      def changed(self, snapshot, unused_dests):
+        self.nums.append(snapshot.num)
+    self.options.parse_args("Usage", [])
+    widget = Widget()
+    self.options.subscribe(['num'], widget.changed)
+    self.options.num = 1
+    self.assertEqual(widget.nums, [1])
+    del widget
+    self.options.num = 2
+    self.assertEqual(self.options._subscribers, [])
+
   def test_to_ini_empty(self):
     io_result = io.StringIO()
     self.options.write_ini(io_result)
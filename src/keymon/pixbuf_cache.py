@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent cache of rendered pixbufs, shared between runs.
+
+Each entry is one file named after a hash of everything that went into the
+image: the source files (path, mtime and size), the substitutions applied,
+the scale and the color.  Editing a theme file changes its mtime and so the
+key, stale entries are never read again and age out of the cache.
+
+The file is a small header followed by the raw pixel rows of the GdkPixbuf,
+read with one read() as the pixbuf needs its own copy anyway.  Reading an
+entry touches its mtime, when the cache grows over its size the least
+recently used entries are removed.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib, GdkPixbuf
+
+from . import theme_pack
+
+# Bump when the format or the rendering changes.
+FORMAT_VERSION = 2
+MAGIC = b'KMPB'
+# magic, version, width, height, rowstride, has_alpha, n_channels
+HEADER = struct.Struct('<4sHIIIBB')
+SUFFIX = '.pixbuf'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class DiskCache():
+  """Cache of pixbufs in a directory."""
+  def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Initialize.
+    Args:
+      cache_dir: directory to put the files in, created if needed.
+      max_bytes: size of the cache, least recently used entries are removed
+        when it's larger.
+    """
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.total_bytes = None  # Computed on first store.
+    self.lock = threading.Lock()  # Images may be stored from threads.
+
+  def key_for(self, ops, resize, color=None):
+    """Return the key of the image made from ops.
+    Args:
+      ops: list of filenames or closures, see LazyPixbufCreator.
+      resize: scale of the image.
+      color: color forced on the image, if any.
+    Returns:
+      A string or None if the ops can't be cached.
+    """
+    parts = [FORMAT_VERSION, resize, color]
+    for operation in ops:
+      if isinstance(operation, str):
+        fname, extra = operation, None
+      else:
+        cache_key = getattr(operation, 'cache_key', None)
+        if not cache_key:
+          return None
+        fname, extra = cache_key
+      try:
+        mtime_ns, size = theme_pack.stat(fname)
+      except OSError:
+        return None
+      parts.append((fname, mtime_ns, size, extra))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+  def _path(self, key):
+    return os.path.join(self.cache_dir, key + SUFFIX)
+
+  def load(self, key):
+    """Return the pixbuf stored under key or None."""
+    fname = self._path(key)
+    try:
+      with open(fname, 'rb') as fin:
+        magic, version, width, height, rowstride, has_alpha, n_channels = (
+            HEADER.unpack(fin.read(HEADER.size)))
+        if magic != MAGIC or version != FORMAT_VERSION:
+          return None
+        data = fin.read()
+      if len(data) < rowstride * (height - 1) + width * n_channels:
+        # Truncated.
+        return None
+      pixels = GLib.Bytes.new(data)
+      os.utime(fname)
+    except (OSError, ValueError, struct.error):
+      return None
+    logging.debug('Disk cache hit %s', key)
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        pixels, GdkPixbuf.Colorspace.RGB, bool(has_alpha), 8,
+        width, height, rowstride)
+
+  def store(self, key, pixbuf):
+    """Save pixbuf under key, errors are only logged."""
+    if pixbuf.get_bits_per_sample() != 8:
+      return
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, pixbuf.get_width(), pixbuf.get_height(),
+        pixbuf.get_rowstride(), int(pixbuf.get_has_alpha()),
+        pixbuf.get_n_channels())
+    pixels = pixbuf.read_pixel_bytes().get_data()
+    try:
+      os.makedirs(self.cache_dir, exist_ok=True)
+      fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as fout:
+        fout.write(header)
+        fout.write(pixels)
+      os.replace(tmp_name, self._path(key))
+    except OSError as e:
+      logging.warning('Unable to write to the pixbuf cache: %s', e)
+      return
+    with self.lock:
+      if self.total_bytes is None:
+        self.total_bytes = self._scan_size()
+      else:
+        self.total_bytes += len(header) + len(pixels)
+      if self.total_bytes > self.max_bytes:
+        self._evict()
+
+  def _entries(self):
+    """List of (mtime, size, path) of the cache files."""
+    entries = []
+    try:
+      with os.scandir(self.cache_dir) as it:
+        for entry in it:
+          if entry.name.endswith(SUFFIX):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+      pass
+    return entries
+
+  def _scan_size(self):
+    return sum(size for _, size, _ in self._entries())
+
+  def _evict(self):
+    """Remove least recently used entries until we fit."""
+    entries = sorted(self._entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.unlink(path)
+        total -= size
+      except OSError:
+        pass
+    logging.debug('Pixbuf cache evicted down to %d bytes', total)
+    self.total_bytes = total
+
+  def clear(self):
+    """Remove every entry."""
+    for _, _, path in self._entries():
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
+    self.total_bytes = 0
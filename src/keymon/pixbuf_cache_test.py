@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf
+
+from . import pixbuf_cache
+
+class TestDiskCache(unittest.TestCase):
+  """Unit tests for the pixbuf_cache module"""
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.cache = pixbuf_cache.DiskCache(os.path.join(self.tmp_dir, 'cache'))
+    self.svg = os.path.join(self.tmp_dir, 'key.svg')
+    with open(self.svg, 'w') as fout:
+      fout.write('<svg/>')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_key_changes_with_inputs(self):
+    key = self.cache.key_for([self.svg], 1.0)
+    self.assertEqual(key, self.cache.key_for([self.svg], 1.0))
+    self.assertNotEqual(key, self.cache.key_for([self.svg], 1.5))
+    self.assertNotEqual(key, self.cache.key_for([self.svg], 1.0, 'ff0000'))
+    stat = os.stat(self.svg)
+    os.utime(self.svg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    self.assertNotEqual(key, self.cache.key_for([self.svg], 1.0))
+
+  def test_uncacheable_ops(self):
+    self.assertIsNone(self.cache.key_for([lambda: '<svg/>'], 1.0))
+    self.assertIsNone(self.cache.key_for(['/does/not/exist.svg'], 1.0))
+
+    def closure():
+      return '<svg/>'
+    closure.cache_key = (self.svg, (('&amp;', 'A'),))
+    self.assertIsNotNone(self.cache.key_for([closure], 1.0))
+
+  def test_store_and_load(self):
+    pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 5, 3)
+    pixbuf.fill(0x11223344)
+    self.cache.store('abc', pixbuf)
+    got = self.cache.load('abc')
+    self.assertEqual(got.get_width(), 5)
+    self.assertEqual(got.get_height(), 3)
+    self.assertEqual(got.get_pixels(), pixbuf.get_pixels())
+    self.assertIsNone(self.cache.load('missing'))
+
+  def test_truncated(self):
+    pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 5, 3)
+    self.cache.store('abc', pixbuf)
+    fname = self.cache._path('abc')
+    with open(fname, 'r+b') as fout:
+      fout.truncate(os.path.getsize(fname) - 4)
+    self.assertIsNone(self.cache.load('abc'))
+
+  def test_evict(self):
+    pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 10, 10)
+    self.cache.max_bytes = 1000
+    for key in ('a', 'b', 'c'):
+      self.cache.store(key, pixbuf)
+    self.assertLessEqual(self.cache.total_bytes, 1000)
+    self.assertIsNotNone(self.cache.load('c'))
+
+if __name__ == '__main__':
+  unittest.main()
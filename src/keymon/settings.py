@@ -24,9 +24,7 @@ import os
 
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GObject
-
-from configparser import ConfigParser
+from gi.repository import Gdk, Gtk, GObject
 
 LOG = logging.getLogger('settings')
 
@@ -128,6 +126,34 @@ class CommonFrame(Gtk.Frame):
     vbox.pack_start(hbox, expand=False, fill=False, padding=0)
     return combo
 
+  def _add_color(self, vbox, title, tooltip, option):
+    """Add a color button, the option is a 'rrggbb' string."""
+    hbox = Gtk.Box()
+    label = Gtk.Label(title)
+    label.set_tooltip_text(tooltip)
+    hbox.pack_start(label, expand=False, fill=False, padding=0)
+
+    color_button = Gtk.ColorButton()
+    rgba = Gdk.RGBA()
+    val = getattr(self.settings.options, option)
+    if val and rgba.parse('#' + val.lstrip('#')):
+      color_button.set_rgba(rgba)
+    color_button.set_tooltip_text(tooltip)
+    color_button.connect('color-set', self._color_set, option)
+    hbox.pack_start(color_button, expand=False, fill=False, padding=10)
+    vbox.pack_start(hbox, expand=False, fill=False, padding=0)
+
+  def _color_set(self, widget, option):
+    """A color was picked."""
+    rgba = widget.get_rgba()
+    val = '%02x%02x%02x' % tuple(
+        round(chan * 255) for chan in (rgba.red, rgba.green, rgba.blue))
+    # Not _update_option(), it would turn '000000' into an int.
+    setattr(self.settings.options, option, val)
+    LOG.info('Set option %s to %s', option, val)
+    self.settings.options.save()
+    self.settings.settings_changed()
+
   def _toggled(self, widget, option):
     """The checkbox was toggled."""
     if widget.get_active():
@@ -145,6 +171,8 @@ class CommonFrame(Gtk.Frame):
   def _update_option(self, option, val, str_val):
     """Update an option."""
     if str_val.isdigit():
+      # The text, not the index, old keys has non consecutive values.
+      val = int(str_val)
       setattr(self.settings.options, option, val)
       LOG.info('Set option %s to %s', option, val)
     else:
@@ -176,6 +204,11 @@ class MiscFrame(CommonFrame):
         _('Highly visible click'),
         _('Show a circle when the users clicks.'),
         'visible_click')
+    self._add_color(
+        vbox,
+        _('Click color:'),
+        _('Color of the highly visible click.'),
+        'click_color')
     self._add_check(
         vbox,
         _('Window decoration'),
@@ -196,6 +229,11 @@ class MiscFrame(CommonFrame):
         _('StickyKeys mode'),
         _('Make modifier keys be sticky'),
         'sticky_mode')
+    self._add_check(
+        vbox,
+        _('Shifted labels'),
+        _('Show the symbol typed with Shift or AltGr, like ! for Shift+1'),
+        'shifted_labels')
 
     sizes = ['1.0', '0.6', '0.8', '1.0', '1.2', '1.4', '1.6', '1.8']
     self._add_dropdown(
@@ -283,7 +321,12 @@ class ButtonsFrame(CommonFrame):
         vbox,
         _('Old Keys:'),
         _('When typing fast show more than one key typed.'),
-        [0, 1, 2, 3, 4], 'old_keys')
+        [0, 1, 2, 3, 4, 8, 16, 32, 50], 'old_keys')
+    self._add_check(
+        vbox,
+        _('Old keys in one strip'),
+        _('Draw the old keys in a single strip, faster with many old keys.'),
+        'history_strip')
 
     fadeouts = ['0', '0.5', '1.0', '1.5', '2.0', '3.0', '4.0', '5.0']
     self._add_dropdown(
@@ -301,14 +344,14 @@ def _test_settings_changed(unused_widget):
 
 def manually_run_dialog():
   """Test the dialog without starting keymon."""
-  from . import key_mon
+  from . import cli
 
   SettingsDialog.register()
   gettext.install('key_mon', 'locale')
   logging.basicConfig(
       level=logging.DEBUG, style="{",
       format='{filename} [{lineno}]: {levelname} {message}')
-  options = key_mon.create_options()
+  options = cli.create_options()
   options.read_ini_file('~/.config/key-mon/config')
   dlg = SettingsDialog(None, options)
   dlg.connect('settings-changed', _test_settings_changed)
@@ -316,55 +359,5 @@ def manually_run_dialog():
   dlg.run()
   return 0
 
-def get_config_dir():
-  """Return the base directory of configuration."""
-  return os.environ.get('XDG_CONFIG_HOME',
-                        os.path.expanduser('~/.config')) + '/key-mon'
-
-def get_config_dirs(kind):
-  """Return search paths of certain kind of configuration directory.
-  Args:
-    kind: Subfolder name
-  Return:
-    List of full paths
-  """
-  config_dirs = [
-      d for d in (
-          os.path.join(get_config_dir(), kind),
-          os.path.join(os.path.dirname(os.path.abspath(__file__)), kind)) \
-          if os.path.exists(d)]
-  return config_dirs
-
-def get_themes():
-  """Return a dict of themes.
-    keys are theme names
-    values are tuples of (description, path)
-      path is where the theme directory located,
-      i.e. theme files are path/*.
-  """
-  theme_dirs = get_config_dirs('themes')
-  themes = {}
-  for theme_dir in theme_dirs:
-    for entry in sorted(os.listdir(theme_dir)):
-      try:
-        parser = ConfigParser()
-        theme_config = os.path.join(theme_dir, entry, 'config')
-        parser.read(theme_config)
-        desc = parser.get('theme', 'description')
-        if entry not in themes:
-          themes[entry] = (desc, os.path.join(theme_dir, entry))
-      except:
-        LOG.warning(_(f'Unable to read theme {theme_config!r}'))
-  return themes
-
-def get_kbd_files():
-  """Return a list of kbd file paths"""
-  config_dirs = get_config_dirs('')
-  kbd_files = [
-      os.path.join(d, f) \
-      for d in config_dirs \
-      for f in sorted(os.listdir(d)) if f.endswith('.kbd')]
-  return kbd_files
-
 if __name__ == '__main__':
   manually_run_dialog()
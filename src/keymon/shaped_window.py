@@ -22,16 +22,32 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 gi.require_foreign("cairo")
-from gi.repository import Gtk, Gdk, GLib
+from gi.repository import Gtk, Gdk
 import cairo
 
+from . import animation
+from . import compositor
 from . import lazy_pixbuf_creator
+from . import svg_template
+
+
+def _one_stroke_color(fname):
+  """True if the SVG fname draws all its strokes in one color."""
+  try:
+    return len(svg_template.TEMPLATES.get(fname).stroke_colors) == 1
+  except (OSError, UnicodeDecodeError):
+    return False
+
 
 class ShapedWindow(Gtk.Window):
   """Create a window shaped as fname."""
-  def __init__(self, fname, opacity, color=None, scale=1.0, timeout=0.2):
+  def __init__(self, fname, opacity, color=None, scale=1.0, timeout=0.2,
+               disk_cache=None):
     Gtk.Window.__init__(self)
     self.connect('size-allocate', self._on_size_allocate)
+    self.connect('configure-event', self._on_configure)
+    self.connect('destroy', self._on_destroy)
+    self.connect('notify::scale-factor', self._scale_factor_changed)
     self.set_decorated(False)
     self.set_keep_above(True)
     self.set_accept_focus(False)
@@ -39,18 +55,24 @@ class ShapedWindow(Gtk.Window):
     self.shown = False
     self.opacity = opacity
     self.timeout = timeout
-    self.timeout_timer = None
+    self.option_dests = {}
+    self.animator = animation.Animator(self)
     self.name_fnames = {
         'mouse' : [fname],
     }
-    self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator(self.name_fnames,
-                                                         self.scale,
-                                                         color=color)
-    self.pixbuf = self.pixbufs.get('mouse')
-    self.resize(self.pixbuf.get_width(), self.pixbuf.get_height())
-
+    # Rendered once, in its own colors, then tinted with color.  An image of
+    # several colors, ex. black and yellow, keeps them.
+    self.tintable = fname.endswith('.svg') and _one_stroke_color(fname)
+    self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator(
+        self.name_fnames, self.scale, disk_cache=disk_cache,
+        device_scale=self.get_scale_factor())
+    self.position = None
+    self.pending_move = None
+    self.move_tick_id = None
     # a pixmap widget to contain the pixmap
-    self.image = Gtk.Image.new_from_pixbuf(self.pixbuf)
+    self.image = Gtk.Image()
+    self.color = color
+    self._load_image()
 
     rgba = self.get_screen().get_rgba_visual()
     if rgba is not None:
@@ -71,8 +93,65 @@ class ShapedWindow(Gtk.Window):
     self.image.show()
     self.add(self.image)
 
-  def _on_size_allocate(self, win, unused_allocation):
+  def follow_options(self, opts, **dests):
+    """Take settings from options, now and when they change.
+    Args:
+      opts: the options.Options.
+      dests: the dest of the option for each of opacity, color and timeout,
+        ex. timeout='visible_click_timeout'.
+    """
+    self.option_dests = dests
+    self._options_changed(opts.snapshot, None)
+    opts.subscribe(dests.values(), self._options_changed)
+
+  def _options_changed(self, snapshot, unused_changed):
+    for attr, dest in self.option_dests.items():
+      value = getattr(snapshot, dest)
+      if attr == 'color':
+        self.set_color(value)
+      elif attr == 'opacity':
+        self.opacity = value
+        self._restore_opacity()
+      else:
+        self.timeout = value
+
+  def set_color(self, color):
+    """Show the image in color, 'rrggbb', or in its own colors if None.
+
+    An image drawn in more than one color is always in its own colors.
+    """
+    if color == self.color:
+      return
+    self.color = color
+    self._show_mask()
+
+  def _show_mask(self):
+    if self.color and self.tintable:
+      self.image.set_from_surface(compositor.tint(self.mask, self.color))
+    else:
+      self.image.set_from_surface(self.mask)
+
+  def _load_image(self):
+    """Render the image at the device scale and show it."""
+    self.pixbuf = self.pixbufs.get('mouse')
+    # Cached geometry so following the mouse needs no round trips.
+    self.size = (self.pixbuf.get_width() // self.pixbufs.device_scale,
+                 self.pixbuf.get_height() // self.pixbufs.device_scale)
+    self.resize(*self.size)
+    self.mask = self.pixbufs.surface('mouse')
+    self._show_mask()
+
+  def _scale_factor_changed(self, unused_win, unused_pspec):
+    """Moved to a monitor with another scale factor, render again."""
+    if self.get_scale_factor() == self.pixbufs.device_scale:
+      return
+    self.pixbufs.reset_all(self.name_fnames, self.scale,
+                           device_scale=self.get_scale_factor())
+    self._load_image()
+
+  def _on_size_allocate(self, win, allocation):
     """Called when first allocated."""
+    self.size = (allocation.width, allocation.height)
     # Set the window shape
     win.set_property('skip-taskbar-hint', True)
     if not win.is_composited():
@@ -80,45 +159,92 @@ class ShapedWindow(Gtk.Window):
     else:
       win.set_opacity(self.opacity)
 
+  def _on_configure(self, unused_win, event):
+    """The window manager moved or resized us, remember where."""
+    self.position = (event.x, event.y)
+    return False
+
+  def _on_destroy(self, unused_win):
+    """No more frames will come, stop the fades and the pending move."""
+    self.animator.cancel_all()
+    self._cancel_move()
+
+  def _cancel_move(self):
+    """Forget the move waiting for the next frame, if any."""
+    self.pending_move = None
+    if self.move_tick_id is not None:
+      self.remove_tick_callback(self.move_tick_id)
+      self.move_tick_id = None
+
   def center_on_cursor(self, x=None, y=None):
-    """Move center of window to the cursor position"""
+    """Move center of window to the cursor position.
+
+    While visible the move is applied at most once per frame, only the
+    last requested position is used.
+    """
     if x is None or y is None:
+      # Synchronous round trip, only when the caller has no coordinates.
       root = Gdk.Screen.get_default().get_root_window()
       _, x, y, _ = root.get_pointer()
-    w, h = self.get_size()
-    new_x, new_y = x - w/2, y - h/2
-    pos = self.get_position()
-    if pos[0] != new_x or pos[1] != new_y or not self.get_visible():
-      self.move(new_x, new_y)
+    w, h = self.size
+    new_pos = (int(x - w / 2), int(y - h / 2))
+    if not self.get_visible():
+      # A move queued before it was hidden would put it back.
+      self._cancel_move()
+      self._move_to(new_pos)
       self.show()
+      return
+    self.pending_move = new_pos
+    if self.move_tick_id is None:
+      self.move_tick_id = self.add_tick_callback(self._on_move_tick)
+
+  def _on_move_tick(self, unused_widget, unused_frame_clock):
+    """Apply the last pending move, once per frame."""
+    self.move_tick_id = None
+    if self.pending_move:
+      self._move_to(self.pending_move)
+      self.pending_move = None
+    return False
+
+  def _move_to(self, pos):
+    if pos != self.position:
+      self.move(*pos)
+      self.position = pos
 
   def show(self):
     """Show this mouse indicator and ignore awaiting fade away request."""
-    if self.timeout_timer and self.shown:
-      # There is a fade away request, ignore it
-      if (GLib.main_context_default().find_source_by_id(self.timeout_timer)
-          and not GLib.main_context_default().find_source_by_id(self.timeout_timer).is_destroyed()):
-        GLib.source_remove(self.timeout_timer)
-      self.timeout_timer = None
+    if self.animator.is_running('fade') and self.shown:
+      # There is a fade away running, stop it and become opaque again.
+      self.animator.cancel('fade')
+      self._restore_opacity()
       # This method only is called when mouse is pressed, so there will be a
-      # release and fade_away call, no need to set up another timer.
+      # release and fade_away call, no need to set up another fade.
     super(ShapedWindow, self).show()
     # Fix click-through
     self.input_shape_combine_region(cairo.Region())
 
   def maybe_show(self):
     """Show the window if not already shown or timer timed out"""
-    if self.shown or not self.timeout_timer:
+    if self.shown or not self.animator.is_running('fade'):
       return
     self.shown = True
     self.show()
 
+  def _restore_opacity(self):
+    if self.is_composited():
+      self.set_opacity(self.opacity)
+
   def _end_fade(self):
     self.hide()
-    self.timeout_timer = None
+    self._restore_opacity()
 
   def fade_away(self):
-    """Make the window fade in a little bit."""
-    # TODO this isn't doing any fading out
+    """Fade the window out over timeout seconds, then hide it."""
     self.shown = False
-    self.timeout_timer = GLib.timeout_add(int(self.timeout * 1000), self._end_fade)
+    if not self.is_composited():
+      # Can't fade, just hide once the timeout is over.
+      self.animator.animate('fade', 0, 1, self.timeout, lambda unused_val: None,
+                            on_done=self._end_fade)
+      return
+    self.animator.fade('fade', self, 0.0, self.timeout,
+                       easing=animation.ease_in, on_done=self._end_fade)
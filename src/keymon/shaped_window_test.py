@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_foreign("cairo")
+
+from . import shaped_window
+
+THEMES_DIR = os.path.join(os.path.dirname(__file__), 'themes')
+
+def _colors(surface):
+  """Set of (red, green, blue) of the opaque pixels, each True if bright."""
+  data = bytes(surface.get_data())
+  colors = set()
+  for i in range(0, len(data) - 3, 4):
+    # ARGB32 in native, little endian, order.
+    blue, green, red, alpha = data[i:i + 4]
+    if alpha == 255:
+      colors.add((red > 128, green > 128, blue > 128))
+  return colors
+
+class TestShapedWindow(unittest.TestCase):
+  """Unit tests for the shaped_window module"""
+
+  def _surface(self, theme, color):
+    win = shaped_window.ShapedWindow(
+        os.path.join(THEMES_DIR, theme, 'mouse-indicator.svg'), 0.5,
+        color=color)
+    self.addCleanup(win.destroy)
+    return win.image.get_property('surface')
+
+  def test_tinted(self):
+    self.assertEqual(_colors(self._surface('classic', '00ff00')),
+                     {(False, True, False)})
+
+  def test_own_colors(self):
+    colors = _colors(self._surface('big-letters', 'ff0000'))
+    self.assertIn((False, False, False), colors)  # black
+    self.assertIn((True, True, False), colors)  # yellow
+    self.assertNotIn((True, False, False), colors)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SVG files compiled into literal chunks and slots.
+
+Every variant of a theme file (a label, a stroke color) used to be made by
+running str.replace() and a regular expression over the whole document.  Here
+the document is searched once, when compiled, and split into a list of
+literal strings and slots.  Rendering a variant only joins strings.
+
+The slots are:
+  - markers, like '&amp;' or 'TOP', replaced by a label.
+  - the stroke colors, replaced by a forced color.
+
+Scaling isn't done here, the loader rasterizes at the wanted size.
+
+Files are read through a TemplateCache which shares the text and compiled
+templates between keys and reads a file again only when its mtime changes.
+Files in packed themes are read the same way, see theme_pack.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import logging
+import re
+import threading
+
+from . import theme_pack
+
+RE_STROKE = re.compile(r'([";]stroke:#)([0-9A-Fa-f]{6})([";])')
+# Any stroke color, ex. 'black', also those the slots don't replace.
+RE_ANY_STROKE = re.compile(r'(?:[";]stroke:|\sstroke=")([^;"]+)')
+
+
+class MarkerSlot():
+  """Text like '&amp;' replaced by a label."""
+  def __init__(self, marker):
+    self.marker = marker
+
+  def render(self, color, subs):
+    if subs and self.marker in subs:
+      # Quick XML escape fix
+      return subs[self.marker].replace('<', '&lt;')
+    return self.marker
+
+
+class ColorSlot():
+  """A stroke color."""
+  def __init__(self, text):
+    self.text = text
+
+  def render(self, color, subs):
+    return color or self.text
+
+
+class SvgTemplate():
+  """SVG text split into literal chunks and slots."""
+  def __init__(self, text, markers=()):
+    """Compile text.
+    Args:
+      text: the SVG document.
+      markers: strings which may be replaced by a label when rendering.
+    """
+    spans = []  # (start, end, slot)
+    for marker in markers:
+      start = text.find(marker)
+      while start >= 0:
+        spans.append((start, start + len(marker), MarkerSlot(marker)))
+        start = text.find(marker, start + len(marker))
+    for grps in RE_STROKE.finditer(text):
+      spans.append((grps.start(2), grps.end(2), ColorSlot(grps.group(2))))
+
+    self.chunks = []
+    pos = 0
+    for start, end, slot in sorted(spans, key=lambda span: (span[0], span[1])):
+      if start < pos:
+        logging.debug('Ignoring overlapping slot at %d', start)
+        continue
+      self.chunks.append(text[pos:start])
+      self.chunks.append(slot)
+      pos = end
+    self.chunks.append(text[pos:])
+    self.stroke_colors = frozenset(
+        grps.group(1).strip().lower() for grps in RE_ANY_STROKE.finditer(text)
+        if grps.group(1).strip() != 'none')
+
+  def render(self, color=None, subs=None):
+    """Return the SVG text.
+    Args:
+      color: six hex digits forced on every stroke, or None.
+      subs: dict of marker to replacement text.
+    """
+    return ''.join(
+        chunk if isinstance(chunk, str) else chunk.render(color, subs)
+        for chunk in self.chunks)
+
+
+class Variant():
+  """A template and the substitutions for one image.
+
+  Returned by image closures, the LazyPixbufCreator renders it with its own
+  color.
+  """
+  def __init__(self, template, subs=None):
+    self.template = template
+    self.subs = subs
+
+  def render(self, color=None):
+    return self.template.render(color=color, subs=self.subs)
+
+
+class TemplateCache():
+  """Shared cache of file contents and compiled templates.
+
+  It's used from the render threads, files are read and compiled outside
+  the lock, two threads may do it for the same file.
+  """
+  def __init__(self):
+    self.files = {}  # fname -> (mtime_ns, size, text)
+    self.templates = {}  # (fname, markers) -> (mtime_ns, size, SvgTemplate)
+    self.lock = threading.Lock()
+
+  def read(self, fname):
+    """Return the text of fname, read again only if it changed."""
+    version = theme_pack.stat(fname)
+    with self.lock:
+      cached = self.files.get(fname)
+    if cached and cached[:2] == version:
+      return cached[2]
+    logging.debug('Read file %s', fname)
+    text = theme_pack.read_text(fname)
+    with self.lock:
+      self.files[fname] = version + (text,)
+    return text
+
+  def get(self, fname, markers=()):
+    """Return the compiled template of fname."""
+    markers = tuple(markers)
+    key = (fname, markers)
+    version = theme_pack.stat(fname)
+    with self.lock:
+      cached = self.templates.get(key)
+    if cached and cached[:2] == version:
+      return cached[2]
+    template = SvgTemplate(self.read(fname), markers)
+    with self.lock:
+      self.templates[key] = version + (template,)
+    return template
+
+  def forget(self, fname=None):
+    """Drop fname, or everything, from the cache."""
+    with self.lock:
+      if fname is None:
+        self.files = {}
+        self.templates = {}
+        return
+      self.files.pop(fname, None)
+      for key in [key for key in self.templates if key[0] == fname]:
+        del self.templates[key]
+
+
+# Shared by everyone reading theme files.
+TEMPLATES = TemplateCache()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from . import svg_template
+
+SAMPLE = '''<svg
+   height="66"
+   width="22.2"><g
+     transform="translate(2, 2)"><rect style="fill:#ffffff;stroke:#000000" />
+  <text>TOP &amp;</text><text>BOTTOM &amp;</text></g></svg>'''
+
+class TestSvgTemplate(unittest.TestCase):
+  """Unit tests for the svg_template module"""
+
+  def test_unchanged(self):
+    template = svg_template.SvgTemplate(SAMPLE, ('&amp;', 'TOP', 'BOTTOM'))
+    self.assertEqual(template.render(), SAMPLE)
+
+  def test_markers(self):
+    template = svg_template.SvgTemplate(SAMPLE, ('&amp;', 'TOP'))
+    got = template.render(subs={'&amp;': '<', 'TOP': 'Shift'})
+    self.assertIn('<text>Shift &lt;</text><text>BOTTOM &lt;</text>', got)
+
+  def test_color(self):
+    template = svg_template.SvgTemplate(SAMPLE)
+    got = template.render(color='ff0000')
+    self.assertIn('style="fill:#ffffff;stroke:#ff0000"', got)
+    self.assertEqual(got.replace('ff0000', '000000'), SAMPLE)
+
+  def test_stroke_colors(self):
+    self.assertEqual(svg_template.SvgTemplate(SAMPLE).stroke_colors,
+                     frozenset(['#000000']))
+    template = svg_template.SvgTemplate(
+        '<svg><path style="fill:none;stroke:black"/>'
+        '<path style="stroke:Yellow;stroke-width:2"/><path stroke="none"/></svg>')
+    self.assertEqual(template.stroke_colors, frozenset(['black', 'yellow']))
+
+
+class TestTemplateCache(unittest.TestCase):
+  """Unit tests for the TemplateCache"""
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.fname = os.path.join(self.tmp_dir, 'key.svg')
+    with open(self.fname, 'w') as fout:
+      fout.write('<g>&amp;</g>')
+    self.cache = svg_template.TemplateCache()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_shared(self):
+    template = self.cache.get(self.fname, ('&amp;',))
+    self.assertIs(template, self.cache.get(self.fname, ('&amp;',)))
+    self.assertEqual(template.render(subs={'&amp;': 'A'}), '<g>A</g>')
+
+  def test_mtime_invalidates(self):
+    self.cache.get(self.fname, ('&amp;',))
+    with open(self.fname, 'w') as fout:
+      fout.write('<g>[&amp;]</g>')
+    stat = os.stat(self.fname)
+    os.utime(self.fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    template = self.cache.get(self.fname, ('&amp;',))
+    self.assertEqual(template.render(subs={'&amp;': 'A'}), '<g>[A]</g>')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the installed themes, kept in the cache directory.
+
+Finding the themes means parsing the config of every theme, used or not.
+The index keeps the description, path and file names of each theme, and
+an entry is used while the theme keeps its stamp: the mtimes of the theme
+directory and of its config, or the mtime and size of a packed theme.
+Adding or removing a file changes the directory, editing the config doesn't.
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import collections
+import configparser
+import logging
+import os
+import pickle
+import tempfile
+
+from . import theme_pack
+
+# assets is the frozenset of the file names in the theme, ex. 'shift-small.svg'.
+Theme = collections.namedtuple('Theme', ['description', 'path', 'assets'])
+
+
+def theme_stamp(path):
+  """What changes when the theme at path changes.
+  Raises:
+    OSError: if path doesn't exist.
+  """
+  stat = os.stat(path)
+  if path.endswith(theme_pack.SUFFIX):
+    return (stat.st_mtime_ns, stat.st_size)
+  try:
+    config_mtime = os.stat(os.path.join(path, 'config')).st_mtime_ns
+  except OSError:
+    config_mtime = None
+  return (stat.st_mtime_ns, config_mtime)
+
+
+def read_theme(path):
+  """Return the Theme of the theme directory or pack path.
+  Raises:
+    OSError, UnicodeDecodeError, configparser.Error: if it can't be read.
+  """
+  config = os.path.join(path, 'config')
+  if path.endswith(theme_pack.SUFFIX):
+    # Not the shared open_pack(), it may be an older version of the file.
+    the_pack = theme_pack.ThemePack(path)
+    try:
+      text = the_pack.read('config').decode('utf-8')
+      assets = the_pack.names()
+    finally:
+      the_pack.close()
+  else:
+    with open(config, encoding='utf-8') as fin:
+      text = fin.read()
+    assets = os.listdir(path)
+  parser = configparser.ConfigParser()
+  parser.read_string(text, config)
+  return Theme(parser.get('theme', 'description'), path, frozenset(assets))
+
+
+class ThemeIndex():
+  """Themes found in the theme directories, pickled in one file between runs."""
+  # Bump when Theme changes.
+  FORMAT_VERSION = 1
+
+  def __init__(self, fname=None):
+    """Initialize.
+    Args:
+      fname: file to keep the index in, its directory is created if needed.
+        None to read every theme.
+    """
+    self.fname = fname
+    self.entries = None  # path: (stamp, Theme or None if unreadable)
+
+  def _load(self):
+    self.entries = {}
+    if not self.fname:
+      return
+    try:
+      with open(self.fname, 'rb') as fin:
+        version, entries = pickle.load(fin)
+      if version == self.FORMAT_VERSION:
+        self.entries = entries
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError,
+            AttributeError, ImportError) as e:
+      logging.debug('Ignoring the theme index %s: %s', self.fname, e)
+
+  def themes(self, theme_dirs):
+    """Return a dict of theme name: Theme.
+
+    A theme in an earlier directory of theme_dirs hides one of the same name
+    in a later directory, and in a directory the packed theme is preferred.
+    """
+    if self.entries is None:
+      self._load()
+    entries = {}
+    themes = {}
+    for theme_dir in theme_dirs:
+      dir_themes = {}
+      try:
+        names = sorted(os.listdir(theme_dir))
+      except OSError as e:
+        logging.warning('Unable to list the themes in %s: %s', theme_dir, e)
+        continue
+      for entry in names:
+        name = entry
+        if entry.endswith(theme_pack.SUFFIX):
+          name = entry[:-len(theme_pack.SUFFIX)]
+        elif name in dir_themes:
+          continue
+        path = os.path.join(theme_dir, entry)
+        entries[path] = self._entry(path)
+        if entries[path][1]:
+          dir_themes[name] = entries[path][1]
+      for name, theme in dir_themes.items():
+        if name not in themes:
+          themes[name] = theme
+    if entries != self.entries:
+      self.entries = entries
+      self.save()
+    return themes
+
+  def _entry(self, path):
+    """Return (stamp, Theme) of path, from the index if it didn't change."""
+    try:
+      stamp = theme_stamp(path)
+    except OSError as e:
+      logging.warning('Unable to read theme %r: %s', path, e)
+      return (None, None)
+    entry = self.entries.get(path)
+    if entry and entry[0] == stamp:
+      return entry
+    try:
+      return (stamp, read_theme(path))
+    except (OSError, UnicodeDecodeError, configparser.Error) as e:
+      logging.warning('Unable to read theme %r: %s', path, e)
+      return (stamp, None)
+
+  def save(self):
+    """Write the index, errors are only logged."""
+    if not self.fname:
+      return
+    dirname = os.path.dirname(self.fname)
+    try:
+      os.makedirs(dirname, exist_ok=True)
+      fd, tmp_name = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as fout:
+        pickle.dump((self.FORMAT_VERSION, self.entries), fout,
+                    pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp_name, self.fname)
+    except OSError as e:
+      logging.warning('Unable to write the theme index: %s', e)
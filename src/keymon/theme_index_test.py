@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from . import theme_index
+from . import theme_pack
+
+def _write(path, text):
+  with open(path, 'w', encoding='utf-8') as fout:
+    fout.write(text)
+
+class TestThemeIndex(unittest.TestCase):
+  """Unit tests for the theme_index module"""
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.themes_dir = os.path.join(self.tmp_dir, 'themes')
+    self.theme_dir = os.path.join(self.themes_dir, 'mine')
+    os.makedirs(self.theme_dir)
+    _write(os.path.join(self.theme_dir, 'config'), '[theme]\ndescription = Mine\n')
+    _write(os.path.join(self.theme_dir, 'shift.svg'), '<svg/>')
+    self.cache_fname = os.path.join(self.tmp_dir, 'cache', 'themes.pickle')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def themes(self):
+    return theme_index.ThemeIndex(self.cache_fname).themes([self.themes_dir])
+
+  def test_themes(self):
+    themes = self.themes()
+    self.assertEqual(themes, {'mine': theme_index.Theme(
+        'Mine', self.theme_dir, frozenset(['config', 'shift.svg']))})
+    self.assertTrue(os.path.exists(self.cache_fname))
+    # From the index.
+    self.assertEqual(self.themes(), themes)
+
+  def test_changes(self):
+    self.themes()
+    _write(os.path.join(self.theme_dir, 'shift-small.svg'), '<svg/>')
+    stat = os.stat(self.theme_dir)
+    os.utime(self.theme_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    self.assertIn('shift-small.svg', self.themes()['mine'].assets)
+    config = os.path.join(self.theme_dir, 'config')
+    _write(config, '[theme]\ndescription = Changed\n')
+    stat = os.stat(config)
+    os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    self.assertEqual(self.themes()['mine'].description, 'Changed')
+
+  def test_pack_preferred(self):
+    out_path = theme_pack.pack(self.theme_dir)
+    theme = self.themes()['mine']
+    self.assertEqual(theme.path, out_path)
+    self.assertEqual(theme.assets, frozenset(['config', 'shift.svg']))
+
+  def test_unreadable(self):
+    os.mkdir(os.path.join(self.themes_dir, 'broken'))
+    _write(os.path.join(self.themes_dir, 'broken', 'config'), 'no section')
+    with self.assertLogs(level='WARNING'):
+      self.assertEqual(list(self.themes()), ['mine'])
+    self.assertEqual(list(self.themes()), ['mine'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Themes packed in a single file.
+
+A theme directory holds its config and about 30 small SVG files, loading it
+means dozens of stat() and open() calls.  A packed theme, themes/<name>.kmtheme,
+is one file: a header, an index of name -> (offset, length) and the files
+themselves.  It's memory mapped once and files are read by offset.
+
+Files inside a pack are named like they would be in a directory,
+ex. themes/classic.kmtheme/shift.svg, stat(), exists() and read_text() below
+understand both kinds of path.
+
+To pack a theme:
+  python3 -m keymon.theme_pack themes/classic
+"""
+
+__author__ = 'scott@forusers.com (Scott Kirkwood))'
+
+import errno
+import json
+import logging
+import mmap
+import optparse
+import os
+import struct
+import sys
+import threading
+
+SUFFIX = '.kmtheme'
+MAGIC = b'KMTH'
+FORMAT_VERSION = 1
+# magic, version, length of the index
+HEADER = struct.Struct('<4sHI')
+
+class ThemePack():
+  """A packed theme, memory mapped."""
+  def __init__(self, path):
+    """Open and map path.
+    Raises:
+      OSError: if the file can't be read or isn't a theme pack.
+    """
+    self.path = path
+    self.lock = threading.Lock()
+    self.readers = 0  # Reads in progress, close() waits for them.
+    self.closing = False
+    with open(path, 'rb') as fin:
+      stat = os.fstat(fin.fileno())
+      self.version = (stat.st_mtime_ns, stat.st_size)
+      self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      magic, version, index_len = HEADER.unpack_from(self.data)
+      if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError('not a theme pack')
+      start = HEADER.size + index_len
+      index = json.loads(self.data[HEADER.size:start].decode('utf-8'))
+    except (ValueError, struct.error) as e:
+      self.data.close()
+      raise OSError(errno.EINVAL, f'Bad theme pack: {e}', path) from e
+    self.index = {
+        name: (start + offset, length) for name, (offset, length) in index.items()}
+
+  def names(self):
+    """Names of the files in the pack."""
+    return sorted(self.index)
+
+  def __contains__(self, name):
+    return name in self.index
+
+  def read(self, name):
+    """Return the bytes of the file name."""
+    if name not in self.index:
+      raise FileNotFoundError(
+          errno.ENOENT, 'Not in theme pack', os.path.join(self.path, name))
+    offset, length = self.index[name]
+    with self.lock:
+      if self.closing:
+        raise FileNotFoundError(
+            errno.ENOENT, 'Theme pack closed', os.path.join(self.path, name))
+      self.readers += 1
+    try:
+      return self.data[offset:offset + length]
+    finally:
+      with self.lock:
+        self.readers -= 1
+        if self.closing and not self.readers:
+          self.data.close()
+
+  def close(self):
+    """Close the pack, now or when the reads in progress are done."""
+    with self.lock:
+      self.closing = True
+      if not self.readers:
+        self.data.close()
+
+
+def pack(theme_dir, out_path=None):
+  """Pack every file of theme_dir into out_path.
+  Args:
+    theme_dir: a theme directory, with its config.
+    out_path: defaults to theme_dir + SUFFIX.
+  Returns:
+    out_path
+  """
+  theme_dir = theme_dir.rstrip(os.sep)
+  if not out_path:
+    out_path = theme_dir + SUFFIX
+  index = {}
+  blobs = []
+  offset = 0
+  for name in sorted(os.listdir(theme_dir)):
+    fname = os.path.join(theme_dir, name)
+    if not os.path.isfile(fname):
+      continue
+    with open(fname, 'rb') as fin:
+      blob = fin.read()
+    index[name] = (offset, len(blob))
+    blobs.append(blob)
+    offset += len(blob)
+  if 'config' not in index:
+    raise OSError(errno.ENOENT, 'Theme has no config', theme_dir)
+  index_bytes = json.dumps(index, sort_keys=True).encode('utf-8')
+  tmp_path = out_path + '.tmp'
+  with open(tmp_path, 'wb') as fout:
+    fout.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index_bytes)))
+    fout.write(index_bytes)
+    for blob in blobs:
+      fout.write(blob)
+  os.replace(tmp_path, out_path)
+  forget(out_path)
+  return out_path
+
+
+_PACKS = {}  # path -> ThemePack
+# Packs are opened and forgotten from the render threads too.
+_PACKS_LOCK = threading.Lock()
+
+def open_pack(path):
+  """Return the ThemePack of path, opened once."""
+  with _PACKS_LOCK:
+    if path not in _PACKS:
+      logging.debug('Open theme pack %s', path)
+      _PACKS[path] = ThemePack(path)
+    return _PACKS[path]
+
+
+def forget(path=None):
+  """Close the pack at path, or all of them, ex. after it was rebuilt.
+
+  A read in progress finishes first, later reads of a forgotten pack fail
+  with FileNotFoundError.
+  """
+  with _PACKS_LOCK:
+    paths = list(_PACKS) if path is None else [path]
+    packs = [_PACKS.pop(one) for one in paths if one in _PACKS]
+  for the_pack in packs:
+    the_pack.close()
+
+
+def split(path):
+  """Return (ThemePack, name) if path is inside a pack, else None."""
+  pack_path, name = os.path.split(path)
+  if not pack_path.endswith(SUFFIX):
+    return None
+  return open_pack(pack_path), name
+
+
+def stat(path):
+  """Return (mtime_ns, size) of a file, in a pack or not.
+
+  Files in a pack have the version of the pack, which is read once.
+  """
+  inside = split(path)
+  if inside:
+    the_pack, name = inside
+    if name not in the_pack:
+      raise FileNotFoundError(errno.ENOENT, 'Not in theme pack', path)
+    return the_pack.version
+  result = os.stat(path)
+  return result.st_mtime_ns, result.st_size
+
+
+def exists(path):
+  """True if the file exists, in a pack or not."""
+  try:
+    inside = split(path)
+  except OSError:
+    return False
+  if inside:
+    return inside[1] in inside[0]
+  return os.path.exists(path)
+
+
+def read_text(path):
+  """Return the text of a file, in a pack or not."""
+  inside = split(path)
+  if inside:
+    return inside[0].read(inside[1]).decode('utf-8')
+  with open(path, encoding='utf-8') as fin:
+    return fin.read()
+
+
+def main(argv):
+  parser = optparse.OptionParser(
+      usage='%prog [options] theme_dir...',
+      description='Pack theme directories into single %s files.' % SUFFIX)
+  parser.add_option('-o', '--output', dest='output',
+                    help='Output file, only with a single theme directory.')
+  opts, args = parser.parse_args(argv)
+  if not args:
+    parser.error('No theme directory given')
+  if opts.output and len(args) > 1:
+    parser.error('--output needs a single theme directory')
+  for theme_dir in args:
+    out_path = pack(theme_dir, opts.output)
+    print(f'{theme_dir} -> {out_path}')
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from . import theme_pack
+
+class TestThemePack(unittest.TestCase):
+  """Unit tests for the theme_pack module"""
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix='keymon-test-')
+    self.theme_dir = os.path.join(self.tmp_dir, 'mine')
+    os.mkdir(self.theme_dir)
+    for name, text in (('config', '[theme]\ndescription = Mine\n'),
+                       ('shift.svg', '<svg>shift</svg>'),
+                       ('shift-small.svg', '<svg>small</svg>')):
+      with open(os.path.join(self.theme_dir, name), 'w') as fout:
+        fout.write(text)
+
+  def tearDown(self):
+    theme_pack.forget()
+    shutil.rmtree(self.tmp_dir)
+
+  def test_pack_and_read(self):
+    out_path = theme_pack.pack(self.theme_dir)
+    self.assertEqual(out_path, self.theme_dir + theme_pack.SUFFIX)
+    the_pack = theme_pack.open_pack(out_path)
+    self.assertEqual(the_pack.names(), ['config', 'shift-small.svg', 'shift.svg'])
+    self.assertEqual(the_pack.read('shift-small.svg'), b'<svg>small</svg>')
+
+  def test_paths(self):
+    out_path = theme_pack.pack(self.theme_dir)
+    member = os.path.join(out_path, 'shift.svg')
+    self.assertTrue(theme_pack.exists(member))
+    self.assertFalse(theme_pack.exists(os.path.join(out_path, 'ctrl.svg')))
+    self.assertEqual(theme_pack.read_text(member), '<svg>shift</svg>')
+    self.assertEqual(theme_pack.stat(member), theme_pack.open_pack(out_path).version)
+    with self.assertRaises(FileNotFoundError):
+      theme_pack.stat(os.path.join(out_path, 'ctrl.svg'))
+    # Plain files work too.
+    plain = os.path.join(self.theme_dir, 'shift.svg')
+    self.assertTrue(theme_pack.exists(plain))
+    self.assertEqual(theme_pack.read_text(plain), '<svg>shift</svg>')
+
+  def test_bad_pack(self):
+    bad = os.path.join(self.tmp_dir, 'bad' + theme_pack.SUFFIX)
+    with open(bad, 'wb') as fout:
+      fout.write(b'not a pack at all')
+    with self.assertRaises(OSError):
+      theme_pack.ThemePack(bad)
+    self.assertFalse(theme_pack.exists(os.path.join(bad, 'config')))
+
+  def test_forget_during_read(self):
+    out_path = theme_pack.pack(self.theme_dir)
+    the_pack = theme_pack.open_pack(out_path)
+    data = the_pack.data
+    still_open = []
+    class ForgetWhileReading():
+      def __getitem__(self, key):
+        theme_pack.forget(out_path)
+        still_open.append(not data.closed)
+        return data[key]
+      def close(self):
+        data.close()
+    the_pack.data = ForgetWhileReading()
+    self.assertEqual(the_pack.read('config'), b'[theme]\ndescription = Mine\n')
+    self.assertEqual(still_open, [True])
+    self.assertTrue(data.closed)
+    with self.assertRaises(FileNotFoundError):
+      the_pack.read('config')
+    self.assertIsNot(theme_pack.open_pack(out_path), the_pack)
+
+  def test_open_once(self):
+    out_path = theme_pack.pack(self.theme_dir)
+    packs = []
+    threads = [threading.Thread(
+        target=lambda: packs.append(theme_pack.open_pack(out_path)))
+               for unused_i in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(len(set(map(id, packs))), 1)
+
+  def test_main(self):
+    out_path = os.path.join(self.tmp_dir, 'other' + theme_pack.SUFFIX)
+    self.assertEqual(theme_pack.main(['-o', out_path, self.theme_dir]), 0)
+    self.assertIn('config', theme_pack.open_pack(out_path))
+
+if __name__ == '__main__':
+  unittest.main()
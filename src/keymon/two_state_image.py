@@ -40,11 +40,23 @@ class TwoStateImage(Gtk.Image):
     self.count_down = None
     self.showit = show
     self.current = ''
+    self.pinned = None  # The name of the image shown.
     self.defer_to = defer_to
     self.timeout_secs = DEFAULT_TIMEOUT_SECS
+    self.timeout_dest = None
     self.switch_to(self.normal)
     self._really_pressed = False
 
+  def follow_timeout(self, opts, dest):
+    """Take timeout_secs from the option dest, now and when it changes."""
+    opts.unsubscribe(self._timeout_changed)
+    self.timeout_dest = dest
+    self.timeout_secs = getattr(opts.snapshot, dest)
+    opts.subscribe([dest], self._timeout_changed)
+
+  def _timeout_changed(self, snapshot, unused_changed):
+    self.timeout_secs = getattr(snapshot, self.timeout_dest)
+
   def reset_image(self, showit=True):
     """Image from pixbufs has changed, reset."""
     self.showit = showit
@@ -91,7 +103,15 @@ class TwoStateImage(Gtk.Image):
 
   def _switch_to(self, name):
     """Internal, switch to image with this name even if same."""
-    self.set_from_pixbuf(self.pixbufs.get(name))
+    surface = self.pixbufs.surface(name)
+    # Pin what's on screen so the cache doesn't evict it, the KEY_EMPTY image
+    # if name couldn't be made.
+    shown = self.pixbufs.shown_name(name)
+    self.pixbufs.pin(shown)
+    if self.pinned:
+      self.pixbufs.unpin(self.pinned)
+    self.pinned = shown
+    self.set_from_surface(surface)
     self.current = name
     self.count_down = None
     if self.showit:
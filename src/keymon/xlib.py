@@ -34,13 +34,17 @@ from Xlib import XK
 from Xlib.ext import record
 from Xlib.protocol import rq
 
+MAX_QUEUED_EVENTS = 10000
+
 class XEvent():
   """An event, mimics edev.py events."""
-  def __init__(self, atype, scancode, code, value):
+  def __init__(self, atype, scancode, code, value, pos=None, state=0):
     self._type = atype
     self._scancode = scancode
     self._code = code
     self._value = value
+    self._pos = pos
+    self._state = state
 
   def get_type(self):
     """Get the type of event."""
@@ -62,6 +66,21 @@ class XEvent():
     return self._value
   value = property(get_value)
 
+  def get_pos(self):
+    """Get the (root_x, root_y) of a mouse event, None if unknown."""
+    return self._pos
+  pos = property(get_pos)
+
+  def get_state(self):
+    """Get the modifier and button state of a key event, X.ShiftMask etc."""
+    return self._state
+  state = property(get_state)
+
+  def get_group(self):
+    """Get the XKB group, the keyboard layout, of a key event, 0 to 3."""
+    return (self._state >> 13) & 3
+  group = property(get_group)
+
   def __str__(self):
     return f'type:{self._type} scancode:{self._scancode} code:{self._code} value:{self._value}'
 
@@ -79,10 +98,14 @@ class XEvents(threading.Thread):
     self._listening = False
     self.record_display = display.Display()
     self.local_display = display.Display()
+    # Held to use local_display, it's shared by this thread, which looks up
+    # keysyms, and the main thread, which reads the keymap.
+    self.local_lock = threading.Lock()
     self.ctx = None
     self.keycode_to_symbol = collections.defaultdict(lambda: 'KEY_DUNNO')
     self._setup_lookup()
-    self.events = []  # each of type XEvent
+    # Each of type XEvent, the oldest are dropped if nobody reads them.
+    self.events = collections.deque(maxlen=MAX_QUEUED_EVENTS)
 
   def run(self):
     """Standard run method for threading."""
@@ -124,9 +147,23 @@ class XEvents(threading.Thread):
   def next_event(self):
     """Returns the next event in queue, or None if none."""
     if self.events:
-      return self.events.pop(0)
+      return self.events.popleft()
     return None
 
+  def refresh_mapping(self):
+    """Read the events sent to local_display, ex. MappingNotify.
+    Returns:
+      True if the keyboard mapping changed.
+    """
+    changed = False
+    with self.local_lock:
+      while self.local_display.pending_events():
+        event = self.local_display.next_event()
+        if event.type == X.MappingNotify and event.request == X.MappingKeyboard:
+          self.local_display.refresh_keyboard_mapping(event)
+          changed = True
+    return changed
+
   def start_listening(self):
     """Start listening to RECORD extension and queuing events."""
     if not self.record_display.has_extension("RECORD"):
@@ -206,10 +243,12 @@ class XEvents(threading.Thread):
       else:
         value = 1
       self.events.append(XEvent(
-          'EV_REL', 0, XEvents._butn_to_code.get(event.detail, f'BTN_{event.detail}'), value))
+          'EV_REL', 0, XEvents._butn_to_code.get(event.detail, f'BTN_{event.detail}'), value,
+          pos=(event.root_x, event.root_y)))
     else:
       self.events.append(XEvent(
-          'EV_KEY', 0, XEvents._butn_to_code.get(event.detail, f'BTN_{event.detail}'), value))
+          'EV_KEY', 0, XEvents._butn_to_code.get(event.detail, f'BTN_{event.detail}'), value,
+          pos=(event.root_x, event.root_y)))
 
   def _handle_key(self, event, value):
     """Add key event to events.
@@ -217,10 +256,19 @@ class XEvents(threading.Thread):
       event: the event info
       value: 1=down, 0=up
     """
-    keysym = self.local_display.keycode_to_keysym(event.detail, 0)
+    # XKB puts the group in bits 13 and 14 of the state, the core keymap
+    # has the first two groups in columns 0 and 2.
+    group = (event.state >> 13) & 3
+    keysym = 0
+    with self.local_lock:
+      if group == 1:
+        keysym = self.local_display.keycode_to_keysym(event.detail, 2)
+      if not keysym:
+        keysym = self.local_display.keycode_to_keysym(event.detail, 0)
     if keysym not in self.keycode_to_symbol:
       print(f'Missing code for {event.detail - 8} = {keysym}')
-    self.events.append(XEvent('EV_KEY', event.detail - 8, self.keycode_to_symbol[keysym], value))
+    self.events.append(XEvent('EV_KEY', event.detail - 8, self.keycode_to_symbol[keysym], value,
+                              state=event.state))
 
 def _run_test():
   """Run a test or debug session."""